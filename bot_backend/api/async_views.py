@@ -0,0 +1,52 @@
+"""
+Базовый класс асинхронных API views для запуска под ASGI.
+DRF APIView не поддерживает async-обработчики, поэтому асинхронные views
+наследуются от django View: тело запроса разбирается парсером DRF, ответ
+сериализуется JSONEncoder DRF - формат запросов и ответов совпадает с APIView.
+"""
+import io
+from typing import Any
+
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class AsyncAPIView(View):
+    """Асинхронный API view с JSON телом запроса и JSON ответом"""
+    
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Как и APIView, view не требует CSRF токена (сессионная аутентификация не используется)
+        return csrf_exempt(super().as_view(**initkwargs))
+    
+    def parse_data(self, request) -> Any:
+        """
+        Данные запроса (как request.data в DRF)
+        
+        Raises:
+            ParseError: Некорректный JSON
+        """
+        if not request.body:
+            return {}
+        if request.content_type == 'application/json':
+            return JSONParser().parse(io.BytesIO(request.body))
+        return request.POST
+    
+    def json_response(self, data: Any, status_code: int = status.HTTP_200_OK) -> JsonResponse:
+        """JSON ответ в формате DRF"""
+        return JsonResponse(
+            data,
+            status=status_code,
+            encoder=JSONEncoder,
+            safe=False,
+            json_dumps_params={'ensure_ascii': False}
+        )
+    
+    def parse_error_response(self, error: ParseError) -> JsonResponse:
+        """Ответ на некорректное тело запроса"""
+        return self.json_response({"detail": str(error.detail)}, error.status_code)
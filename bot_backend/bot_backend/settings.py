@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -152,3 +153,102 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 50,
 }
 
+
+# Document processing settings
+# Максимальное количество одновременных запросов к LLM при сегментации документа
+# (1 - последовательная обработка chunks)
+LLM_SEGMENTATION_WORKERS = 4
+
+# Сегментатор документов, для которых он не выбран явно (Document.segmenter):
+# llm - LLM, rules - по заголовкам без LLM, auto - по заголовкам с переходом на LLM
+DOCUMENT_SEGMENTER = 'llm'
+# Доля слов chunk, разделенных по заголовкам уверенно, ниже которой auto использует LLM
+SEGMENTER_MIN_CONFIDENCE = 0.6
+
+# Кэш ответов LLM при анализе секций (повторная обработка неизменных chunks не вызывает LLM)
+LLM_CACHE_ENABLED = True
+LLM_CACHE_MAX_ENTRIES = 50000
+LLM_CACHE_MAX_AGE_DAYS = 90
+
+# Кэш эмбеддингов секций (переиндексация кодирует только новые и измененные секции)
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
+# Кэши запросов консультаций в памяти процесса: эмбеддинги вопросов (по нормализованному
+# тексту) и результаты поиска в Qdrant (до изменения корпуса документов). Срок жизни в секундах
+QUERY_CACHE_ENABLED = True
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = 2000
+QUERY_EMBEDDING_CACHE_TTL = 86400
+QUERY_RESULTS_CACHE_MAX_ENTRIES = 2000
+QUERY_RESULTS_CACHE_TTL = 3600
+# Одновременные запросы на кодирование вопросов объединяются в батч: до QUERY_EMBEDDING_BATCH_SIZE
+# вопросов, собранных не дольше QUERY_EMBEDDING_MAX_WAIT (сек) после первого (1 - без объединения)
+QUERY_EMBEDDING_BATCH_SIZE = 32
+QUERY_EMBEDDING_MAX_WAIT = 0.005
+# Семантический кэш ответов: вопрос, похожий на заданный ранее (косинусное сходство эмбеддингов
+# не ниже порога), получает сохраненный ответ, если документы-источники не переиндексировались
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_MAX_ENTRIES = 5000
+# Интервал чтения поколения корпуса из БД (сек): изменения, сделанные воркером, видны с этой задержкой
+CORPUS_GENERATION_CHECK_INTERVAL = 1.0
+
+# Асинхронные views консультаций и генерации тестов (AsyncOpenAI, AsyncQdrantClient): включаются
+# при запуске под ASGI (bot_backend/asgi.py устанавливает ASYNC_VIEWS=1), под WSGI - синхронные views
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+# Размер батча при кодировании секций и загрузке точек в Qdrant
+EMBEDDING_BATCH_SIZE = 64
+# Секции длиннее окна embedder (max_seq_length токенов) индексируются перекрывающимися окнами,
+# перекрытие соседних окон в токенах
+EMBEDDING_WINDOW_OVERLAP = 64
+
+# Очередь обработки документов (python manage.py ingestion_worker)
+# Количество документов, обрабатываемых одним процессом воркера параллельно
+PROCESSING_WORKERS = 2
+PROCESSING_JOB_MAX_ATTEMPTS = 3
+# Задержка перед повторной попыткой (сек), удваивается с каждой попыткой
+PROCESSING_JOB_RETRY_BACKOFF = 60
+# Интервал сигналов активности воркера и время, после которого задача считается брошенной (сек)
+PROCESSING_JOB_HEARTBEAT_INTERVAL = 30
+PROCESSING_JOB_HEARTBEAT_TIMEOUT = 300
+
+# Загрузка корпуса (python manage.py ingest_corpus): данные одного документа, ожидающие
+# следующего этапа (остальное извлекается, сегментируется и кодируется по мере обработки).
+# Слов текста, ожидающих сегментации
+INGEST_MAX_ITEM_WORDS = 20000
+# Секций, ожидающих кодирования
+INGEST_MAX_ITEM_SECTIONS = 256
+# Точек с векторами, ожидающих загрузки в Qdrant
+INGEST_MAX_ITEM_WINDOWS = 2048
+
+# Ход обработки документа: минимальный интервал сохранения в БД (сек)
+PROGRESS_UPDATE_INTERVAL = 1.0
+# Минимальный интервал проверки запроса отмены обработки (сек)
+PROCESSING_CANCEL_CHECK_INTERVAL = 1.0
+# Удаление документа ждет остановки выполняющейся обработки не дольше (сек); если обработка
+# не остановилась, ее точки удаляет воркер, обнаружив, что документа больше нет
+DOCUMENT_DELETE_WAIT_TIMEOUT = 30
+# Поток событий хода обработки (/api/documents/{id}/events/): интервал чтения из БД
+# и время, после которого поток закрывается (EventSource переподключается сам), сек
+PROGRESS_EVENTS_POLL_INTERVAL = 1.0
+PROGRESS_EVENTS_TIMEOUT = 600
+# Одновременных потоков событий на процесс под WSGI (каждый занимает поток веб-сервера);
+# сверх лимита клиент получает текущее состояние и переподключается позже. Под ASGI не ограничено
+PROGRESS_EVENTS_MAX_STREAMS = 8
+
+# Извлечение текста PDF/DOCX в пуле процессов (0 - в процессе сервера/воркера)
+EXTRACTION_PROCESSES = 2
+# Количество страниц PDF в одной задаче пула процессов
+PDF_PAGES_PER_TASK = 20
+
+# Поиск почти совпадающих секций (SimHash): дубликаты секций других документов не индексируются
+SECTION_DEDUP_ENABLED = True
+# Максимальное расстояние Хэмминга между отпечатками дубликатов (не больше 3)
+SECTION_DEDUP_MAX_DISTANCE = 3
+
+# Обработчики загрузки вычисляют sha256 файла по мере записи (Document.content_hash)
+FILE_UPLOAD_HANDLERS = [
+    'documents.upload_handlers.HashingMemoryFileUploadHandler',
+    'documents.upload_handlers.HashingTemporaryFileUploadHandler',
+]
@@ -23,10 +23,12 @@ class ConsultationAdmin(admin.ModelAdmin):
         'query_preview',
         'response_time',
         'documents_count',
+        'cache_hit_display',
     ]
     
     list_filter = [
         'created_at',
+        ('cache_hit_of', admin.EmptyFieldListFilter),
     ]
     
     search_fields = [
@@ -40,8 +42,11 @@ class ConsultationAdmin(admin.ModelAdmin):
         'response',
         'created_at',
         'response_time',
+        'time_to_first_token',
         'sources',
         'documents',
+        'cache_hit_of',
+        'cache_similarity',
     ]
     
     inlines = [ConsultationDocumentInline]
@@ -51,7 +56,10 @@ class ConsultationAdmin(admin.ModelAdmin):
             'fields': ('id', 'query', 'created_at')
         }),
         ('Ответ', {
-            'fields': ('response', 'response_time')
+            'fields': ('response', 'response_time', 'time_to_first_token')
+        }),
+        ('Семантический кэш', {
+            'fields': ('cache_hit_of', 'cache_similarity')
         }),
         ('Источники', {
             'fields': ('sources',),
@@ -71,6 +79,13 @@ class ConsultationAdmin(admin.ModelAdmin):
         return obj.documents.count()
     documents_count.short_description = "Документов"  # type: ignore
     
+    def cache_hit_display(self, obj):
+        """Ответ взят из кэша (сходство вопросов)"""
+        if obj.cache_hit_of_id is None:
+            return '-'
+        return f"{obj.cache_similarity:.3f}"
+    cache_hit_display.short_description = "Из кэша"  # type: ignore
+    
     def has_add_permission(self, request):
         """Запретить создание консультаций через админку"""
         return False
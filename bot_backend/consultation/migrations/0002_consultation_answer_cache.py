@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultation',
+            name='cache_hit_of',
+            field=models.ForeignKey(blank=True, help_text='Консультация с похожим вопросом, ответ и источники которой использованы повторно', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cache_hits', to='consultation.consultation', verbose_name='Ответ из кэша'),
+        ),
+        migrations.AddField(
+            model_name='consultation',
+            name='cache_similarity',
+            field=models.FloatField(blank=True, help_text='Косинусное сходство с вопросом консультации, из которой взят ответ', null=True, verbose_name='Сходство вопросов'),
+        ),
+        migrations.AddField(
+            model_name='consultation',
+            name='question_vector',
+            field=models.BinaryField(blank=True, help_text='float16, little-endian; используется семантическим кэшем ответов', null=True, verbose_name='Эмбеддинг вопроса'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultation', '0002_consultation_answer_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultation',
+            name='time_to_first_token',
+            field=models.FloatField(blank=True, null=True, verbose_name='Время до первого фрагмента ответа (сек)'),
+        ),
+    ]
@@ -42,11 +42,38 @@ class Consultation(models.Model):
         null=True, 
         blank=True
     )
+    time_to_first_token = models.FloatField(
+        verbose_name="Время до первого фрагмента ответа (сек)",
+        null=True,
+        blank=True
+    )
     sources = models.JSONField(
         verbose_name="Источники информации", 
         default=list,
         blank=True
     )
+    question_vector = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Эмбеддинг вопроса",
+        help_text="float16, little-endian; используется семантическим кэшем ответов"
+    )
+    cache_hit_of = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='cache_hits',
+        verbose_name="Ответ из кэша",
+        help_text="Консультация с похожим вопросом, ответ и источники которой использованы повторно"
+    )
+    cache_similarity = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name="Сходство вопросов",
+        help_text="Косинусное сходство с вопросом консультации, из которой взят ответ"
+    )
     documents = models.ManyToManyField(
         'documents.Document',
         through='ConsultationDocument',
@@ -0,0 +1,228 @@
+"""
+Семантический кэш ответов консультаций.
+Эмбеддинги вопросов прошлых консультаций образуют индекс в памяти процесса.
+Если новый вопрос близок к сохраненному (косинусное сходство не ниже порога),
+совпадает с ним по числам и отрицаниям и документы-источники ответа
+не переиндексировались после консультации, повторно используются ее ответ
+и источники без запроса к LLM.
+"""
+import re
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from documents.models import Document
+from .models import Consultation
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    """Эмбеддинг вопроса для хранения в Consultation.question_vector (float16)"""
+    return np.asarray(vector, dtype='<f2').tobytes()
+
+
+# Слова отрицания: вопросы с отрицанием и без него близки по эмбеддингам, но требуют разных ответов
+NEGATION_WORDS = frozenset({'не', 'нет', 'ни', 'без', 'нельзя'})
+
+_WORD_PATTERN = re.compile(r'\w+')
+_NUMBER_PATTERN = re.compile(r'\d+')
+
+
+def questions_match(query: str, cached_query: str) -> bool:
+    """
+    Проверка, что вопросы с близкими эмбеддингами не различаются по смыслу:
+    в них одни и те же числа (номера статей, пунктов, годы) в том же порядке
+    и одни и те же слова отрицания. Эмбеддинги "ст. 212" и "ст. 213"
+    или вопроса и его отрицания почти совпадают.
+    
+    Args:
+        query: Новый вопрос
+        cached_query: Вопрос консультации из кэша
+    
+    Returns:
+        bool: True, если ответ на cached_query можно использовать для query
+    """
+    if _NUMBER_PATTERN.findall(query) != _NUMBER_PATTERN.findall(cached_query):
+        return False
+    return _negations(query) == _negations(cached_query)
+
+
+def _negations(text: str) -> List[str]:
+    """Слова отрицания вопроса (по алфавиту)"""
+    return sorted(word for word in _WORD_PATTERN.findall(text.lower()) if word in NEGATION_WORDS)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Нормирование векторов (строк матрицы) для косинусного сходства"""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class SemanticAnswerCache:
+    """
+    Индекс эмбеддингов вопросов консультаций, ответы на которые получены от LLM.
+    Новые консультации (в том числе других процессов) дочитываются из БД
+    перед каждым поиском; хранятся последние max_entries консультаций.
+    """
+    
+    # Количество самых похожих вопросов, для которых проверяются документы-источники
+    CANDIDATES = 5
+    
+    def __init__(self, enabled: bool = True, threshold: float = 0.95, max_entries: int = 5000):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        
+        self._lock = threading.Lock()
+        self._ids = []
+        self._matrix = None
+        # Время создания последней загруженной консультации и ID загруженных консультаций с этим временем
+        self._loaded_until = None
+        self._boundary_ids = set()
+        
+        # Счетчики текущего процесса
+        self.hits = 0
+        self.misses = 0
+    
+    def _refresh(self):
+        """
+        Дочитать из БД консультации, созданные после последней загрузки.
+        Консультации с тем же временем создания, что и последняя загруженная,
+        не пропускаются: читаются консультации не раньше этого времени, кроме
+        уже загруженных (ID - случайные UUID, по ним нельзя продолжить чтение).
+        """
+        queryset = Consultation.objects.filter(
+            cache_hit_of__isnull=True,
+            question_vector__isnull=False
+        )
+        if self._loaded_until is None:
+            rows = list(queryset.order_by('-created_at').values_list(
+                'id', 'created_at', 'question_vector'
+            )[:self.max_entries])[::-1]
+        else:
+            rows = list(queryset.filter(created_at__gte=self._loaded_until).exclude(
+                id__in=self._boundary_ids
+            ).order_by('created_at').values_list(
+                'id', 'created_at', 'question_vector'
+            )[:self.max_entries])
+        if not rows:
+            return
+        
+        vectors = _normalize(np.stack([
+            np.frombuffer(bytes(vector), dtype='<f2').astype(np.float32) for _, _, vector in rows
+        ]))
+        ids = [consultation_id for consultation_id, _, _ in rows]
+        if self._matrix is not None and self._matrix.shape[1] == vectors.shape[1]:
+            vectors = np.vstack([self._matrix, vectors])
+            ids = self._ids + ids
+        
+        # Вытесняются самые старые консультации
+        self._ids = ids[-self.max_entries:]
+        self._matrix = vectors[-self.max_entries:]
+        
+        last_created_at = rows[-1][1]
+        if last_created_at != self._loaded_until:
+            self._boundary_ids = set()
+        self._boundary_ids.update(
+            consultation_id for consultation_id, created_at, _ in rows if created_at == last_created_at
+        )
+        self._loaded_until = last_created_at
+    
+    def is_fresh(self, consultation: Consultation) -> bool:
+        """
+        Проверка, что документы-источники консультации не изменились после нее
+        
+        Args:
+            consultation: Консультация, ответ которой используется повторно
+        
+        Returns:
+            bool: True, если все документы-источники обработаны и не переиндексировались
+        """
+        document_ids = {source.get('document_id') for source in consultation.sources}
+        if not document_ids or None in document_ids:
+            return False
+        
+        documents = list(Document.objects.filter(id__in=document_ids, status='processed').values_list(
+            'indexed_at', flat=True
+        ))
+        if len(documents) != len(document_ids):
+            # Документ удален или обрабатывается
+            return False
+        # Документы без даты индексации проиндексированы до появления поля, то есть раньше консультации
+        return all(indexed_at is None or indexed_at <= consultation.created_at for indexed_at in documents)
+    
+    def find(self, question_vector: List[float], query: str) -> Optional[Tuple[Consultation, float]]:
+        """
+        Найти консультацию с похожим вопросом и актуальным ответом
+        
+        Args:
+            question_vector: Эмбеддинг нового вопроса
+            query: Текст нового вопроса (см. questions_match)
+        
+        Returns:
+            (консультация, сходство) или None
+        """
+        if not self.enabled:
+            return None
+        
+        try:
+            with self._lock:
+                self._refresh()
+                ids, matrix = self._ids, self._matrix
+            
+            candidates = []
+            if matrix is not None and matrix.shape[1] == len(question_vector):
+                similarities = matrix @ _normalize(np.asarray(question_vector, dtype=np.float32))
+                best = np.argsort(-similarities)[:self.CANDIDATES]
+                candidates = [(ids[i], float(similarities[i])) for i in best if similarities[i] >= self.threshold]
+            
+            for consultation_id, similarity in candidates:
+                consultation = Consultation.objects.filter(pk=consultation_id).first()
+                if consultation is None or not questions_match(query, consultation.query):
+                    continue
+                if self.is_fresh(consultation):
+                    with self._lock:
+                        self.hits += 1
+                    return consultation, similarity
+        except DatabaseError as e:
+            # Ошибка кэша не должна прерывать консультацию
+            print(f"Answer cache error: {e}")
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def stats(self):
+        """Статистика кэша"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'threshold': self.threshold,
+                'entries': len(self._ids),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# Глобальный экземпляр семантического кэша ответов
+_answer_cache_instance = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """
+    Получить глобальный экземпляр семантического кэша ответов
+    
+    Returns:
+        SemanticAnswerCache instance
+    """
+    global _answer_cache_instance
+    if _answer_cache_instance is None:
+        _answer_cache_instance = SemanticAnswerCache(
+            enabled=getattr(settings, 'ANSWER_CACHE_ENABLED', True),
+            threshold=getattr(settings, 'ANSWER_CACHE_THRESHOLD', 0.95),
+            max_entries=getattr(settings, 'ANSWER_CACHE_MAX_ENTRIES', 5000)
+        )
+    return _answer_cache_instance
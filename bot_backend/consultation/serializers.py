@@ -40,7 +40,10 @@ class ConsultationResponseSerializer(serializers.ModelSerializer):
             'response', 
             'sources', 
             'response_time', 
+            'time_to_first_token',
             'created_at',
+            'cache_hit_of',
+            'cache_similarity',
             'related_documents'
         ]
         read_only_fields = fields
@@ -1,9 +1,12 @@
 """Сервисный слой для работы с консультациями"""
 import time
-from typing import Dict, List
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
 
 from integrations.ai_client import get_ai_client
 from .models import Consultation
+from .semantic_cache import encode_vector, get_answer_cache
 
 
 class ConsultationService:
@@ -11,10 +14,13 @@ class ConsultationService:
     
     def __init__(self):
         self.ai_client = get_ai_client()
+        self.answer_cache = get_answer_cache()
     
     def ask_question(self, query: str) -> Dict:
         """
-        Отправить вопрос в AI модуль и получить ответ
+        Отправить вопрос в AI модуль и получить ответ.
+        Если похожий вопрос уже задавался и его документы-источники не изменились,
+        используются сохраненные ответ и источники (без запроса к LLM).
         
         Args:
             query: Текст вопроса
@@ -25,31 +31,229 @@ class ConsultationService:
         start_time = time.time()
         
         try:
-            # Отправка запроса в AI модуль
-            result = self.ai_client.ask_question(query)
+            question_vector = self.ai_client.embed_question(query)
+            cached = self.answer_cache.find(question_vector, query)
+            
+            if cached is not None:
+                # Ответ консультации с похожим вопросом, источник отмечается для аудита
+                source = cached[0]
+                consultation = self._save_consultation(
+                    query,
+                    source.response,
+                    source.sources,
+                    start_time,
+                    cached=cached
+                )
+            else:
+                # Отправка запроса в AI модуль
+                result = self.ai_client.ask_question(query, question_vector=question_vector)
+                
+                # Сохранение консультации в БД (ответ получен целиком, первый токен - вместе с ним)
+                consultation = self._save_consultation(
+                    query,
+                    result.response,
+                    result.sources,
+                    start_time,
+                    question_vector=question_vector
+                )
             
-            response_time = time.time() - start_time
+            return self._make_result(consultation)
             
-            # Сохранение консультации в БД
-            consultation = Consultation.objects.create(
-                query=query,
-                response=result.response,
-                response_time=response_time,
-                sources=result.sources
-            )
+        except Exception as e:
+            raise Exception(f"Ошибка при обращении к AI модулю: {str(e)}")
+    
+    def ask_question_stream(self, query: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Потоковая консультация: сначала источники, затем фрагменты ответа по мере
+        генерации LLM. Консультация сохраняется в БД после получения всего ответа;
+        если поток прерван (клиент отключился), консультация не сохраняется.
+        
+        Args:
+            query: Текст вопроса
+        
+        Yields:
+            (тип события, данные): sources - источники, token - фрагмент ответа,
+            done - сохраненная консультация (как в ask_question, без источников)
+        """
+        start_time = time.time()
+        
+        question_vector = self.ai_client.embed_question(query)
+        cached = self.answer_cache.find(question_vector, query)
+        
+        if cached is not None:
+            # Сохраненный ответ отправляется одним фрагментом
+            source = cached[0]
+            sources = source.sources
+            tokens = iter([source.response])
+        else:
+            messages, sources = self.ai_client.build_messages(query, question_vector=question_vector)
+            tokens = self.ai_client.stream_answer(messages)
+        
+        yield 'sources', {"sources": sources}
+        
+        parts = []
+        time_to_first_token = None
+        for token in tokens:
+            if time_to_first_token is None:
+                time_to_first_token = time.time() - start_time
+            parts.append(token)
+            yield 'token', {"text": token}
+        
+        consultation = self._save_consultation(
+            query,
+            ''.join(parts).strip(),
+            sources,
+            start_time,
+            time_to_first_token=time_to_first_token,
+            question_vector=question_vector if cached is None else None,
+            cached=cached
+        )
+        result = self._make_result(consultation)
+        del result['sources']
+        yield 'done', result
+    
+    async def aask_question(self, query: str) -> Dict:
+        """
+        Асинхронная версия ask_question: эмбеддинг вопроса вычисляется в пуле потоков,
+        поиск и ответ LLM - через AsyncQdrantClient и AsyncOpenAI, обращения к БД - через sync_to_async
+        
+        Args:
+            query: Текст вопроса
+        
+        Returns:
+            dict: Словарь с ответом, источниками и временем обработки
+        """
+        start_time = time.time()
+        
+        try:
+            question_vector = await self.ai_client.aembed_question(query)
+            cached = await sync_to_async(self.answer_cache.find)(question_vector, query)
             
-            return {
-                "id": str(consultation.id),
-                "query": consultation.query,
-                "response": consultation.response,
-                "sources": consultation.sources,
-                "response_time": response_time,
-                "created_at": consultation.created_at
-            }
+            if cached is not None:
+                source = cached[0]
+                consultation = await sync_to_async(self._save_consultation)(
+                    query,
+                    source.response,
+                    source.sources,
+                    start_time,
+                    cached=cached
+                )
+            else:
+                result = await self.ai_client.aask_question(query, question_vector=question_vector)
+                consultation = await sync_to_async(self._save_consultation)(
+                    query,
+                    result.response,
+                    result.sources,
+                    start_time,
+                    question_vector=question_vector
+                )
             
+            return self._make_result(consultation)
+        
         except Exception as e:
             raise Exception(f"Ошибка при обращении к AI модулю: {str(e)}")
     
+    async def aask_question_stream(self, query: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Асинхронная версия ask_question_stream
+        
+        Args:
+            query: Текст вопроса
+        
+        Yields:
+            (тип события, данные): как в ask_question_stream
+        """
+        start_time = time.time()
+        
+        question_vector = await self.ai_client.aembed_question(query)
+        cached = await sync_to_async(self.answer_cache.find)(question_vector, query)
+        
+        if cached is not None:
+            source = cached[0]
+            sources = source.sources
+            tokens = None
+        else:
+            messages, sources = await self.ai_client.abuild_messages(query, question_vector=question_vector)
+            tokens = self.ai_client.astream_answer(messages)
+        
+        yield 'sources', {"sources": sources}
+        
+        parts = []
+        time_to_first_token = None
+        if tokens is None:
+            # Сохраненный ответ отправляется одним фрагментом
+            time_to_first_token = time.time() - start_time
+            parts.append(source.response)
+            yield 'token', {"text": source.response}
+        else:
+            async for token in tokens:
+                if time_to_first_token is None:
+                    time_to_first_token = time.time() - start_time
+                parts.append(token)
+                yield 'token', {"text": token}
+        
+        consultation = await sync_to_async(self._save_consultation)(
+            query,
+            ''.join(parts).strip(),
+            sources,
+            start_time,
+            time_to_first_token=time_to_first_token,
+            question_vector=question_vector if cached is None else None,
+            cached=cached
+        )
+        result = self._make_result(consultation)
+        del result['sources']
+        yield 'done', result
+    
+    def _save_consultation(
+        self,
+        query: str,
+        response: str,
+        sources: List[Dict[str, Any]],
+        start_time: float,
+        time_to_first_token: Optional[float] = None,
+        question_vector: Optional[List[float]] = None,
+        cached: Optional[Tuple[Consultation, float]] = None
+    ) -> Consultation:
+        """
+        Сохранение консультации
+        
+        Args:
+            query: Текст вопроса
+            response: Ответ
+            sources: Источники ответа
+            start_time: Время получения вопроса
+            time_to_first_token: Время до первого фрагмента ответа (по умолчанию - до всего ответа)
+            question_vector: Эмбеддинг вопроса (сохраняется для семантического кэша)
+            cached: Консультация, ответ которой использован, и сходство вопросов
+        """
+        response_time = time.time() - start_time
+        cache_hit_of, cache_similarity = cached if cached is not None else (None, None)
+        return Consultation.objects.create(
+            query=query,
+            response=response,
+            response_time=response_time,
+            time_to_first_token=time_to_first_token if time_to_first_token is not None else response_time,
+            sources=sources,
+            question_vector=encode_vector(question_vector) if question_vector is not None else None,
+            cache_hit_of=cache_hit_of,
+            cache_similarity=cache_similarity
+        )
+    
+    def _make_result(self, consultation: Consultation) -> Dict:
+        """Ответ API для сохраненной консультации"""
+        return {
+            "id": str(consultation.id),
+            "query": consultation.query,
+            "response": consultation.response,
+            "sources": consultation.sources,
+            "response_time": consultation.response_time,
+            "time_to_first_token": consultation.time_to_first_token,
+            "created_at": consultation.created_at,
+            "cache_hit_of": str(consultation.cache_hit_of_id) if consultation.cache_hit_of_id else None,
+            "cache_similarity": consultation.cache_similarity
+        }
+    
     def get_history(self, limit: int = 50):
         """
         Получить историю консультаций
@@ -1,3 +1,121 @@
-from django.test import TestCase
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from documents.models import Document
+from .models import Consultation
+from .semantic_cache import SemanticAnswerCache, encode_vector, questions_match
+
+
+class QuestionsMatchTests(SimpleTestCase):
+    """Проверка вопросов с близкими эмбеддингами перед использованием ответа из кэша"""
+    
+    def test_same_question(self):
+        self.assertTrue(questions_match(
+            'Что говорит ст. 212 Трудового кодекса?',
+            'что говорит ст.212 трудового кодекса'
+        ))
+    
+    def test_different_numbers(self):
+        self.assertFalse(questions_match('Что говорит ст. 212 ТК РФ?', 'Что говорит ст. 213 ТК РФ?'))
+        self.assertFalse(questions_match('Требования приказа 2020 года', 'Требования приказа 2021 года'))
+        self.assertFalse(questions_match('п. 5.2 Правил', 'п. 2.5 Правил'))
+    
+    def test_negation(self):
+        self.assertFalse(questions_match(
+            'Нужно ли проводить инструктаж при работе на высоте?',
+            'Не нужно ли проводить инструктаж при работе на высоте?'
+        ))
+        self.assertFalse(questions_match(
+            'Можно ли работать на высоте со страховкой?',
+            'Можно ли работать на высоте без страховки?'
+        ))
+
+
+class SemanticAnswerCacheTests(TestCase):
+    """Поиск консультации с похожим вопросом"""
+    
+    VECTOR = [0.6, 0.8, 0.0]
+    
+    def setUp(self):
+        self.document = Document.objects.create(
+            title='doc.txt',
+            file='documents/doc.txt',
+            file_type='txt',
+            status='processed',
+            indexed_at=timezone.now()
+        )
+        self.consultation = Consultation.objects.create(
+            query='Что говорит ст. 212 Трудового кодекса?',
+            response='Ответ',
+            sources=[{'document_id': str(self.document.id)}],
+            question_vector=encode_vector(self.VECTOR)
+        )
+        self.cache = SemanticAnswerCache(threshold=0.95)
+    
+    def test_hit(self):
+        found = self.cache.find([0.6, 0.79, 0.01], 'Что говорит статья 212 Трудового кодекса?')
+        self.assertIsNotNone(found)
+        self.assertEqual(found[0].pk, self.consultation.pk)
+    
+    def test_near_miss_question_not_reused(self):
+        # Эмбеддинги совпадают, вопросы - нет
+        self.assertIsNone(self.cache.find(self.VECTOR, 'Что говорит ст. 213 Трудового кодекса?'))
+        self.assertIsNone(self.cache.find(self.VECTOR, 'Что не говорит ст. 212 Трудового кодекса?'))
+        self.assertEqual(self.cache.stats()['misses'], 2)
+    
+    def test_reindexed_source_not_reused(self):
+        Document.objects.filter(pk=self.document.pk).update(indexed_at=timezone.now())
+        self.assertIsNone(self.cache.find(self.VECTOR, self.consultation.query))
+
+
+class SemanticAnswerCacheRefreshTests(TestCase):
+    """Дочитывание новых консультаций в индекс кэша"""
+    
+    def setUp(self):
+        self.moment = timezone.now()
+        self.cache = SemanticAnswerCache(max_entries=3)
+    
+    def add(self, vector, created_at=None, **fields) -> Consultation:
+        consultation = Consultation.objects.create(
+            query='Вопрос',
+            response='Ответ',
+            question_vector=encode_vector(vector),
+            **fields
+        )
+        Consultation.objects.filter(pk=consultation.pk).update(created_at=created_at or self.moment)
+        return consultation
+    
+    def test_same_created_at_is_not_skipped(self):
+        first = self.add([1.0, 0.0])
+        second = self.add([0.0, 1.0])
+        self.cache._refresh()
+        self.assertEqual(set(self.cache._ids), {first.pk, second.pk})
+        self.assertEqual(self.cache._boundary_ids, {first.pk, second.pk})
+        
+        # Консультация с тем же временем создания, записанная после загрузки
+        third = self.add([1.0, 1.0])
+        self.cache._refresh()
+        self.assertEqual(sorted(self.cache._ids[:2]), sorted([first.pk, second.pk]))
+        self.assertEqual(self.cache._ids[2], third.pk)
+        self.assertEqual(self.cache._matrix.shape, (3, 2))
+        
+        # Повторное чтение не добавляет загруженные консультации
+        self.cache._refresh()
+        self.assertEqual(len(self.cache._ids), 3)
+    
+    def test_boundary_moves_and_oldest_are_evicted(self):
+        old = self.add([1.0, 0.0])
+        self.cache._refresh()
+        
+        later = self.moment + timedelta(seconds=1)
+        newer = [self.add([0.0, 1.0], later), self.add([1.0, 1.0], later), self.add([1.0, 2.0], later)]
+        # Ответы из кэша не индексируются
+        self.add([2.0, 1.0], later, cache_hit_of=old)
+        self.cache._refresh()
+        
+        self.assertEqual(set(self.cache._ids), {consultation.pk for consultation in newer})
+        self.assertEqual(self.cache._loaded_until, later)
+        self.assertEqual(self.cache._boundary_ids, {consultation.pk for consultation in newer})
 
-# Create your tests here.
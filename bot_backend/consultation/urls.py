@@ -1,15 +1,28 @@
 """URL маршруты для модуля консультаций"""
+from django.conf import settings
 from django.urls import path
 from .views import (
     AskConsultationView,
+    AskConsultationStreamView,
+    AsyncAskConsultationView,
+    AsyncAskConsultationStreamView,
     ConsultationHistoryView,
-    ConsultationDetailView
+    ConsultationDetailView,
+    QueryCacheStatsView
 )
 
 app_name = 'consultation'
 
+# Под ASGI вопросы обрабатываются асинхронными views (AsyncOpenAI, AsyncQdrantClient)
+if getattr(settings, 'ASYNC_VIEWS', False):
+    AskView, AskStreamView = AsyncAskConsultationView, AsyncAskConsultationStreamView
+else:
+    AskView, AskStreamView = AskConsultationView, AskConsultationStreamView
+
 urlpatterns = [
-    path('ask/', AskConsultationView.as_view(), name='ask'),
+    path('ask/', AskView.as_view(), name='ask'),
+    path('ask/stream/', AskStreamView.as_view(), name='ask-stream'),
     path('history/', ConsultationHistoryView.as_view(), name='history'),
+    path('cache/stats/', QueryCacheStatsView.as_view(), name='cache-stats'),
     path('<uuid:consultation_id>/', ConsultationDetailView.as_view(), name='detail'),
 ]
@@ -2,14 +2,21 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import ParseError
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
+from api.async_views import AsyncAPIView
+from documents.events import EventStreamRenderer, format_event
+
+from integrations.query_cache import get_query_cache
 from .models import Consultation
 from .serializers import (
     ConsultationQuerySerializer,
     ConsultationResponseSerializer,
     ConsultationListSerializer
 )
+from .semantic_cache import get_answer_cache
 from .services import ConsultationService
 
 
@@ -45,6 +52,98 @@ class AskConsultationView(APIView):
             )
 
 
+class AskConsultationStreamView(APIView):
+    """API endpoint для потоковой консультации (Server-Sent Events)"""
+    
+    renderer_classes = [EventStreamRenderer]
+    
+    def post(self, request):
+        """
+        Отправить вопрос и получать ответ по мере генерации:
+        событие sources, события token с фрагментами ответа, событие done
+        """
+        serializer = ConsultationQuerySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        response = StreamingHttpResponse(
+            self._iter_events(serializer.validated_data['query']),
+            content_type='text/event-stream'
+        )
+        # Поток не кэшируется и не буферизуется прокси
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def _iter_events(self, query):
+        """События консультации; ошибка после начала потока отправляется событием error"""
+        try:
+            for event, data in ConsultationService().ask_question_stream(query):
+                yield format_event(event, data)
+        except Exception as e:
+            yield format_event('error', {"error": f"Ошибка при обращении к AI модулю: {str(e)}"})
+
+
+class AsyncAskConsultationView(AsyncAPIView):
+    """Асинхронный API endpoint для отправки вопроса консультанту (ASGI)"""
+    
+    async def post(self, request):
+        """
+        Отправить вопрос и получить консультацию (как AskConsultationView)
+        """
+        try:
+            serializer = ConsultationQuerySerializer(data=self.parse_data(request))
+        except ParseError as e:
+            return self.parse_error_response(e)
+        if not serializer.is_valid():
+            return self.json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        
+        service = ConsultationService()
+        try:
+            result = await service.aask_question(serializer.validated_data['query'])
+            return self.json_response(result, status.HTTP_200_OK)
+        except Exception as e:
+            return self.json_response({"error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncAskConsultationStreamView(AsyncAPIView):
+    """Асинхронный API endpoint для потоковой консультации (ASGI, Server-Sent Events)"""
+    
+    async def post(self, request):
+        """
+        Отправить вопрос и получать ответ по мере генерации (как AskConsultationStreamView)
+        """
+        try:
+            serializer = ConsultationQuerySerializer(data=self.parse_data(request))
+        except ParseError as e:
+            return self._error_response({"detail": str(e.detail)}, e.status_code)
+        if not serializer.is_valid():
+            return self._error_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        
+        response = StreamingHttpResponse(
+            self._iter_events(serializer.validated_data['query']),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    def _error_response(self, data, status_code):
+        """Ошибка до начала потока - одним событием error (как EventStreamRenderer)"""
+        return HttpResponse(format_event('error', data), status=status_code, content_type='text/event-stream')
+    
+    async def _iter_events(self, query):
+        """События консультации; ошибка после начала потока отправляется событием error"""
+        try:
+            async for event, data in ConsultationService().aask_question_stream(query):
+                yield format_event(event, data)
+        except Exception as e:
+            yield format_event('error', {"error": f"Ошибка при обращении к AI модулю: {str(e)}"})
+
+
 class ConsultationHistoryView(APIView):
     """API endpoint для получения истории консультаций"""
     
@@ -69,3 +168,17 @@ class ConsultationDetailView(APIView):
         consultation = get_object_or_404(Consultation, id=consultation_id)
         serializer = ConsultationResponseSerializer(consultation)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class QueryCacheStatsView(APIView):
+    """API endpoint для статистики кэша запросов консультаций"""
+    
+    def get(self, request):
+        """
+        Получить попадания, промахи и сэкономленное время кэша
+        эмбеддингов вопросов и кэша результатов поиска, а также
+        попадания семантического кэша ответов
+        """
+        stats = get_query_cache().stats()
+        stats['answers'] = get_answer_cache().stats()
+        return Response(stats, status=status.HTTP_200_OK)
@@ -4,9 +4,10 @@ from django.urls import reverse, path
 from django.utils.safestring import mark_safe
 from django.shortcuts import redirect
 from django.contrib import messages
-import threading
-from .models import Document
+from .models import Document, ProcessingJob
 from .services import get_document_service
+from .jobs import get_job_queue
+from .upload_handlers import get_content_hash
 
 
 @admin.register(Document)
@@ -27,6 +28,11 @@ class DocumentAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.reindex_document_view),
                 name='documents_document_reindex',
             ),
+            path(
+                '<path:object_id>/cancel/',
+                self.admin_site.admin_view(self.cancel_document_view),
+                name='documents_document_cancel',
+            ),
         ]
         return custom_urls + urls
     
@@ -43,13 +49,13 @@ class DocumentAdmin(admin.ModelAdmin):
                 document.error_message = ''
                 document.save()
             
-            # Запуск обработки в фоне
-            service = get_document_service()
-            thread = threading.Thread(target=service.process_document, args=(document,))
-            thread.daemon = True
-            thread.start()
-            
-            messages.success(request, f"Запущено пересканирование документа '{document.title}'")
+            # Повторная обработка без использования документа с тем же содержимым
+            # (как переиндексация через API)
+            job, created = get_job_queue().enqueue(document, 'reindex')
+            if created:
+                messages.success(request, f"Пересканирование документа '{document.title}' поставлено в очередь")
+            else:
+                messages.warning(request, f"Документ '{document.title}' уже в очереди обработки")
         
         return redirect('admin:documents_document_change', object_id)
     
@@ -60,13 +66,23 @@ class DocumentAdmin(admin.ModelAdmin):
         if document.status == 'processing':
             messages.warning(request, f"Документ '{document.title}' уже обрабатывается")
         else:
-            # Запуск переиндексации в фоне
-            service = get_document_service()
-            thread = threading.Thread(target=service.reindex_document, args=(document,))
-            thread.daemon = True
-            thread.start()
-            
-            messages.success(request, f"Запущена переиндексация документа '{document.title}'")
+            # Постановка переиндексации в очередь
+            job, created = get_job_queue().enqueue(document, 'reindex')
+            if created:
+                messages.success(request, f"Переиндексация документа '{document.title}' поставлена в очередь")
+            else:
+                messages.warning(request, f"Документ '{document.title}' уже в очереди обработки")
+        
+        return redirect('admin:documents_document_change', object_id)
+    
+    def cancel_document_view(self, request, object_id):
+        """View для отмены обработки документа"""
+        document = Document.objects.get(pk=object_id)
+        
+        if get_document_service().cancel_processing(document):
+            messages.success(request, f"Отмена обработки документа '{document.title}' запрошена")
+        else:
+            messages.warning(request, f"Документ '{document.title}' не обрабатывается")
         
         return redirect('admin:documents_document_change', object_id)
     
@@ -74,6 +90,7 @@ class DocumentAdmin(admin.ModelAdmin):
         'title',
         'file_type',
         'status_colored',
+        'progress_display',
         'file_size_display',
         'pages_count',
         'upload_date',
@@ -94,6 +111,12 @@ class DocumentAdmin(admin.ModelAdmin):
         'upload_date',
         'file_size',
         'pages_count',
+        'indexed_at',
+        'stage',
+        'progress_display',
+        'stage_stats',
+        'progress_updated_at',
+        'cancel_requested',
         'action_buttons',
     ]
     
@@ -102,30 +125,33 @@ class DocumentAdmin(admin.ModelAdmin):
             'fields': ('id', 'title', 'file', 'file_type')
         }),
         ('Метаданные', {
-            'fields': ('file_size', 'pages_count', 'upload_date')
+            'fields': ('file_size', 'pages_count', 'upload_date', 'indexed_at')
         }),
         ('Статус обработки', {
-            'fields': ('status', 'error_message', 'action_buttons')
+            'fields': ('segmenter', 'status', 'error_message', 'action_buttons')
+        }),
+        ('Ход обработки', {
+            'fields': ('stage', 'progress_display', 'stage_stats', 'progress_updated_at', 'cancel_requested')
         }),
     )
     
-    actions = ['reindex_documents', 'process_documents', 'retry_failed_documents']
+    actions = ['reindex_documents', 'process_documents', 'retry_failed_documents', 'cancel_documents']
     
     def save_model(self, request, obj, form, change):
         """Переопределение сохранения для автоматической обработки"""
         is_new = obj._state.adding
+        if 'file' in form.changed_data:
+            obj.content_hash = get_content_hash(form.cleaned_data['file'])
         super().save_model(request, obj, form, change)
         
-        # Если это новый документ, запускаем обработку
+        # Если это новый документ, ставим его в очередь обработки
+        # (документ с содержимым уже обработанного документа воркер индексирует по его секциям)
         if is_new:
-            service = get_document_service()
-            thread = threading.Thread(target=service.process_document, args=(obj,))
-            thread.daemon = True
-            thread.start()
+            get_job_queue().enqueue(obj, 'process')
             
             self.message_user(
                 request,
-                f"Документ '{obj.title}' загружен и отправлен на обработку"
+                f"Документ '{obj.title}' загружен и поставлен в очередь обработки"
             )
     
     def delete_model(self, request, obj):
@@ -170,6 +196,7 @@ class DocumentAdmin(admin.ModelAdmin):
             'processing': 'blue',
             'processed': 'green',
             'error': 'red',
+            'cancelled': 'gray',
         }
         color = colors.get(obj.status, 'gray')
         return format_html(
@@ -179,6 +206,14 @@ class DocumentAdmin(admin.ModelAdmin):
         )
     status_colored.short_description = "Статус"  # type: ignore
     
+    def progress_display(self, obj):
+        """Этап и обработанные chunks"""
+        if not obj.stage:
+            return '-'
+        total = obj.chunks_total if obj.chunks_total is not None else '?'
+        return f"{obj.get_stage_display()} ({obj.chunks_done}/{total})"
+    progress_display.short_description = "Ход обработки"  # type: ignore
+    
     def file_size_display(self, obj):
         """Размер файла в человекочитаемом формате"""
         return obj.get_file_size_display()
@@ -208,6 +243,15 @@ class DocumentAdmin(admin.ModelAdmin):
                     f'text-decoration: none; border-radius: 4px; display: inline-block;">♻️ Переиндексировать</a>'
                 )
             
+            # Кнопка отмены (для ожидающих и обрабатывающихся документов)
+            if obj.status in ('pending', 'processing'):
+                cancel_url = reverse('admin:documents_document_cancel', args=[obj.pk])
+                buttons.append(
+                    f'<a class="button" href="{cancel_url}" '
+                    f'style="background-color: #666; color: white; padding: 5px 10px; '
+                    f'text-decoration: none; border-radius: 4px; display: inline-block;">⏹ Отменить обработку</a>'
+                )
+            
             # Специальное сообщение для error
             if obj.status == 'error':
                 buttons.insert(0, 
@@ -221,7 +265,7 @@ class DocumentAdmin(admin.ModelAdmin):
     
     def reindex_documents(self, request, queryset):
         """Action для повторной индексации документов"""
-        service = get_document_service()
+        queue = get_job_queue()
         count = 0
         skipped = 0
         
@@ -230,13 +274,14 @@ class DocumentAdmin(admin.ModelAdmin):
                 skipped += 1
                 continue
             
-            # Запуск переиндексации в фоне
-            thread = threading.Thread(target=service.reindex_document, args=(document,))
-            thread.daemon = True
-            thread.start()
-            count += 1
+            # Постановка переиндексации в очередь
+            job, created = queue.enqueue(document, 'reindex')
+            if created:
+                count += 1
+            else:
+                skipped += 1
         
-        message = f"Запущена переиндексация {count} документов"
+        message = f"Поставлена в очередь переиндексация {count} документов"
         if skipped:
             message += f" (пропущено {skipped} обрабатывающихся документов)"
         
@@ -245,7 +290,7 @@ class DocumentAdmin(admin.ModelAdmin):
     
     def process_documents(self, request, queryset):
         """Action для обработки/пересканирования документов"""
-        service = get_document_service()
+        queue = get_job_queue()
         count = 0
         skipped = 0
         
@@ -254,22 +299,35 @@ class DocumentAdmin(admin.ModelAdmin):
                 skipped += 1
                 continue
             
-            # Запуск обработки в фоне
-            thread = threading.Thread(target=service.process_document, args=(document,))
-            thread.daemon = True
-            thread.start()
-            count += 1
+            # Повторная обработка без использования документа с тем же содержимым
+            job, created = queue.enqueue(document, 'reindex')
+            if created:
+                count += 1
+            else:
+                skipped += 1
         
-        message = f"Запущена обработка {count} документов"
+        message = f"Поставлена в очередь обработка {count} документов"
         if skipped:
             message += f" (пропущено {skipped} обрабатывающихся документов)"
         
         self.message_user(request, message)
     process_documents.short_description = "Пересканировать выбранные документы"  # type: ignore
     
+    def cancel_documents(self, request, queryset):
+        """Action для отмены обработки документов"""
+        service = get_document_service()
+        count = 0
+        
+        for document in queryset:
+            if service.cancel_processing(document):
+                count += 1
+        
+        self.message_user(request, f"Запрошена отмена обработки {count} документов")
+    cancel_documents.short_description = "Отменить обработку выбранных документов"  # type: ignore
+    
     def retry_failed_documents(self, request, queryset):
         """Action для повторной обработки документов с ошибками"""
-        service = get_document_service()
+        queue = get_job_queue()
         
         # Фильтруем только документы со статусом error
         failed_docs = queryset.filter(status='error')
@@ -289,13 +347,51 @@ class DocumentAdmin(admin.ModelAdmin):
             document.error_message = ''
             document.save()
             
-            # Запуск обработки в фоне
-            thread = threading.Thread(target=service.process_document, args=(document,))
-            thread.daemon = True
-            thread.start()
+            # Постановка в очередь обработки
+            queue.enqueue(document, 'process')
         
         self.message_user(
             request,
-            f"Запущена повторная обработка {count} документов с ошибками"
+            f"Поставлена в очередь повторная обработка {count} документов с ошибками"
         )
     retry_failed_documents.short_description = "Повторить обработку документов с ошибками"  # type: ignore
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    """Админка для просмотра очереди обработки документов"""
+    
+    list_display = [
+        'document',
+        'action',
+        'status',
+        'attempts',
+        'locked_by',
+        'created_at',
+        'finished_at',
+    ]
+    
+    list_filter = [
+        'status',
+        'action',
+    ]
+    
+    search_fields = [
+        'document__title',
+    ]
+    
+    readonly_fields = [
+        'document',
+        'action',
+        'attempts',
+        'locked_by',
+        'heartbeat_at',
+        'last_error',
+        'created_at',
+        'started_at',
+        'finished_at',
+    ]
+    
+    def has_add_permission(self, request):
+        """Задачи создаются только через действия с документами"""
+        return False
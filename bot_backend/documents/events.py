@@ -0,0 +1,186 @@
+"""
+Server-Sent Events: поток изменений хода обработки документа.
+Клиент подписывается через EventSource вместо периодического опроса статуса;
+сервер читает состояние документа из БД и отправляет событие только при его изменении.
+Под WSGI поток занимает поток веб-сервера, поэтому количество одновременных потоков
+ограничено (PROGRESS_EVENTS_MAX_STREAMS); под ASGI поток - асинхронный генератор,
+ожидание между чтениями не занимает потоков.
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Document, ProcessingJob
+from .serializers import DocumentStatusSerializer
+
+# Интервал комментария keep-alive (прокси закрывают соединения без данных)
+KEEPALIVE_INTERVAL = 15
+
+# Задержка переподключения EventSource (сек), если достигнут лимит одновременных потоков
+BUSY_RETRY_INTERVAL = 5
+
+# Свободные места для синхронных потоков событий в процессе
+_stream_slots = None
+_stream_slots_lock = threading.Lock()
+
+
+def _get_stream_slots() -> threading.BoundedSemaphore:
+    """Семафор одновременных синхронных потоков событий (PROGRESS_EVENTS_MAX_STREAMS)"""
+    global _stream_slots
+    with _stream_slots_lock:
+        if _stream_slots is None:
+            _stream_slots = threading.BoundedSemaphore(
+                max(1, getattr(settings, 'PROGRESS_EVENTS_MAX_STREAMS', 8))
+            )
+        return _stream_slots
+
+
+def format_event(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """
+    Событие в формате text/event-stream
+    
+    Args:
+        event: Тип события
+        data: Данные события (JSON)
+        event_id: ID события (EventSource передает последний ID при переподключении)
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, cls=JSONEncoder, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Renderer для text/event-stream: EventSource отправляет Accept: text/event-stream.
+    Используется для ответов до начала потока (например, 404) - они отправляются одним событием error.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event('error', data if isinstance(data, dict) else {'detail': data}).encode(self.charset)
+
+
+class _DocumentEventsPoller:
+    """Чтение состояния документа из БД и события, которые нужно отправить клиенту"""
+    
+    def __init__(self, document_id):
+        self.document_id = document_id
+        self.last_data = None
+        self.sent_at = time.monotonic()
+        # Поток нужно закрыть (обработка завершена или документ удален)
+        self.finished = False
+    
+    def poll(self) -> List[str]:
+        """
+        Прочитать состояние документа
+        
+        Returns:
+            События в формате text/event-stream (пустой список, если ничего не изменилось)
+        """
+        document = Document.objects.filter(pk=self.document_id).first()
+        if document is None:
+            self.finished = True
+            return [format_event('deleted', {'id': str(self.document_id)})]
+        
+        events = []
+        data = DocumentStatusSerializer(document).data
+        now = time.monotonic()
+        if data != self.last_data:
+            self.last_data = data
+            self.sent_at = now
+            event_id = document.progress_updated_at.isoformat() if document.progress_updated_at else None
+            events.append(format_event('progress', data, event_id))
+        elif now - self.sent_at >= KEEPALIVE_INTERVAL:
+            self.sent_at = now
+            events.append(": keep-alive\n\n")
+        
+        self.finished = document.status in ('processed', 'error', 'cancelled') and not ProcessingJob.objects.filter(
+            document=document,
+            status__in=ProcessingJob.ACTIVE_STATUSES
+        ).exists()
+        if self.finished:
+            events.append(format_event('done', {'id': str(document.id), 'status': document.status}))
+        return events
+
+
+def iter_document_events(document_id) -> Iterator[str]:
+    """
+    Поток событий хода обработки документа (WSGI).
+    Событие progress отправляется при каждом изменении статуса или хода обработки;
+    поток завершается, когда обработка закончена (или отменена) и задач в очереди нет,
+    при удалении документа (событие deleted) или через PROGRESS_EVENTS_TIMEOUT
+    (EventSource переподключается сам).
+    
+    Поток занимает поток веб-сервера на все время подписки. Если открыто
+    PROGRESS_EVENTS_MAX_STREAMS потоков, отправляется текущее состояние документа
+    и поток закрывается: EventSource переподключается через BUSY_RETRY_INTERVAL.
+    
+    Args:
+        document_id: ID документа
+    
+    Yields:
+        События в формате text/event-stream
+    """
+    poll_interval = getattr(settings, 'PROGRESS_EVENTS_POLL_INTERVAL', 1.0)
+    timeout = getattr(settings, 'PROGRESS_EVENTS_TIMEOUT', 600)
+    poller = _DocumentEventsPoller(document_id)
+    
+    slots = _get_stream_slots()
+    if not slots.acquire(blocking=False):
+        yield f"retry: {BUSY_RETRY_INTERVAL * 1000}\n\n"
+        yield from poller.poll()
+        return
+    
+    try:
+        started_at = time.monotonic()
+        # Задержка переподключения EventSource (мс)
+        yield f"retry: {int(poll_interval * 3000)}\n\n"
+        
+        while True:
+            yield from poller.poll()
+            if poller.finished or time.monotonic() - started_at >= timeout:
+                return
+            time.sleep(poll_interval)
+    finally:
+        # Генератор закрывается и при отключении клиента
+        slots.release()
+
+
+async def aiter_document_events(document_id) -> AsyncIterator[str]:
+    """
+    Поток событий хода обработки документа (ASGI): события те же, что у iter_document_events.
+    Между чтениями из БД поток ждет в event loop и не занимает потоков,
+    поэтому количество одновременных потоков не ограничивается.
+    
+    Args:
+        document_id: ID документа
+    
+    Yields:
+        События в формате text/event-stream
+    """
+    poll_interval = getattr(settings, 'PROGRESS_EVENTS_POLL_INTERVAL', 1.0)
+    timeout = getattr(settings, 'PROGRESS_EVENTS_TIMEOUT', 600)
+    poller = _DocumentEventsPoller(document_id)
+    poll = sync_to_async(poller.poll)
+    
+    started_at = time.monotonic()
+    # Задержка переподключения EventSource (мс)
+    yield f"retry: {int(poll_interval * 3000)}\n\n"
+    
+    while True:
+        for event in await poll():
+            yield event
+        if poller.finished or time.monotonic() - started_at >= timeout:
+            return
+        await asyncio.sleep(poll_interval)
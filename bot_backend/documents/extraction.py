@@ -0,0 +1,215 @@
+"""
+Извлечение текста PDF и DOCX в пуле процессов.
+Разбор файлов выполняется на чистом Python и в процессе веб-сервера или воркера
+конкурировал бы за GIL с обработкой запросов. Модуль не импортирует Django:
+функции извлечения выполняются в дочерних процессах пула.
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+try:
+    from docx import Document as DocxDocument
+except ImportError:
+    DocxDocument = None
+
+
+def read_pdf_pages_count(file_path: str) -> int:
+    """
+    Количество страниц PDF из /Root/Pages/Count.
+    Читаются только таблица ссылок и корень дерева страниц: объекты страниц
+    не строятся (len(reader.pages) обходит все дерево страниц).
+    
+    Args:
+        file_path: Путь к PDF файлу
+    
+    Returns:
+        Количество страниц
+    """
+    if not PyPDF2:
+        raise ImportError("PyPDF2 не установлен")
+    
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        try:
+            return int(pdf_reader.trailer['/Root']['/Pages']['/Count'])
+        except (KeyError, TypeError, ValueError):
+            # Поврежденный корень дерева страниц: подсчет обходом дерева
+            return len(pdf_reader.pages)
+
+
+# Открытый PDF процесса пула: ((путь, mtime, размер), PdfReader).
+# Задачи одного файла попадают в один и тот же процесс многократно, и файл
+# разбирается (таблица ссылок и дерево страниц) один раз на процесс, а не на
+# каждый диапазон страниц. Хранится один файл: память процесса ограничена его размером.
+_cached_pdf_reader = None
+
+
+def _get_pdf_reader(file_path: str):
+    """PdfReader файла из кэша процесса (файл изменился - разбирается заново)"""
+    global _cached_pdf_reader
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    if _cached_pdf_reader is None or _cached_pdf_reader[0] != key:
+        # Сначала освобождается предыдущий файл
+        _cached_pdf_reader = None
+        _cached_pdf_reader = (key, PyPDF2.PdfReader(file_path))
+    return _cached_pdf_reader[1]
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """
+    Извлечение текста диапазона страниц PDF (выполняется в процессе пула)
+    
+    Args:
+        file_path: Путь к PDF файлу
+        start: Номер первой страницы (с 0)
+        end: Номер страницы после последней
+    
+    Returns:
+        Тексты страниц по порядку
+    """
+    if not PyPDF2:
+        raise ImportError("PyPDF2 не установлен")
+    
+    pdf_reader = _get_pdf_reader(file_path)
+    return [pdf_reader.pages[i].extract_text() for i in range(start, end)]
+
+
+def extract_docx_paragraphs(file_path: str) -> List[str]:
+    """
+    Извлечение абзацев DOCX (выполняется в процессе пула)
+    
+    Args:
+        file_path: Путь к DOCX файлу
+    
+    Returns:
+        Тексты абзацев по порядку
+    """
+    if not DocxDocument:
+        raise ImportError("python-docx не установлен")
+    
+    return [paragraph.text for paragraph in DocxDocument(file_path).paragraphs]
+
+
+# Глобальный пул процессов извлечения текста
+_pool_instance = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool(max_workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Получить глобальный пул процессов извлечения текста
+    
+    Args:
+        max_workers: Количество процессов (0 - извлечение в текущем процессе)
+    
+    Returns:
+        ProcessPoolExecutor или None
+    """
+    global _pool_instance
+    if max_workers <= 0:
+        return None
+    
+    with _pool_lock:
+        if _pool_instance is None:
+            # spawn: fork процесса с потоками (сервер, воркер очереди) может зависнуть
+            _pool_instance = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool_instance
+
+
+def _reset_extraction_pool():
+    """Пересоздать пул при следующем обращении (процесс пула аварийно завершился)"""
+    global _pool_instance
+    with _pool_lock:
+        if _pool_instance is not None:
+            _pool_instance.shutdown(wait=False)
+            _pool_instance = None
+
+
+def iter_pdf_pages(
+    file_path: str,
+    pages_count: int,
+    pages_per_task: int = 20,
+    max_workers: int = 2
+) -> Iterator[str]:
+    """
+    Извлечение текста PDF диапазонами страниц параллельно в пуле процессов.
+    Одновременно в работе не более 2 * max_workers диапазонов, страницы
+    выдаются в исходном порядке.
+    
+    Args:
+        file_path: Путь к PDF файлу
+        pages_count: Количество страниц
+        pages_per_task: Количество страниц в одной задаче пула
+        max_workers: Количество процессов пула (0 - в текущем процессе)
+    
+    Yields:
+        Тексты страниц по порядку
+    """
+    ranges = [
+        (start, min(start + pages_per_task, pages_count))
+        for start in range(0, pages_count, pages_per_task)
+    ]
+    
+    pool = get_extraction_pool(max_workers)
+    if pool is None:
+        # В текущем процессе файл открывается один раз и не остается в кэше
+        if not PyPDF2:
+            raise ImportError("PyPDF2 не установлен")
+        pdf_reader = PyPDF2.PdfReader(file_path)
+        for i in range(pages_count):
+            yield pdf_reader.pages[i].extract_text()
+        return
+    
+    pending = deque()
+    try:
+        for start, end in ranges:
+            pending.append(pool.submit(extract_pdf_pages, file_path, start, end))
+            if len(pending) >= max_workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        _reset_extraction_pool()
+        raise
+    finally:
+        # Чтение прервано потребителем или ошибкой: оставшиеся задачи не нужны
+        for future in pending:
+            future.cancel()
+
+
+def iter_docx_paragraphs(file_path: str, max_workers: int = 2) -> Iterator[str]:
+    """
+    Извлечение абзацев DOCX в пуле процессов
+    
+    Args:
+        file_path: Путь к DOCX файлу
+        max_workers: Количество процессов пула (0 - в текущем процессе)
+    
+    Yields:
+        Тексты абзацев по порядку
+    """
+    pool = get_extraction_pool(max_workers)
+    if pool is None:
+        yield from extract_docx_paragraphs(file_path)
+        return
+    
+    try:
+        paragraphs = pool.submit(extract_docx_paragraphs, file_path).result()
+    except BrokenProcessPool:
+        _reset_extraction_pool()
+        raise
+    yield from paragraphs
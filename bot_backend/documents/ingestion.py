@@ -0,0 +1,547 @@
+"""
+Конвейерная загрузка корпуса документов.
+Извлечение текста, сегментация, вычисление эмбеддингов и загрузка в Qdrant
+выполняются собственными пулами потоков. Этапы связаны ограниченными очередями:
+если этап не успевает, предыдущие этапы ждут, а не накапливают документы в памяти.
+Данные документа передаются между этапами ограниченными потоками (не более
+INGEST_MAX_ITEM_WORDS слов текста, INGEST_MAX_ITEM_SECTIONS секций и
+INGEST_MAX_ITEM_WINDOWS окон), документ не хранится целиком ни на одном этапе.
+"""
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+
+from .models import Document
+from .progress import DocumentProgress
+from .services import DocumentService, get_document_service
+from integrations.load_documents import ProcessingCancelled
+
+# Форматы, которые загружаются из корпуса
+ALLOWED_EXTENSIONS = ('pdf', 'rtf', 'docx', 'txt')
+
+# Признак завершения потока задач в очереди этапа
+_STOP = object()
+
+
+def iter_corpus_files(path: str) -> Iterator[Tuple[str, Callable[[], File]]]:
+    """
+    Перечисление файлов корпуса (каталог или zip архив)
+    
+    Args:
+        path: Путь к каталогу или zip архиву
+    
+    Yields:
+        Относительное имя файла и функция, открывающая файл
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(
+                info.filename for info in archive.infolist()
+                if not info.is_dir() and info.filename.split('.')[-1].lower() in ALLOWED_EXTENSIONS
+            )
+        
+        for name in names:
+            def open_member(name=name):
+                # Отдельный дескриптор архива на каждое чтение: этап извлечения многопоточный
+                with zipfile.ZipFile(path) as archive:
+                    return ContentFile(archive.read(name), name=os.path.basename(name))
+            yield name, open_member
+        return
+    
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.split('.')[-1].lower() not in ALLOWED_EXTENSIONS:
+                continue
+            file_path = os.path.join(root, filename)
+            yield os.path.relpath(file_path, path), lambda file_path=file_path: File(open(file_path, 'rb'))
+
+
+class IngestionCheckpoint:
+    """
+    Файл контрольной точки загрузки корпуса (JSON).
+    Для каждого файла корпуса хранится ID созданного документа и признак завершения.
+    """
+    
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.files: Dict[str, Dict[str, any]] = {}
+        
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.files = json.load(f).get('files', {})
+    
+    def is_done(self, name: str) -> bool:
+        """Файл уже загружен"""
+        return self.files.get(name, {}).get('done', False)
+    
+    def get_document_id(self, name: str) -> Optional[str]:
+        """ID документа, созданного для файла при предыдущем запуске"""
+        return self.files.get(name, {}).get('document_id')
+    
+    def mark(self, name: str, document_id: str, done: bool = False):
+        """
+        Сохранить состояние файла
+        
+        Args:
+            name: Относительное имя файла
+            document_id: ID документа
+            done: Документ проиндексирован
+        """
+        with self._lock:
+            self.files[name] = {'document_id': document_id, 'done': done}
+            
+            # Запись через временный файл: прерванная запись не портит контрольную точку
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'files': self.files}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+@dataclass
+class StageStats:
+    """Статистика этапа конвейера"""
+    name: str
+    unit: str
+    workers: int
+    documents: int = 0
+    units: int = 0
+    errors: int = 0
+    busy_time: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    
+    def add(self, units: int, started_at: float):
+        """Учесть обработанный документ"""
+        now = time.time()
+        with self._lock:
+            self.documents += 1
+            self.units += units
+            self.busy_time += now - started_at
+            self.started_at = min(self.started_at or started_at, started_at)
+            self.finished_at = max(self.finished_at or now, now)
+    
+    def add_error(self):
+        """Учесть ошибку обработки документа"""
+        with self._lock:
+            self.errors += 1
+    
+    @property
+    def wall_time(self) -> float:
+        """Время от начала первой до окончания последней обработки на этапе"""
+        if self.started_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+    
+    def summary(self) -> str:
+        """Строка с пропускной способностью этапа"""
+        wall_time = self.wall_time
+        return (
+            f"{self.name}: {self.documents} docs, {self.units} {self.unit}, "
+            f"{self.errors} errors, workers: {self.workers}, "
+            f"busy {self.busy_time:.1f}s / wall {wall_time:.1f}s, "
+            f"{self.units / wall_time if wall_time else 0:.1f} {self.unit}/s, "
+            f"utilization {self.busy_time / (wall_time * self.workers) if wall_time else 0:.0%}"
+        )
+
+
+class _StageStream:
+    """
+    Ограниченный поток данных документа от одного этапа конвейера к следующему:
+    текст от extract к segment, секции от segment к embed, батчи точек от embed
+    к upsert. Следующий этап получает документ в начале работы предыдущего
+    и обрабатывает данные по мере поступления. В потоке ожидают не более
+    max_units единиц (слов, секций, окон), но всегда принимается хотя бы одно значение.
+    Ошибка любой из сторон прерывает другую (см. CorpusIngestor._leave).
+    """
+    
+    def __init__(self, max_units: int):
+        self.max_units = max(1, max_units)
+        # Первая ошибка обработки документа
+        self.error: Optional[Exception] = None
+        self._values = collections.deque()
+        self._units = 0
+        self._finished = False
+        self._condition = threading.Condition()
+    
+    def put(self, value, units: int = 1):
+        """
+        Передать значение (блокируется, пока в потоке нет места)
+        
+        Args:
+            value: Значение
+            units: Объем значения (слов, секций, окон)
+        
+        Raises:
+            Exception: Ошибка обработки документа на другом этапе (работу нужно прекратить)
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.error is not None
+                or not self._values
+                or self._units + units <= self.max_units
+            )
+            if self.error is not None:
+                raise self.error
+            self._values.append((value, units))
+            self._units += units
+            self._condition.notify_all()
+    
+    def finish(self):
+        """Все значения переданы"""
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+    
+    def close(self, error: Exception):
+        """Прервать поток из-за ошибки обработки документа"""
+        with self._condition:
+            if self.error is None:
+                self.error = error
+            self._values.clear()
+            self._units = 0
+            self._condition.notify_all()
+    
+    def __iter__(self) -> Iterator:
+        """
+        Значения до завершения потока
+        
+        Raises:
+            Exception: Ошибка обработки документа на другом этапе
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self.error is not None or self._values or self._finished)
+                if self.error is not None:
+                    raise self.error
+                if not self._values:
+                    return
+                value, units = self._values.popleft()
+                self._units -= units
+                self._condition.notify_all()
+            yield value
+
+
+@dataclass
+class _IngestItem:
+    """Документ, проходящий через этапы конвейера"""
+    name: str
+    open_file: Callable[[], File]
+    document: Optional[Document] = None
+    pieces: Optional[_StageStream] = None
+    sections: Optional[_StageStream] = None
+    points: Optional[_StageStream] = None
+    point_ids: Set[str] = field(default_factory=set)
+    existing_ids: Set[str] = field(default_factory=set)
+    progress: Optional[DocumentProgress] = None
+    # Этапы, работающие с документом, и первая ошибка его обработки
+    open_stages: int = 1
+    error: Optional[Exception] = None
+
+
+class CorpusIngestor:
+    """
+    Конвейер загрузки корпуса: extract -> segment -> embed -> upsert.
+    Каждый документ проходит этапы по порядку, разные документы
+    обрабатываются на разных этапах одновременно. Этап передает документ
+    следующему в начале своей работы, данные документа идут между ними
+    ограниченными потоками (_StageStream), как генераторы в DocumentService.process_document.
+    """
+    
+    def __init__(
+        self,
+        checkpoint: IngestionCheckpoint,
+        extract_workers: int = 2,
+        segment_workers: int = 2,
+        embed_workers: int = 1,
+        upsert_workers: int = 2,
+        queue_size: int = 4,
+        segmenter: Optional[str] = None,
+        service: Optional[DocumentService] = None,
+        max_item_windows: Optional[int] = None,
+        max_item_words: Optional[int] = None,
+        max_item_sections: Optional[int] = None
+    ):
+        self.checkpoint = checkpoint
+        # Сегментатор документов без явно выбранного (None - DOCUMENT_SEGMENTER)
+        self.segmenter = segmenter
+        self.queue_size = max(1, queue_size)
+        # Объем данных одного документа, ожидающих следующего этапа:
+        # слов текста (segment), секций (embed), окон с векторами (upsert)
+        self.max_item_words = max_item_words or getattr(settings, 'INGEST_MAX_ITEM_WORDS', 20000)
+        self.max_item_sections = max_item_sections or getattr(settings, 'INGEST_MAX_ITEM_SECTIONS', 256)
+        self.max_item_windows = max_item_windows or getattr(settings, 'INGEST_MAX_ITEM_WINDOWS', 2048)
+        self.service = service or get_document_service()
+        self.processor = self.service.document_processor
+        
+        self.stages = [
+            (StageStats('extract', 'words', max(1, extract_workers)), self._extract),
+            (StageStats('segment', 'sections', max(1, segment_workers)), self._segment),
+            (StageStats('embed', 'sections', max(1, embed_workers)), self._embed),
+            (StageStats('upsert', 'points', max(1, upsert_workers)), self._upsert),
+        ]
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        # Очереди этапов по имени (задаются в run)
+        self._inboxes: Dict[str, queue.Queue] = {}
+    
+    def _hand_off(self, item: _IngestItem, stage: str):
+        """
+        Передать документ следующему этапу до окончания текущего
+        (блокируется, пока в очереди этапа нет места)
+        """
+        with self._lock:
+            item.open_stages += 1
+        self._inboxes[stage].put(item)
+    
+    def _extract(self, item: _IngestItem) -> Optional[int]:
+        """
+        Создание документа и извлечение текста.
+        Возвращает None, если документ совпадает с уже обработанным
+        и проиндексирован сразу (следующие этапы не нужны).
+        """
+        document_id = self.checkpoint.get_document_id(item.name)
+        document = Document.objects.filter(pk=document_id).first() if document_id else None
+        if document is None:
+            # Новый документ (или документ прерванного запуска был удален)
+            file = item.open_file()
+            try:
+                document = self.service.create_document(file)
+            finally:
+                file.close()
+            self.checkpoint.mark(item.name, str(document.id))
+        item.document = document
+        
+        if self.service.clone_identical_document(document):
+            self.checkpoint.mark(item.name, str(document.id), done=True)
+            with self._lock:
+                self.completed += 1
+            return None
+        
+        document.status = 'processing'
+        document.save(update_fields=['status'])
+        item.progress = DocumentProgress(document, chunk_size=self.processor.CHUNK_SIZE)
+        item.progress.start()
+        
+        with item.progress.timing('extract'):
+            parsed = self.service.parse_document(document)
+        item.progress.parsed = parsed
+        
+        # Сегментация начинается с первых страниц; время извлечения учитывает
+        # этап segment при чтении потока (как в DocumentService.process_document)
+        item.pieces = _StageStream(self.max_item_words)
+        self._hand_off(item, 'segment')
+        words = 0
+        for text in parsed:
+            item.pieces.put(text, units=parsed.words_count - words)
+            words = parsed.words_count
+        item.pieces.finish()
+        
+        document.pages_count = parsed.pages_count
+        document.page_offsets = parsed.page_offsets
+        document.save(update_fields=['pages_count', 'page_offsets'])
+        return parsed.words_count
+    
+    def _segment(self, item: _IngestItem) -> int:
+        """Разделение документа на секции по мере извлечения текста"""
+        item.sections = _StageStream(self.max_item_sections)
+        self._hand_off(item, 'embed')
+        sections = self.processor.iter_sections(
+            item.pieces,
+            item.document.segmenter or self.segmenter,
+            progress=item.progress
+        )
+        count = 0
+        for section in sections:
+            item.sections.put(section)
+            count += 1
+        item.sections.finish()
+        return count
+    
+    def _embed(self, item: _IngestItem) -> int:
+        """
+        Кодирование новых секций документа по мере сегментации.
+        Документ передается этапу upsert до начала кодирования, батчи точек
+        поступают туда через ограниченный поток item.points.
+        """
+        document_id = str(item.document.id)
+        # При возобновлении часть точек документа уже может быть в Qdrant
+        item.existing_ids = self.processor.get_document_section_ids(document_id)
+        item.points = _StageStream(self.max_item_windows)
+        self._hand_off(item, 'upsert')
+        
+        points = 0
+        batches = self.processor.embed_sections(
+            item.sections,
+            document_id,
+            item.point_ids,
+            existing_ids=item.existing_ids,
+            staged=True
+        )
+        for batch in item.progress.timed('embed', batches):
+            item.points.put(batch, units=len(batch))
+            points += len(batch)
+            item.progress.add('embed', windows=len(batch))
+        item.points.finish()
+        return points
+    
+    def _upsert(self, item: _IngestItem) -> int:
+        """Загрузка точек в Qdrant по мере кодирования и переключение поиска на документ"""
+        document_id = str(item.document.id)
+        points = 0
+        for batch in item.points:
+            with item.progress.timing('upsert'):
+                # Отмена проверяется перед загрузкой каждого батча
+                item.progress.raise_if_cancelled()
+                self.processor.upsert_points(batch)
+            points += len(batch)
+            item.progress.add('upsert', points=len(batch))
+        with item.progress.timing('commit'):
+            self.processor.commit_document(document_id, list(item.existing_ids - item.point_ids))
+        
+        document = item.document
+        document.status = 'processed'
+        document.error_message = ''
+        document.indexed_at = timezone.now()
+        document.save(update_fields=['status', 'error_message', 'indexed_at'])
+        item.progress.finish()
+        self.checkpoint.mark(item.name, document_id, done=True)
+        
+        with self._lock:
+            self.completed += 1
+        return points
+    
+    def _leave(self, item: _IngestItem, stats: StageStats, error: Optional[Exception] = None):
+        """
+        Этап закончил работу с документом (error - с ошибкой).
+        Первая ошибка прерывает потоки документа на всех этапах; откат документа
+        выполняет этап, закончивший работу с ним последним.
+        """
+        with self._lock:
+            first_error = error is not None and item.error is None
+            if first_error:
+                item.error = error
+            item.open_stages -= 1
+            last = item.open_stages == 0
+        
+        if first_error:
+            # Ошибки, полученные из потоков документа на других этапах, уже учтены
+            print(f"Error ingesting {item.name} at stage {stats.name}: {error}")
+            stats.add_error()
+            for stream in (item.pieces, item.sections, item.points):
+                if stream is not None:
+                    stream.close(error)
+        if last and item.error is not None:
+            self._fail(item)
+    
+    def _fail(self, item: _IngestItem):
+        """Ошибка обработки документа: документ выбывает из конвейера"""
+        with self._lock:
+            self.failed += 1
+        if item.document is None:
+            return
+        self._rollback(item)
+        if isinstance(item.error, ProcessingCancelled):
+            Document.objects.filter(pk=item.document.pk).update(status='cancelled', cancel_requested=False)
+        else:
+            item.document.status = 'error'
+            item.document.error_message = str(item.error)
+            item.document.save(update_fields=['status', 'error_message'])
+        if item.progress is not None:
+            item.progress.changed(force=True)
+    
+    def _rollback(self, item: _IngestItem):
+        """
+        Откат документа в Qdrant, как при ошибке index_document: удаляются скрытые
+        точки документа (в том числе загруженные частично), его дубликаты секций
+        и отпечатки точек, дубликаты других документов на эти точки индексируются
+        """
+        document_id = str(item.document.id)
+        try:
+            self.processor.remove_document(document_id)
+        except Exception as e:
+            # Ошибка отката не заменяет исходную ошибку документа
+            print(f"Error rolling back document {document_id}: {e}")
+    
+    def _run_worker(self, stats: StageStats, handler, inbox: queue.Queue):
+        """Рабочий поток этапа"""
+        try:
+            while True:
+                item = inbox.get()
+                if item is _STOP:
+                    return
+                
+                started_at = time.time()
+                try:
+                    # Отмена обработки документа проверяется в начале каждого этапа
+                    if item.progress is not None:
+                        item.progress.raise_if_cancelled()
+                    units = handler(item)
+                except Exception as e:
+                    self._leave(item, stats, e)
+                    continue
+                self._leave(item, stats)
+                # None - документ завершен досрочно
+                stats.add(units or 0, started_at)
+        finally:
+            # Закрытие соединений с БД, открытых в рабочем потоке
+            connections.close_all()
+    
+    def run(self, files: Iterator[Tuple[str, Callable[[], File]]]) -> List[StageStats]:
+        """
+        Загрузка корпуса
+        
+        Args:
+            files: Файлы корпуса (см. iter_corpus_files)
+        
+        Returns:
+            Статистика этапов
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self._inboxes = {stats.name: inbox for (stats, _), inbox in zip(self.stages, queues)}
+        threads = []
+        for i, (stats, handler) in enumerate(self.stages):
+            stage_threads = [
+                threading.Thread(
+                    target=self._run_worker,
+                    args=(stats, handler, queues[i]),
+                    name=f'ingest-{stats.name}-{n}',
+                    daemon=True
+                )
+                for n in range(stats.workers)
+            ]
+            for thread in stage_threads:
+                thread.start()
+            threads.append(stage_threads)
+        
+        for name, open_file in files:
+            if self.checkpoint.is_done(name):
+                self.skipped += 1
+                continue
+            queues[0].put(_IngestItem(name=name, open_file=open_file))
+        
+        # Этапы завершаются по очереди: после остановки всех потоков этапа
+        # следующий этап получает признак завершения для каждого своего потока
+        for i, (stats, _) in enumerate(self.stages):
+            for _ in range(stats.workers):
+                queues[i].put(_STOP)
+            for thread in threads[i]:
+                thread.join()
+        
+        return [stats for stats, _ in self.stages]
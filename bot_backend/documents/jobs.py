@@ -0,0 +1,214 @@
+"""
+Очередь задач обработки документов в БД.
+Задачи выполняет management команда ingestion_worker; несколько процессов
+воркеров (в том числе на разных серверах) могут разбирать одну очередь.
+"""
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Document, ProcessingJob
+
+
+class JobQueue:
+    """Очередь задач обработки документов"""
+    
+    def __init__(self):
+        self.max_attempts = getattr(settings, 'PROCESSING_JOB_MAX_ATTEMPTS', 3)
+        self.retry_backoff = getattr(settings, 'PROCESSING_JOB_RETRY_BACKOFF', 60)
+        self.heartbeat_timeout = getattr(settings, 'PROCESSING_JOB_HEARTBEAT_TIMEOUT', 300)
+    
+    def enqueue(self, document: Document, action: str = 'process') -> Tuple[ProcessingJob, bool]:
+        """
+        Поставить документ в очередь обработки
+        
+        Args:
+            document: Объект документа
+            action: Действие ('process' или 'reindex')
+        
+        Returns:
+            tuple: Задача и признак создания новой задачи
+                   (False - у документа уже есть активная задача)
+        """
+        active_job = ProcessingJob.objects.filter(
+            document=document,
+            status__in=ProcessingJob.ACTIVE_STATUSES
+        ).first()
+        if active_job:
+            return active_job, False
+        
+        try:
+            with transaction.atomic():
+                job = ProcessingJob.objects.create(
+                    document=document,
+                    action=action,
+                    max_attempts=self.max_attempts
+                )
+                # Отмена, запрошенная для предыдущей обработки, не действует на новую
+                Document.objects.filter(pk=document.pk).update(cancel_requested=False)
+        except IntegrityError:
+            # Задача для документа создана параллельным запросом
+            return ProcessingJob.objects.get(
+                document=document,
+                status__in=ProcessingJob.ACTIVE_STATUSES
+            ), False
+        
+        return job, True
+    
+    def claim(self, worker_id: str) -> Optional[ProcessingJob]:
+        """
+        Захватить следующую готовую к выполнению задачу
+        
+        Args:
+            worker_id: Идентификатор воркера
+        
+        Returns:
+            ProcessingJob или None: Захваченная задача
+        """
+        now = timezone.now()
+        ready_jobs = ProcessingJob.objects.filter(
+            status='queued',
+            run_after__lte=now
+        ).order_by('run_after', 'created_at')
+        
+        if connection.features.has_select_for_update_skip_locked:
+            # Блокировка строки: задачи, захваченные другими воркерами, пропускаются
+            with transaction.atomic():
+                job = ready_jobs.select_for_update(skip_locked=True).first()
+                if job is None:
+                    return None
+                self._mark_running(job.pk, worker_id, now)
+        else:
+            # БД без SELECT ... FOR UPDATE SKIP LOCKED (SQLite):
+            # условный UPDATE захватывает задачу только одним воркером
+            for job_id in ready_jobs.values_list('pk', flat=True)[:10]:
+                if self._mark_running(job_id, worker_id, now, only_queued=True):
+                    break
+            else:
+                return None
+            job = ProcessingJob(pk=job_id)
+        
+        job.refresh_from_db()
+        return job
+    
+    def _mark_running(self, job_id: int, worker_id: str, now, only_queued: bool = False) -> bool:
+        """Перевести задачу в статус выполнения"""
+        jobs = ProcessingJob.objects.filter(pk=job_id)
+        if only_queued:
+            jobs = jobs.filter(status='queued')
+        return jobs.update(
+            status='running',
+            locked_by=worker_id,
+            heartbeat_at=now,
+            started_at=now,
+            attempts=F('attempts') + 1
+        ) > 0
+    
+    def heartbeat(self, worker_id: str) -> int:
+        """
+        Отметить, что задачи воркера еще выполняются
+        
+        Returns:
+            int: Количество выполняющихся задач воркера
+        """
+        return ProcessingJob.objects.filter(
+            status='running',
+            locked_by=worker_id
+        ).update(heartbeat_at=timezone.now())
+    
+    def complete(self, job: ProcessingJob):
+        """Отметить задачу как выполненную"""
+        ProcessingJob.objects.filter(pk=job.pk, status='running').update(
+            status='done',
+            last_error='',
+            finished_at=timezone.now()
+        )
+    
+    def cancel(self, job: ProcessingJob):
+        """Отметить выполнявшуюся задачу как отмененную"""
+        ProcessingJob.objects.filter(pk=job.pk, status='running').update(
+            status='cancelled',
+            finished_at=timezone.now()
+        )
+    
+    def cancel_queued(self, document: Document) -> int:
+        """
+        Снять с очереди задачи документа, которые еще не начали выполняться
+        
+        Returns:
+            int: Количество отмененных задач
+        """
+        return ProcessingJob.objects.filter(document=document, status='queued').update(
+            status='cancelled',
+            finished_at=timezone.now()
+        )
+    
+    def fail(self, job: ProcessingJob, error: str):
+        """
+        Отметить неудачную попытку выполнения задачи.
+        Задача возвращается в очередь с экспоненциальной задержкой,
+        пока не исчерпано количество попыток.
+        """
+        if job.attempts < job.max_attempts:
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            ProcessingJob.objects.filter(pk=job.pk, status='running').update(
+                status='queued',
+                locked_by='',
+                last_error=error,
+                run_after=timezone.now() + timedelta(seconds=delay)
+            )
+            print(f"Job {job.pk} failed (attempt {job.attempts}/{job.max_attempts}), retry in {delay}s")
+        else:
+            ProcessingJob.objects.filter(pk=job.pk, status='running').update(
+                status='failed',
+                last_error=error,
+                finished_at=timezone.now()
+            )
+            print(f"Job {job.pk} failed after {job.attempts} attempts")
+    
+    def recover_orphaned(self) -> int:
+        """
+        Вернуть в очередь задачи, воркер которых перестал подавать сигналы
+        (процесс был остановлен или упал во время обработки)
+        
+        Returns:
+            int: Количество восстановленных задач
+        """
+        border = timezone.now() - timedelta(seconds=self.heartbeat_timeout)
+        orphaned = ProcessingJob.objects.filter(status='running', heartbeat_at__lt=border)
+        
+        recovered = 0
+        for job in orphaned:
+            error = f"Воркер {job.locked_by} перестал отвечать"
+            # Документ, проиндексированный ранее, остается в поиске в прежней версии
+            documents = Document.objects.filter(pk=job.document_id, status='processing')
+            documents.filter(indexed_at__isnull=False).update(status='processed', error_message=error)
+            if job.attempts < job.max_attempts:
+                recovered += ProcessingJob.objects.filter(pk=job.pk, status='running').update(
+                    status='queued',
+                    locked_by='',
+                    last_error=error,
+                    run_after=timezone.now()
+                )
+                # Документ ожидает повторной обработки
+                documents.update(status='pending', error_message=error)
+            else:
+                ProcessingJob.objects.filter(pk=job.pk, status='running').update(
+                    status='failed',
+                    last_error=error,
+                    finished_at=timezone.now()
+                )
+                documents.update(status='error', error_message=error)
+        
+        if recovered:
+            print(f"Recovered {recovered} orphaned jobs")
+        return recovered
+
+
+def get_job_queue() -> JobQueue:
+    """Получить экземпляр очереди задач"""
+    return JobQueue()
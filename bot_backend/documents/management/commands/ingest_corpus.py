@@ -0,0 +1,132 @@
+"""
+Management команда конвейерной загрузки корпуса документов
+Использование: python manage.py ingest_corpus <каталог|архив.zip> [--resume]
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.ingestion import CorpusIngestor, IngestionCheckpoint, iter_corpus_files
+
+
+class Command(BaseCommand):
+    help = 'Загрузка корпуса документов из каталога или zip архива'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Каталог или zip архив с документами (pdf, rtf, docx, txt)'
+        )
+        parser.add_argument(
+            '--extract-workers',
+            type=int,
+            default=2,
+            help='Потоков извлечения текста (по умолчанию 2)'
+        )
+        parser.add_argument(
+            '--segment-workers',
+            type=int,
+            default=2,
+            help='Документов, одновременно сегментируемых (по умолчанию 2)'
+        )
+        parser.add_argument(
+            '--embed-workers',
+            type=int,
+            default=1,
+            help='Потоков вычисления эмбеддингов (по умолчанию 1)'
+        )
+        parser.add_argument(
+            '--upsert-workers',
+            type=int,
+            default=2,
+            help='Потоков загрузки в Qdrant (по умолчанию 2)'
+        )
+        parser.add_argument(
+            '--queue-size',
+            type=int,
+            default=4,
+            help='Емкость очереди перед каждым этапом в документах (по умолчанию 4)'
+        )
+        parser.add_argument(
+            '--max-item-windows',
+            type=int,
+            default=None,
+            help='Точек документа, ожидающих загрузки в Qdrant (по умолчанию INGEST_MAX_ITEM_WINDOWS)'
+        )
+        parser.add_argument(
+            '--max-item-words',
+            type=int,
+            default=None,
+            help='Слов текста документа, ожидающих сегментации (по умолчанию INGEST_MAX_ITEM_WORDS)'
+        )
+        parser.add_argument(
+            '--max-item-sections',
+            type=int,
+            default=None,
+            help='Секций документа, ожидающих кодирования (по умолчанию INGEST_MAX_ITEM_SECTIONS)'
+        )
+        parser.add_argument(
+            '--segmenter',
+            choices=['llm', 'rules', 'auto'],
+            default=None,
+            help='Сегментатор документов: llm, rules (по заголовкам, без LLM) или auto '
+                 '(по умолчанию DOCUMENT_SEGMENTER)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=None,
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint.json)'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить с контрольной точки: пропустить загруженные файлы'
+        )
+    
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f'Путь не найден: {path}')
+        
+        checkpoint_path = options['checkpoint'] or f"{path.rstrip(os.sep)}.checkpoint.json"
+        checkpoint = IngestionCheckpoint(checkpoint_path, resume=options['resume'])
+        
+        ingestor = CorpusIngestor(
+            checkpoint,
+            extract_workers=options['extract_workers'],
+            segment_workers=options['segment_workers'],
+            embed_workers=options['embed_workers'],
+            upsert_workers=options['upsert_workers'],
+            queue_size=options['queue_size'],
+            segmenter=options['segmenter'],
+            max_item_windows=options['max_item_windows'],
+            max_item_words=options['max_item_words'],
+            max_item_sections=options['max_item_sections']
+        )
+        
+        self.stdout.write(f'Загрузка корпуса: {path}')
+        self.stdout.write(f'Контрольная точка: {checkpoint_path}')
+        
+        start_time = time.time()
+        stages = ingestor.run(iter_corpus_files(path))
+        elapsed = time.time() - start_time
+        
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS('ПРОПУСКНАЯ СПОСОБНОСТЬ ЭТАПОВ:'))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        for stats in stages:
+            self.stdout.write(stats.summary())
+        
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(f'Загружено документов: {ingestor.completed}')
+        self.stdout.write(f'Пропущено (загружены ранее): {ingestor.skipped}')
+        self.stdout.write(f'Ошибок: {ingestor.failed}')
+        self.stdout.write(f'Общее время: {elapsed:.1f}s')
+        
+        if ingestor.failed:
+            self.stdout.write(self.style.WARNING(
+                'Документы с ошибками будут обработаны повторно при запуске с --resume'
+            ))
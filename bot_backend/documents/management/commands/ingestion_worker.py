@@ -0,0 +1,125 @@
+"""
+Management команда воркера обработки документов
+Использование: python manage.py ingestion_worker [--workers 2] [--burst]
+"""
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from documents.jobs import get_job_queue
+from documents.services import get_document_service
+from integrations.load_documents import ProcessingCancelled
+
+
+class Command(BaseCommand):
+    help = 'Воркер очереди обработки документов'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'PROCESSING_WORKERS', 2),
+            help='Количество параллельно обрабатываемых документов'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Интервал опроса очереди в секундах (по умолчанию 2)'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Завершить работу, когда очередь опустеет'
+        )
+    
+    def handle(self, *args, **options):
+        self.queue = get_job_queue()
+        self.service = get_document_service()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = options['poll_interval']
+        self.burst = options['burst']
+        self.stop_event = threading.Event()
+        
+        workers_count = max(1, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker {self.worker_id} started with {workers_count} threads'
+        ))
+        
+        # Задачи, брошенные упавшими воркерами, возвращаются в очередь при старте
+        self.queue.recover_orphaned()
+        
+        threads = [
+            threading.Thread(target=self.run_loop, name=f'ingestion-{i}', daemon=True)
+            for i in range(workers_count)
+        ]
+        for thread in threads:
+            thread.start()
+        
+        heartbeat_interval = getattr(settings, 'PROCESSING_JOB_HEARTBEAT_INTERVAL', 30)
+        try:
+            # Основной поток подает сигналы активности и восстанавливает брошенные задачи
+            last_heartbeat = time.time()
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(1)
+                if time.time() - last_heartbeat >= heartbeat_interval:
+                    self.queue.heartbeat(self.worker_id)
+                    self.queue.recover_orphaned()
+                    last_heartbeat = time.time()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopping worker, waiting for running jobs...'))
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+        
+        self.stdout.write(self.style.SUCCESS(f'Worker {self.worker_id} stopped'))
+    
+    def run_loop(self):
+        """Цикл захвата и выполнения задач"""
+        while not self.stop_event.is_set():
+            try:
+                job = self.queue.claim(self.worker_id)
+            except Exception as e:
+                self.stderr.write(f'Error claiming job: {e}')
+                job = None
+            
+            if job is None:
+                connections.close_all()
+                if self.burst:
+                    return
+                self.stop_event.wait(self.poll_interval)
+                continue
+            
+            self.run_job(job)
+            connections.close_all()
+    
+    def run_job(self, job):
+        """Выполнение задачи"""
+        self.stdout.write(f'Job {job.pk}: {job.action} document {job.document_id} (attempt {job.attempts})')
+        start_time = time.time()
+        # После неудачной попытки задача вернется в очередь (см. JobQueue.fail)
+        retry_pending = job.attempts < job.max_attempts
+        try:
+            if job.action == 'reindex':
+                self.service.reindex_document(job.document, retry_pending=retry_pending)
+            else:
+                self.service.process_document(job.document, retry_pending=retry_pending)
+        except ProcessingCancelled:
+            self.queue.cancel(job)
+            self.stdout.write(self.style.WARNING(
+                f'Job {job.pk} cancelled after {time.time() - start_time:.1f}s'
+            ))
+            return
+        except Exception as e:
+            self.queue.fail(job, str(e))
+            return
+        
+        self.queue.complete(job)
+        self.stdout.write(self.style.SUCCESS(
+            f'Job {job.pk} done in {time.time() - start_time:.1f}s'
+        ))
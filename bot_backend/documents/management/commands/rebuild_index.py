@@ -0,0 +1,51 @@
+"""
+Management команда полной пересборки индекса без простоя поиска
+Использование: python manage.py rebuild_index [--keep-old] [--swap-to <коллекция>]
+"""
+from django.core.management.base import BaseCommand
+
+from documents.services import get_document_service
+
+
+class Command(BaseCommand):
+    help = 'Пересборка индекса Qdrant в теневой коллекции с атомарным переключением'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help='Не удалять предыдущую коллекцию после переключения'
+        )
+        parser.add_argument(
+            '--swap-to',
+            type=str,
+            default=None,
+            help='Только переключить alias рабочей коллекции на существующую коллекцию '
+                 '(например, если переключение при пересборке не завершилось)'
+        )
+    
+    def handle(self, *args, **options):
+        service = get_document_service()
+        
+        if options['swap_to']:
+            ai_client = service.document_processor.ai_client
+            previous = ai_client.swap_collection(options['swap_to'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Alias '{ai_client.collection_name}' указывает на '{options['swap_to']}'"
+            ))
+            if previous:
+                self.stdout.write(f"Предыдущая коллекция: {previous} (сохранена)")
+            return
+        
+        stats = service.rebuild_index(keep_old=options['keep_old'])
+        
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS('ИНДЕКС ПЕРЕСОБРАН:'))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(f"Коллекция: {stats['collection']}")
+        if stats['previous_collection']:
+            state = 'сохранена' if options['keep_old'] else 'удалена'
+            self.stdout.write(f"Предыдущая коллекция: {stats['previous_collection']} ({state})")
+        self.stdout.write(f"Документов: {stats['documents']}")
+        self.stdout.write(f"Удалено точек удаленных документов: {stats['orphaned']} док.")
+        self.stdout.write(f"Поставлено в очередь на переиндексацию: {stats['requeued']}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_alter_document_file_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='page_offsets',
+            field=models.JSONField(blank=True, default=list, help_text='Номер первого слова каждой страницы от начала документа', verbose_name='Смещения страниц'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_processingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Повторная загрузка того же файла не обрабатывается заново', max_length=64, verbose_name='Хэш содержимого (sha256)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_document_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='segmenter',
+            field=models.CharField(blank=True, choices=[('', 'По умолчанию'), ('llm', 'LLM'), ('rules', 'По заголовкам'), ('auto', 'По заголовкам, при неуверенности LLM')], default='', help_text='Способ разделения документа на секции (по умолчанию DOCUMENT_SEGMENTER)', max_length=10, verbose_name='Сегментатор'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_segmenter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='chunks_done',
+            field=models.PositiveIntegerField(default=0, verbose_name='Обработано chunks'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='chunks_total',
+            field=models.PositiveIntegerField(blank=True, help_text='Оценка по прочитанным страницам, точное значение - после извлечения всего текста', null=True, verbose_name='Всего chunks'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Обновление хода обработки'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='stage',
+            field=models.CharField(blank=True, choices=[('', 'Не начата'), ('extract', 'Извлечение текста'), ('segment', 'Разделение на секции'), ('embed', 'Вычисление эмбеддингов'), ('upsert', 'Загрузка в Qdrant'), ('commit', 'Переключение поиска'), ('done', 'Завершена')], default='', max_length=20, verbose_name='Этап обработки'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='stage_stats',
+            field=models.JSONField(blank=True, default=dict, help_text='Время (seconds) и счетчики каждого этапа обработки, в том числе токены LLM', verbose_name='Статистика этапов'),
+        ),
+    ]
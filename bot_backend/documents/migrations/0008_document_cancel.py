@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_document_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='cancel_requested',
+            field=models.BooleanField(default=False, help_text='Обработка проверяет признак между chunks и батчами и откатывает загруженные точки', verbose_name='Запрошена отмена обработки'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает обработки'), ('processing', 'Обрабатывается'), ('processed', 'Обработан'), ('error', 'Ошибка'), ('cancelled', 'Обработка отменена')], default='pending', max_length=20, verbose_name='Статус обработки'),
+        ),
+        migrations.AlterField(
+            model_name='processingjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка'), ('cancelled', 'Отменена')], default='queued', max_length=20, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_document_cancel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='indexed_at',
+            field=models.DateTimeField(blank=True, help_text='Время, когда поиск переключился на текущую версию секций документа', null=True, verbose_name='Дата индексации'),
+        ),
+    ]
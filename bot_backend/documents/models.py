@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 import os
 
@@ -20,13 +21,34 @@ class Document(models.Model):
         ('txt', 'TXT'),
     ]
     
+    SEGMENTER_CHOICES = [
+        ('', 'По умолчанию'),
+        ('llm', 'LLM'),
+        ('rules', 'По заголовкам'),
+        ('auto', 'По заголовкам, при неуверенности LLM'),
+    ]
+    
     STATUS_CHOICES = [
         ('pending', 'Ожидает обработки'),
         ('processing', 'Обрабатывается'),
         ('processed', 'Обработан'),
         ('error', 'Ошибка'),
+        ('cancelled', 'Обработка отменена'),
     ]
     
+    STAGE_CHOICES = [
+        ('', 'Не начата'),
+        ('extract', 'Извлечение текста'),
+        ('segment', 'Разделение на секции'),
+        ('embed', 'Вычисление эмбеддингов'),
+        ('upsert', 'Загрузка в Qdrant'),
+        ('commit', 'Переключение поиска'),
+        ('done', 'Завершена'),
+    ]
+    
+    # Поля хода обработки (сохраняются с update_fields)
+    PROGRESS_FIELDS = ['stage', 'chunks_done', 'chunks_total', 'stage_stats', 'progress_updated_at']
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255, verbose_name="Название документа")
     file = models.FileField(
@@ -62,6 +84,66 @@ class Document(models.Model):
         blank=True,
         verbose_name="Количество страниц"
     )
+    page_offsets = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Смещения страниц",
+        help_text="Номер первого слова каждой страницы от начала документа"
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name="Хэш содержимого (sha256)",
+        help_text="Повторная загрузка того же файла не обрабатывается заново"
+    )
+    segmenter = models.CharField(
+        max_length=10,
+        choices=SEGMENTER_CHOICES,
+        blank=True,
+        default='',
+        verbose_name="Сегментатор",
+        help_text="Способ разделения документа на секции (по умолчанию DOCUMENT_SEGMENTER)"
+    )
+    stage = models.CharField(
+        max_length=20,
+        choices=STAGE_CHOICES,
+        blank=True,
+        default='',
+        verbose_name="Этап обработки"
+    )
+    chunks_done = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Обработано chunks"
+    )
+    chunks_total = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Всего chunks",
+        help_text="Оценка по прочитанным страницам, точное значение - после извлечения всего текста"
+    )
+    stage_stats = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Статистика этапов",
+        help_text="Время (seconds) и счетчики каждого этапа обработки, в том числе токены LLM"
+    )
+    progress_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Обновление хода обработки"
+    )
+    indexed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата индексации",
+        help_text="Время, когда поиск переключился на текущую версию секций документа"
+    )
+    cancel_requested = models.BooleanField(
+        default=False,
+        verbose_name="Запрошена отмена обработки",
+        help_text="Обработка проверяет признак между chunks и батчами и откатывает загруженные точки"
+    )
     
     class Meta:
         verbose_name = "Документ"
@@ -82,3 +164,100 @@ class Document(models.Model):
                 return f"{size:.1f} {unit}"
             size /= 1024.0
         return f"{size:.1f} ТБ"
+
+
+class ProcessingJob(models.Model):
+    """Задача фоновой обработки документа (очередь для ingestion_worker)"""
+    
+    ACTION_CHOICES = [
+        ('process', 'Обработка'),
+        ('reindex', 'Переиндексация'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+        ('cancelled', 'Отменена'),
+    ]
+    
+    ACTIVE_STATUSES = ['queued', 'running']
+    
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        verbose_name="Документ"
+    )
+    action = models.CharField(
+        max_length=20,
+        choices=ACTION_CHOICES,
+        default='process',
+        verbose_name="Действие"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Попыток"
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=3,
+        verbose_name="Максимум попыток"
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Запуск не ранее"
+    )
+    locked_by = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Воркер"
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Последний сигнал воркера"
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name="Последняя ошибка"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания"
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Начало выполнения"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Завершение"
+    )
+    
+    class Meta:
+        verbose_name = "Задача обработки"
+        verbose_name_plural = "Задачи обработки"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+        constraints = [
+            # Не более одной активной задачи на документ
+            models.UniqueConstraint(
+                fields=['document'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_job_per_document'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_action_display()}: {self.document} ({self.get_status_display()})"
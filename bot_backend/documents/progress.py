@@ -0,0 +1,108 @@
+"""
+Ход обработки документа: этап, обработанные chunks, время и счетчики этапов.
+Состояние сохраняется в полях документа (Document.PROGRESS_FIELDS) точечными
+UPDATE не чаще PROGRESS_UPDATE_INTERVAL, чтобы не нагружать БД на каждом chunk.
+"""
+import math
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from integrations.load_documents import IndexingProgress
+from .models import Document
+
+
+class DocumentProgress(IndexingProgress):
+    """Ход обработки, сохраняемый в полях документа"""
+    
+    def __init__(self, document: Document, chunk_size: Optional[int] = None):
+        """
+        Args:
+            document: Обрабатываемый документ
+            chunk_size: Размер chunk в словах (для оценки количества chunks)
+        """
+        super().__init__()
+        self.document = document
+        self.chunk_size = chunk_size
+        # Разобранный документ (ParsedDocument): по прочитанным страницам оценивается объем
+        self.parsed = None
+        self.interval = getattr(settings, 'PROGRESS_UPDATE_INTERVAL', 1.0)
+        self._saved_at = 0.0
+        self._save_lock = threading.Lock()
+        self.cancel_check_interval = getattr(settings, 'PROCESSING_CANCEL_CHECK_INTERVAL', 1.0)
+        self._checked_at = 0.0
+        self._cancelled = False
+    
+    def start(self):
+        """Начало обработки: сброс хода предыдущей обработки"""
+        self.chunks_done = 0
+        self.chunks_total = None
+        self.stats = {}
+        self.set_stage('extract')
+    
+    def finish(self):
+        """Обработка завершена"""
+        self.stage = 'done'
+        self.chunks_total = self.chunks_done
+        self.changed(force=True)
+    
+    def cancelled(self) -> bool:
+        """Запрошена отмена обработки или документ удален (признак читается из БД не чаще интервала)"""
+        now = time.monotonic()
+        if self._cancelled or now - self._checked_at < self.cancel_check_interval:
+            return self._cancelled
+        self._checked_at = now
+        
+        cancel_requested = Document.objects.filter(pk=self.document.pk).values_list(
+            'cancel_requested', flat=True
+        ).first()
+        self._cancelled = cancel_requested is None or cancel_requested
+        return self._cancelled
+    
+    def _estimate_chunks_total(self) -> Optional[int]:
+        """Количество chunks документа: точное после извлечения текста, до этого - оценка"""
+        parsed = self.parsed
+        if parsed is None or not self.chunk_size:
+            return self.chunks_total
+        
+        if parsed.finished:
+            total = math.ceil(parsed.words_count / self.chunk_size)
+        elif parsed.pages_count and parsed.page_offsets:
+            # Количество страниц PDF известно заранее: объем оценивается по прочитанным страницам
+            words_per_page = parsed.words_count / len(parsed.page_offsets)
+            total = math.ceil(words_per_page * parsed.pages_count / self.chunk_size)
+        else:
+            return None
+        return max(total, self.chunks_done)
+    
+    def changed(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._saved_at < self.interval:
+            return
+        
+        with self._save_lock:
+            self._saved_at = now
+            self.chunks_total = self._estimate_chunks_total()
+            
+            document = self.document
+            document.stage = self.stage
+            document.chunks_done = self.chunks_done
+            document.chunks_total = self.chunks_total
+            with self._lock:
+                if self.parsed is not None:
+                    self.stats.setdefault('extract', {'seconds': 0.0})['words'] = self.parsed.words_count
+                document.stage_stats = {
+                    stage: {key: round(value, 2) if key == 'seconds' else value for key, value in stats.items()}
+                    for stage, stats in self.stats.items()
+                }
+            document.progress_updated_at = timezone.now()
+            
+            try:
+                document.save(update_fields=Document.PROGRESS_FIELDS)
+            except DatabaseError as e:
+                # Ошибка сохранения хода не должна прерывать обработку документа
+                print(f"Error saving progress of document {document.id}: {e}")
@@ -1,6 +1,7 @@
 """Сериализаторы для модуля документов"""
 from rest_framework import serializers
 from .models import Document
+from .upload_handlers import get_content_hash
 
 
 class DocumentListSerializer(serializers.ModelSerializer):
@@ -57,6 +58,8 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
             'status',
             'error_message',
             'pages_count',
+            'segmenter',
+            'indexed_at',
         ]
         read_only_fields = [
             'id',
@@ -65,6 +68,7 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
             'status',
             'error_message',
             'pages_count',
+            'indexed_at',
         ]
     
     def get_file_size_display(self, obj):
@@ -88,6 +92,7 @@ class DocumentUploadSerializer(serializers.ModelSerializer):
         fields = [
             'title',
             'file',
+            'segmenter',
         ]
     
     def validate_file(self, value):
@@ -123,6 +128,8 @@ class DocumentUploadSerializer(serializers.ModelSerializer):
             file=file,
             file_type=file_type,
             file_size=file.size,
+            content_hash=get_content_hash(file),
+            segmenter=validated_data.get('segmenter', ''),
             status='pending'
         )
         
@@ -139,5 +146,10 @@ class DocumentStatusSerializer(serializers.ModelSerializer):
             'title',
             'status',
             'error_message',
+            'stage',
+            'chunks_done',
+            'chunks_total',
+            'stage_stats',
+            'progress_updated_at',
         ]
         read_only_fields = fields
@@ -1,72 +1,145 @@
 """Сервисный слой для работы с документами"""
 import os
-from typing import Optional
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.db.models import Q
+from django.core.files import File
 from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
 
 # Импорты для работы с разными форматами документов
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
-
-try:
-    from docx import Document as DocxDocument
-except ImportError:
-    DocxDocument = None
-
 try:
     from striprtf.striprtf import rtf_to_text
 except ImportError:
     rtf_to_text = None
 
 from .models import Document
-from integrations.load_documents import get_document_processor
+from .jobs import get_job_queue
+from .extraction import iter_pdf_pages, iter_docx_paragraphs, read_pdf_pages_count
+from .progress import DocumentProgress
+from .upload_handlers import get_content_hash
+from integrations.load_documents import ProcessingCancelled, get_document_processor
+
+
+class ParsedDocument:
+    """
+    Результат однопроходного разбора файла документа.
+    Текст читается при итерации по объекту; количество страниц и смещения
+    начала страниц (в словах от начала документа) заполняются по мере чтения.
+    """
+    
+    def __init__(self, pieces: Iterator[Tuple[str, bool]], pages_count: Optional[int] = None):
+        """
+        Args:
+            pieces: Фрагменты текста и признак начала новой страницы
+            pages_count: Количество страниц, если известно заранее
+        """
+        self._pieces = pieces
+        self.pages_count = pages_count
+        self.page_offsets: List[int] = []
+        self.words_count = 0
+        # Текст прочитан полностью
+        self.finished = False
+    
+    def __iter__(self) -> Iterator[str]:
+        for text, new_page in self._pieces:
+            if new_page:
+                self.page_offsets.append(self.words_count)
+            self.words_count += len(text.split())
+            yield text
+        
+        if self.pages_count is None and self.page_offsets:
+            self.pages_count = len(self.page_offsets)
+        self.finished = True
 
 
 class DocumentService:
     """Сервис для работы с документами"""
     
+    # Оценка размера страницы для форматов без явных страниц
+    DOCX_PARAGRAPHS_PER_PAGE = 30
+    TXT_CHARS_PER_PAGE = 2000
+    
     def __init__(self):
         self.document_processor = get_document_processor()
-    
-    def extract_text_from_pdf(self, file_path: str) -> str:
-        """Извлечение текста из PDF"""
-        if not PyPDF2:
-            raise ImportError("PyPDF2 не установлен")
-        
-        text = []
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text.append(page.extract_text())
         
-        return '\n'.join(text)
+        # Процессы извлечения текста PDF/DOCX (0 - извлечение в текущем процессе)
+        self.extraction_processes = max(0, getattr(settings, 'EXTRACTION_PROCESSES', 2))
+        # Количество страниц PDF в одной задаче пула процессов
+        self.pdf_pages_per_task = max(1, getattr(settings, 'PDF_PAGES_PER_TASK', 20))
+        # Ожидание остановки обработки при удалении документа (сек)
+        self.delete_wait_timeout = getattr(settings, 'DOCUMENT_DELETE_WAIT_TIMEOUT', 30)
     
-    def extract_text_from_docx(self, file_path: str) -> str:
-        """Извлечение текста из DOCX"""
-        if not DocxDocument:
-            raise ImportError("python-docx не установлен")
-        
-        doc = DocxDocument(file_path)
-        text = []
-        for paragraph in doc.paragraphs:
-            text.append(paragraph.text)
+    def iter_text_from_pdf(self, file_path: str, pages_count: Optional[int] = None) -> Iterator[str]:
+        """Постраничное извлечение текста из PDF (диапазоны страниц параллельно в пуле процессов)"""
+        if pages_count is None:
+            pages_count = read_pdf_pages_count(file_path)
         
-        return '\n'.join(text)
+        return iter_pdf_pages(
+            file_path,
+            pages_count,
+            pages_per_task=self.pdf_pages_per_task,
+            max_workers=self.extraction_processes
+        )
     
-    def extract_text_from_rtf(self, file_path: str) -> str:
-        """Извлечение текста из RTF"""
+    def iter_text_from_docx(self, file_path: str) -> Iterator[str]:
+        """Извлечение текста из DOCX по абзацам (в пуле процессов)"""
+        return iter_docx_paragraphs(file_path, max_workers=self.extraction_processes)
+    
+    def iter_text_from_rtf(self, file_path: str) -> Iterator[str]:
+        """Извлечение текста из RTF (striprtf обрабатывает документ целиком)"""
         if not rtf_to_text:
             raise ImportError("striprtf не установлен")
         
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
             rtf_content = file.read()
-            return rtf_to_text(rtf_content)
+        yield rtf_to_text(rtf_content)
+    
+    def iter_text_from_txt(self, file_path: str) -> Iterator[str]:
+        """Построчное извлечение текста из TXT"""
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+            for line in file:
+                yield line
+    
+    def extract_text_from_pdf(self, file_path: str) -> str:
+        """Извлечение текста из PDF"""
+        return '\n'.join(self.iter_text_from_pdf(file_path))
+    
+    def extract_text_from_docx(self, file_path: str) -> str:
+        """Извлечение текста из DOCX"""
+        return '\n'.join(self.iter_text_from_docx(file_path))
+    
+    def extract_text_from_rtf(self, file_path: str) -> str:
+        """Извлечение текста из RTF"""
+        return ''.join(self.iter_text_from_rtf(file_path))
     
     def extract_text_from_txt(self, file_path: str) -> str:
         """Извлечение текста из TXT"""
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            return file.read()
+        return ''.join(self.iter_text_from_txt(file_path))
+    
+    def iter_text(self, document: Document) -> Iterator[str]:
+        """
+        Потоковое извлечение текста из документа в зависимости от типа
+        
+        Args:
+            document: Объект документа
+            
+        Returns:
+            Iterator[str]: Фрагменты текста (страницы, абзацы или строки)
+        """
+        file_path = document.file.path
+        
+        if document.file_type == 'pdf':
+            return self.iter_text_from_pdf(file_path)
+        elif document.file_type == 'docx':
+            return self.iter_text_from_docx(file_path)
+        elif document.file_type == 'rtf':
+            return self.iter_text_from_rtf(file_path)
+        elif document.file_type == 'txt':
+            return self.iter_text_from_txt(file_path)
+        else:
+            raise ValueError(f"Неподдерживаемый формат файла: {document.file_type}")
     
     def extract_text(self, document: Document) -> str:
         """
@@ -78,16 +151,54 @@ class DocumentService:
         Returns:
             str: Извлеченный текст
         """
+        separator = '\n' if document.file_type in ('pdf', 'docx') else ''
+        return separator.join(self.iter_text(document))
+    
+    def parse_document(self, document: Document) -> ParsedDocument:
+        """
+        Однопроходный разбор документа: текст, количество страниц и смещения
+        страниц получаются при одном чтении файла
+        
+        Args:
+            document: Объект документа
+            
+        Returns:
+            ParsedDocument: Разобранный документ (текст читается при итерации)
+        """
         file_path = document.file.path
         
         if document.file_type == 'pdf':
-            return self.extract_text_from_pdf(file_path)
+            # Количество страниц известно до извлечения текста,
+            # текст страниц извлекается в пуле процессов
+            pages_count = read_pdf_pages_count(file_path)
+            pages = self.iter_text_from_pdf(file_path, pages_count)
+            return ParsedDocument(((text, True) for text in pages), pages_count=pages_count)
+        
         elif document.file_type == 'docx':
-            return self.extract_text_from_docx(file_path)
-        elif document.file_type == 'rtf':
-            return self.extract_text_from_rtf(file_path)
+            # DOCX не имеет явных страниц - примерно 30 параграфов на страницу
+            paragraphs = self.iter_text_from_docx(file_path)
+            return ParsedDocument(
+                (text, i % self.DOCX_PARAGRAPHS_PER_PAGE == 0)
+                for i, text in enumerate(paragraphs)
+            )
+        
         elif document.file_type == 'txt':
-            return self.extract_text_from_txt(file_path)
+            # Оценка страниц для TXT - примерно 2000 символов на страницу
+            def txt_pages():
+                chars = 0
+                next_page_start = 0
+                for line in self.iter_text_from_txt(file_path):
+                    new_page = chars >= next_page_start
+                    if new_page:
+                        next_page_start += self.TXT_CHARS_PER_PAGE
+                    chars += len(line)
+                    yield line, new_page
+            
+            return ParsedDocument(txt_pages())
+        
+        elif document.file_type == 'rtf':
+            return ParsedDocument((text, False) for text in self.iter_text_from_rtf(file_path))
+        
         else:
             raise ValueError(f"Неподдерживаемый формат файла: {document.file_type}")
     
@@ -101,87 +212,255 @@ class DocumentService:
         Returns:
             int или None: Количество страниц
         """
-        if document.file_type == 'pdf' and PyPDF2:
-            try:
-                with open(document.file.path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    return len(pdf_reader.pages)
-            except Exception:
-                return None
-        elif document.file_type == 'docx' and DocxDocument:
-            try:
-                # DOCX не имеет явного количества страниц
-                # Можно приблизительно оценить по параграфам
-                doc = DocxDocument(document.file.path)
-                # Примерно 30 параграфов на страницу (грубая оценка)
-                return max(1, len(doc.paragraphs) // 30)
-            except Exception:
-                return None
-        elif document.file_type == 'txt':
-            try:
-                # Оценка страниц для TXT по количеству символов
-                # Примерно 2000 символов на страницу
-                with open(document.file.path, 'r', encoding='utf-8', errors='ignore') as file:
-                    text = file.read()
-                    return max(1, len(text) // 2000)
-            except Exception:
-                return None
+        try:
+            parsed = self.parse_document(document)
+            if parsed.pages_count is None:
+                for _ in parsed:
+                    pass
+            return parsed.pages_count
+        except Exception:
+            return None
+    
+    def find_identical_document(self, document: Document) -> Optional[Document]:
+        """
+        Найти обработанный документ с тем же содержимым файла
+        
+        Args:
+            document: Объект документа
+            
+        Returns:
+            Document или None: Документ с совпадающим sha256
+        """
+        if not document.content_hash:
+            return None
         
-        return None
+        return Document.objects.filter(
+            content_hash=document.content_hash,
+            status='processed'
+        ).exclude(pk=document.pk).order_by('upload_date').first()
     
-    def process_document(self, document: Document):
+    def clone_identical_document(self, document: Document) -> bool:
+        """
+        Индексация документа по уже обработанному документу с тем же содержимым
+        (без извлечения текста, LLM и embedder)
+        
+        Args:
+            document: Объект документа
+            
+        Returns:
+            bool: True, если найден идентичный документ и документ обработан
+        """
+        source = self.find_identical_document(document)
+        if source is None:
+            return False
+        
+        start_time = time.time()
+        self.document_processor.clone_document(str(source.id), str(document.id))
+        
+        document.pages_count = source.pages_count
+        document.page_offsets = source.page_offsets
+        document.status = 'processed'
+        document.error_message = ''
+        document.stage = 'done'
+        document.indexed_at = timezone.now()
+        document.save(update_fields=['pages_count', 'page_offsets', 'status', 'error_message', 'stage', 'indexed_at'])
+        
+        print(f"Document {document.id} is identical to {source.id}, indexed in {time.time() - start_time:.2f}s")
+        return True
+    
+    def process_document(self, document: Document, reuse_identical: bool = True, retry_pending: bool = False):
         """
         Обработка и индексация документа
         
         Args:
             document: Объект документа для обработки
+            reuse_identical: Использовать результат обработки документа
+                             с тем же содержимым файла, если он есть
+            retry_pending: При ошибке обработка будет повторена (задача очереди
+                           вернется в очередь), документ остается в ожидании обработки
         """
+        start_time = time.time()
+        progress = DocumentProgress(document, chunk_size=self.document_processor.CHUNK_SIZE)
+        previous_status = document.status
         try:
+            # Повторная загрузка того же файла не обрабатывается заново
+            if reuse_identical and self.clone_identical_document(document):
+                return
+            
             # Обновление статуса
             document.status = 'processing'
-            document.save()
-            
-            # Получение количества страниц
-            pages_count = self.get_pages_count(document)
-            if pages_count:
-                document.pages_count = pages_count
-                document.save()
+            document.save(update_fields=['status'])
+            progress.start()
             
-            # Извлечение текста
-            print(f"Extracting text from document {document.id}...")
-            text = self.extract_text(document)
+            # Разбор файла за один проход (количество страниц PDF известно сразу)
+            with progress.timing('extract'):
+                parsed = self.parse_document(document)
+            progress.parsed = parsed
+            if parsed.pages_count:
+                document.pages_count = parsed.pages_count
+                document.save(update_fields=['pages_count'])
             
-            # Обработка через AI модуль
+            # Потоковая обработка: текст извлекается по страницам (абзацам),
+            # секции индексируются в Qdrant по мере готовности
             print(f"Processing document {document.id} with AI module...")
-            sections = self.document_processor.process_document(text)
-            
-            # Индексация в Qdrant
-            print(f"Indexing document {document.id} in Qdrant...")
-            self.document_processor.index_document(sections, str(document.id))
+            # Загружаются только новые секции, точки исчезнувших секций удаляются
+            sections = self.document_processor.iter_sections(parsed, document.segmenter or None, progress=progress)
+            self.document_processor.sync_document(sections, str(document.id), progress=progress)
             
             # Обновление статуса
+            document.pages_count = parsed.pages_count
+            document.page_offsets = parsed.page_offsets
             document.status = 'processed'
             document.error_message = ''
-            document.save()
+            document.indexed_at = timezone.now()
+            document.save(update_fields=['pages_count', 'page_offsets', 'status', 'error_message', 'indexed_at'])
+            progress.finish()
             
-            print(f"Document {document.id} processed successfully!")
+            print(
+                f"Document {document.id} processed successfully in {time.time() - start_time:.1f}s! "
+                f"({progress.summary()})"
+            )
             
+        except ProcessingCancelled:
+            # Точки, загруженные при этой обработке, удалены, а предыдущая
+            # проиндексированная версия документа остается в поиске
+            document.status = 'processed' if previous_status == 'processed' else 'cancelled'
+            document.error_message = ''
+            document.cancel_requested = False
+            # Документ мог быть удален во время обработки: UPDATE без проверки строки
+            Document.objects.filter(pk=document.pk).update(
+                status=document.status,
+                error_message='',
+                cancel_requested=False
+            )
+            progress.changed(force=True)
+            print(f"Processing of document {document.id} cancelled after {time.time() - start_time:.1f}s")
+            self._remove_deleted_document(document)
+            raise
+        
         except Exception as e:
-            # Обработка ошибок
+            # Обработка ошибок (этап, на котором произошла ошибка, сохраняется)
             print(f"Error processing document {document.id}: {str(e)}")
-            document.status = 'error'
+            if self._remove_deleted_document(document):
+                # Сохранение документа, удаленного во время обработки, завершилось ошибкой
+                raise
+            # Проиндексированная ранее версия документа остается в поиске (как при отмене);
+            # до исчерпания попыток задачи документ ожидает повторной обработки
+            if previous_status == 'processed':
+                document.status = 'processed'
+            else:
+                document.status = 'pending' if retry_pending else 'error'
             document.error_message = str(e)
-            document.save()
+            document.save(update_fields=['status', 'error_message'])
+            progress.changed(force=True)
             raise
     
+    def _remove_deleted_document(self, document: Document) -> bool:
+        """
+        Удаление из Qdrant точек документа, удаленного во время обработки
+        (delete_document не дождался остановки обработки, и она успела
+        загрузить точки после удаления документа из Qdrant)
+        
+        Returns:
+            bool: True, если документа больше нет в БД
+        """
+        if Document.objects.filter(pk=document.pk).exists():
+            return False
+        print(f"Document {document.id} was deleted during processing, removing its points...")
+        self.document_processor.remove_document(str(document.id))
+        return True
+    
+    def create_document(self, file: File, title: Optional[str] = None) -> Document:
+        """
+        Создание документа из файла (загрузка без API)
+        
+        Args:
+            file: Файл документа
+            title: Название документа (по умолчанию - имя файла)
+            
+        Returns:
+            Document: Созданный документ со статусом pending
+        """
+        name = os.path.basename(file.name)
+        document = Document(
+            title=title or name,
+            file_type=name.split('.')[-1].lower(),
+            file_size=file.size,
+            content_hash=get_content_hash(file),
+            status='pending'
+        )
+        document.file.save(name, file, save=False)
+        document.save()
+        return document
+    
+    def cancel_processing(self, document: Document) -> bool:
+        """
+        Отмена обработки документа. Задачи в очереди снимаются сразу;
+        выполняющаяся обработка получает запрос отмены, останавливается
+        на ближайшей границе chunk или батча и откатывает загруженные точки.
+        
+        Args:
+            document: Объект документа
+        
+        Returns:
+            bool: True, если была обработка, которую можно отменить
+        """
+        dequeued = get_job_queue().cancel_queued(document)
+        
+        # Задача могла быть захвачена воркером до смены статуса документа
+        requested = Document.objects.filter(pk=document.pk).filter(
+            Q(status='processing') | Q(jobs__status='running')
+        ).update(cancel_requested=True)
+        
+        if dequeued and not requested:
+            # Документ, ожидавший обработки, не будет обработан
+            Document.objects.filter(pk=document.pk, status__in=['pending', 'error']).update(status='cancelled')
+        
+        if dequeued or requested:
+            print(f"Processing of document {document.id} cancelled ({dequeued} queued jobs, running: {bool(requested)})")
+        return bool(dequeued or requested)
+    
+    def wait_processing_stopped(self, document: Document, timeout: float) -> bool:
+        """
+        Ожидание остановки выполняющейся обработки документа
+        (задача воркера или загрузка корпуса)
+        
+        Args:
+            document: Объект документа
+            timeout: Максимальное время ожидания (сек)
+        
+        Returns:
+            bool: True, если обработка не выполняется
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            running = Document.objects.filter(pk=document.pk).filter(
+                Q(status='processing') | Q(jobs__status='running')
+            ).exists()
+            if not running:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.2)
+    
     def delete_document(self, document: Document):
         """
-        Удаление документа и его данных из Qdrant
+        Удаление документа и его данных из Qdrant.
+        Выполняющаяся обработка документа отменяется; удаление ждет ее остановки
+        (DOCUMENT_DELETE_WAIT_TIMEOUT), чтобы она не загрузила точки после удаления.
         
         Args:
             document: Объект документа для удаления
         """
         try:
+            # Выполняющаяся обработка останавливается на ближайшей границе chunk
+            # или батча и удаляет загруженные ею точки
+            if self.cancel_processing(document) and not self.wait_processing_stopped(
+                document, self.delete_wait_timeout
+            ):
+                # Обработка удалит свои точки сама, обнаружив, что документа больше нет
+                print(f"Processing of document {document.id} did not stop in {self.delete_wait_timeout}s")
+            
             # Удаление из Qdrant
             print(f"Removing document {document.id} from Qdrant...")
             self.document_processor.remove_document(str(document.id))
@@ -199,24 +478,98 @@ class DocumentService:
             print(f"Error deleting document {document.id}: {str(e)}")
             raise
     
-    def reindex_document(self, document: Document):
+    def reindex_document(self, document: Document, retry_pending: bool = False):
         """
-        Переиндексация документа (удаление старых данных и повторная обработка)
+        Переиндексация документа: повторная обработка с инкрементальным
+        обновлением точек (неизмененные секции остаются в Qdrant)
         
         Args:
             document: Объект документа для переиндексации
+            retry_pending: При ошибке переиндексация будет повторена
         """
         try:
-            # Удаление из Qdrant
-            print(f"Removing old data for document {document.id} from Qdrant...")
-            self.document_processor.remove_document(str(document.id))
-            
-            # Повторная обработка
-            self.process_document(document)
+            # Повторная обработка (без использования идентичных документов)
+            self.process_document(document, reuse_identical=False, retry_pending=retry_pending)
             
         except Exception as e:
             print(f"Error reindexing document {document.id}: {str(e)}")
             raise
+    
+    def rebuild_index(self, keep_old: bool = False) -> Dict[str, any]:
+        """
+        Полная пересборка индекса в теневой коллекции.
+        Все обработанные документы индексируются в новую коллекцию, пока поиск
+        продолжает работать со старой; затем alias рабочей коллекции атомарно
+        переключается на новую коллекцию (при первой пересборке - с кратким
+        промежутком без рабочей коллекции, см. AIClient.swap_collection).
+        Статусы документов не меняются.
+        
+        Args:
+            keep_old: Не удалять предыдущую коллекцию после переключения
+            
+        Returns:
+            dict: Статистика пересборки
+        """
+        start_time = time.time()
+        ai_client = self.document_processor.ai_client
+        shadow_collection = f"{ai_client.collection_name}_{time.strftime('%Y%m%d%H%M%S')}"
+        
+        print(f"Creating shadow collection '{shadow_collection}'...")
+        ai_client.create_collection(shadow_collection)
+        shadow_processor = get_document_processor(shadow_collection)
+        
+        document_ids = list(
+            Document.objects.filter(status='processed').values_list('id', flat=True)
+        )
+        try:
+            # Документы, удаленные во время пересборки, пропускаются
+            for i, document in enumerate(Document.objects.filter(id__in=document_ids).iterator()):
+                print(f"Rebuilding document {document.id} ({i + 1}/{len(document_ids)})...")
+                parsed = self.parse_document(document)
+                shadow_processor.index_document(
+                    shadow_processor.iter_sections(parsed, document.segmenter or None),
+                    str(document.id)
+                )
+        except Exception:
+            # Рабочая коллекция не изменена: теневая коллекция удаляется
+            print(f"Index rebuild failed, dropping shadow collection '{shadow_collection}'")
+            ai_client.qdrant_client.delete_collection(shadow_collection)
+            raise
+        
+        previous_collection = ai_client.swap_collection(shadow_collection)
+        # Секции документов пересобраны: сохраненные ответы по ним устарели
+        Document.objects.filter(id__in=document_ids).update(indexed_at=timezone.now())
+        
+        # Точки документов, удаленных во время пересборки
+        orphaned = self.document_processor.remove_orphaned_points(
+            set(str(pk) for pk in Document.objects.values_list('id', flat=True))
+        )
+        
+        # Документы, обработанные во время пересборки, были проиндексированы
+        # в предыдущую коллекцию и обрабатываются повторно
+        job_queue = get_job_queue()
+        requeued = 0
+        for document in Document.objects.filter(status='processed').exclude(id__in=document_ids):
+            _, created = job_queue.enqueue(document, 'reindex')
+            requeued += created
+        
+        in_progress = list(Document.objects.filter(status='processing').values_list('id', flat=True))
+        if in_progress:
+            print(f"Documents processed during alias swap, reindex them when done: {in_progress}")
+        
+        if previous_collection and not keep_old:
+            print(f"Dropping previous collection '{previous_collection}'...")
+            ai_client.qdrant_client.delete_collection(previous_collection)
+        
+        print(f"Index rebuilt in {time.time() - start_time:.1f}s")
+        
+        return {
+            'collection': shadow_collection,
+            'previous_collection': previous_collection,
+            'documents': len(document_ids),
+            'orphaned': orphaned,
+            'requeued': requeued,
+        }
 
 
 def get_document_service() -> DocumentService:
@@ -1,3 +1,303 @@
-from django.test import TestCase
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+
+import PyPDF2
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import extraction
+from .ingestion import _StageStream
+from .jobs import JobQueue
+from .models import Document, ProcessingJob
+from .services import DocumentService
+
+
+class PdfExtractionTests(SimpleTestCase):
+    """Извлечение страниц PDF"""
+    
+    def setUp(self):
+        writer = PyPDF2.PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(width=612, height=792)
+        handle, self.path = tempfile.mkstemp(suffix='.pdf')
+        with os.fdopen(handle, 'wb') as file:
+            writer.write(file)
+        extraction._cached_pdf_reader = None
+    
+    def tearDown(self):
+        extraction._cached_pdf_reader = None
+        os.remove(self.path)
+    
+    def test_pages_count(self):
+        self.assertEqual(extraction.read_pdf_pages_count(self.path), 3)
+    
+    def test_reader_reused_between_ranges(self):
+        self.assertEqual(extraction.extract_pdf_pages(self.path, 0, 2), ['', ''])
+        reader = extraction._cached_pdf_reader[1]
+        self.assertEqual(extraction.extract_pdf_pages(self.path, 2, 3), [''])
+        self.assertIs(extraction._cached_pdf_reader[1], reader)
+    
+    def test_changed_file_is_reread(self):
+        extraction.extract_pdf_pages(self.path, 0, 1)
+        reader = extraction._cached_pdf_reader[1]
+        writer = PyPDF2.PdfWriter()
+        for _ in range(5):
+            writer.add_blank_page(width=612, height=792)
+        with open(self.path, 'wb') as file:
+            writer.write(file)
+        # Другой размер файла - другой ключ кэша
+        self.assertEqual(extraction.extract_pdf_pages(self.path, 3, 5), ['', ''])
+        self.assertIsNot(extraction._cached_pdf_reader[1], reader)
+    
+    def test_in_process_extraction(self):
+        pages = list(extraction.iter_pdf_pages(self.path, 3, pages_per_task=2, max_workers=0))
+        self.assertEqual(pages, ['', '', ''])
+        self.assertIsNone(extraction._cached_pdf_reader)
+
+
+class StageStreamTests(SimpleTestCase):
+    """Ограниченный поток данных документа между этапами загрузки корпуса"""
+    
+    def test_bounded_by_units(self):
+        stream = _StageStream(max_units=5)
+        received = []
+        consumer = threading.Thread(target=lambda: received.extend(stream))
+        stream.put('a', units=3)
+        stream.put('b', units=2)
+        # Третье значение не помещается, пока поток не прочитан
+        blocked = threading.Thread(target=stream.put, args=('c', 1))
+        blocked.start()
+        blocked.join(timeout=0.1)
+        self.assertTrue(blocked.is_alive())
+        consumer.start()
+        blocked.join()
+        stream.finish()
+        consumer.join()
+        self.assertEqual(received, ['a', 'b', 'c'])
+    
+    def test_oversized_value_accepted_when_empty(self):
+        stream = _StageStream(max_units=5)
+        stream.put('big', units=100)
+        stream.finish()
+        self.assertEqual(list(stream), ['big'])
+    
+    def test_error_interrupts_both_sides(self):
+        stream = _StageStream(max_units=1)
+        stream.put('a')
+        error = RuntimeError('segment failed')
+        stream.close(error)
+        with self.assertRaises(RuntimeError):
+            stream.put('b')
+        with self.assertRaises(RuntimeError):
+            list(stream)
+
+
+class _FailingService(DocumentService):
+    """Сервис, обработка документов которого завершается ошибкой извлечения текста"""
+    
+    def __init__(self):
+        self.document_processor = SimpleNamespace(CHUNK_SIZE=1000)
+    
+    def parse_document(self, document):
+        raise ValueError('Поврежденный файл')
+
+
+class ProcessingFailureStatusTests(TestCase):
+    """Статус документа после неудачной обработки"""
+    
+    def setUp(self):
+        self.service = _FailingService()
+    
+    def make_document(self, **fields) -> Document:
+        return Document.objects.create(title='doc.txt', file='documents/doc.txt', file_type='txt', **fields)
+    
+    def process(self, document: Document, retry_pending: bool):
+        with self.assertRaises(ValueError):
+            self.service.process_document(document, reuse_identical=False, retry_pending=retry_pending)
+        document.refresh_from_db()
+    
+    def test_pending_while_retry_remains(self):
+        document = self.make_document()
+        self.process(document, retry_pending=True)
+        self.assertEqual(document.status, 'pending')
+        self.assertEqual(document.error_message, 'Поврежденный файл')
+    
+    def test_error_after_last_attempt(self):
+        document = self.make_document()
+        self.process(document, retry_pending=False)
+        self.assertEqual(document.status, 'error')
+    
+    def test_processed_document_stays_processed(self):
+        document = self.make_document(status='processed', indexed_at=timezone.now())
+        self.process(document, retry_pending=False)
+        self.assertEqual(document.status, 'processed')
+        self.assertEqual(document.error_message, 'Поврежденный файл')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class QueueingTests(TestCase):
+    """Загрузка и пересканирование документов ставят задачу в очередь"""
+    
+    def setUp(self):
+        content = 'Текст документа'.encode()
+        # Обработанный документ с тем же содержимым
+        self.source = Document.objects.create(
+            title='source.txt',
+            file='documents/source.txt',
+            file_type='txt',
+            content_hash=hashlib.sha256(content).hexdigest(),
+            status='processed',
+            indexed_at=timezone.now()
+        )
+        self.content = content
+    
+    def test_upload_of_identical_file_is_queued(self):
+        response = self.client.post('/api/documents/', {
+            'title': 'Копия',
+            'file': SimpleUploadedFile('copy.txt', self.content, content_type='text/plain')
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'pending')
+        document = Document.objects.get(pk=response.json()['id'])
+        self.assertEqual(document.content_hash, self.source.content_hash)
+        self.assertEqual(list(document.jobs.values_list('action', 'status')), [('process', 'queued')])
+    
+    def test_admin_rescan_does_not_reuse_identical_document(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.client.post('/admin/documents/document/', {
+            'action': 'process_documents',
+            '_selected_action': [str(self.source.pk)]
+        })
+        self.assertEqual(list(self.source.jobs.values_list('action', flat=True)), ['reindex'])
+
+
+class DocumentEventsTests(TestCase):
+    """Поток хода обработки документа"""
+    
+    def test_json_client_gets_stream(self):
+        document = Document.objects.create(
+            title='doc.txt',
+            file='documents/doc.txt',
+            file_type='txt',
+            status='processed'
+        )
+        response = self.client.get(f'/api/documents/{document.pk}/events/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = b''.join(response.streaming_content).decode()
+        self.assertIn('event: progress', events)
+        self.assertIn('event: done', events)
+    
+    def test_errors_follow_accept(self):
+        url = f'/api/documents/{uuid.uuid4()}/events/'
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+        response = self.client.get(url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(response.content.startswith(b'event: error'))
+
+
+@override_settings(PROCESSING_JOB_MAX_ATTEMPTS=2, PROCESSING_JOB_RETRY_BACKOFF=10, PROCESSING_JOB_HEARTBEAT_TIMEOUT=60)
+class JobQueueTests(TestCase):
+    """Очередь задач обработки документов"""
+    
+    def setUp(self):
+        self.queue = JobQueue()
+    
+    def make_document(self, name: str = 'doc.txt', **fields) -> Document:
+        return Document.objects.create(title=name, file=f'documents/{name}', file_type='txt', **fields)
+    
+    def test_enqueue_keeps_one_active_job(self):
+        document = self.make_document(cancel_requested=True)
+        job, created = self.queue.enqueue(document)
+        self.assertTrue(created)
+        document.refresh_from_db()
+        self.assertFalse(document.cancel_requested)
+        
+        same_job, created = self.queue.enqueue(document, 'reindex')
+        self.assertFalse(created)
+        self.assertEqual(same_job.pk, job.pk)
+    
+    def test_claim_with_conditional_update(self):
+        # Тестовая БД SQLite: захват задачи условным UPDATE
+        self.assertFalse(connection.features.has_select_for_update_skip_locked)
+        first, _ = self.queue.enqueue(self.make_document('first.txt'))
+        second, _ = self.queue.enqueue(self.make_document('second.txt'))
+        ProcessingJob.objects.filter(pk=second.pk).update(run_after=timezone.now() + timedelta(hours=1))
+        
+        job = self.queue.claim('worker-1')
+        self.assertEqual((job.pk, job.status, job.locked_by, job.attempts), (first.pk, 'running', 'worker-1', 1))
+        # Задача, уже захваченная другим воркером, не захватывается повторно
+        self.assertFalse(self.queue._mark_running(first.pk, 'worker-2', timezone.now(), only_queued=True))
+        # Вторая задача еще не готова к выполнению
+        self.assertIsNone(self.queue.claim('worker-2'))
+        
+        ProcessingJob.objects.filter(pk=second.pk).update(run_after=timezone.now())
+        self.assertEqual(self.queue.claim('worker-2').pk, second.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.locked_by, 'worker-1')
+    
+    def test_fail_retries_with_backoff_then_fails(self):
+        self.queue.enqueue(self.make_document())
+        job = self.queue.claim('worker')
+        before = timezone.now()
+        self.queue.fail(job, 'ошибка 1')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.last_error), ('queued', '', 'ошибка 1'))
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=10))
+        self.assertIsNone(self.queue.claim('worker'))
+        
+        ProcessingJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = self.queue.claim('worker')
+        self.assertEqual(job.attempts, 2)
+        self.queue.fail(job, 'ошибка 2')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), ('failed', 'ошибка 2'))
+        self.assertIsNotNone(job.finished_at)
+    
+    def orphan(self, document: Document, attempts: int) -> ProcessingJob:
+        job, _ = self.queue.enqueue(document)
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            status='running',
+            locked_by='lost-worker',
+            attempts=attempts,
+            heartbeat_at=timezone.now() - timedelta(minutes=5)
+        )
+        Document.objects.filter(pk=document.pk).update(status='processing')
+        return job
+    
+    def test_recover_orphaned(self):
+        requeued = self.orphan(self.make_document('requeued.txt'), attempts=1)
+        exhausted = self.orphan(self.make_document('exhausted.txt'), attempts=2)
+        indexed = self.orphan(self.make_document('indexed.txt', indexed_at=timezone.now()), attempts=1)
+        alive, _ = self.queue.enqueue(self.make_document('alive.txt'))
+        ProcessingJob.objects.filter(pk=alive.pk).update(status='running', heartbeat_at=timezone.now())
+        
+        self.assertEqual(self.queue.recover_orphaned(), 2)
+        
+        statuses = {
+            job.pk: (job.status, job.document.status)
+            for job in ProcessingJob.objects.select_related('document')
+        }
+        self.assertEqual(statuses, {
+            requeued.pk: ('queued', 'pending'),
+            exhausted.pk: ('failed', 'error'),
+            # Проиндексированный ранее документ остается в поиске
+            indexed.pk: ('queued', 'processed'),
+            alive.pk: ('running', 'pending'),
+        })
+        for job in (requeued, exhausted, indexed):
+            job.refresh_from_db()
+            self.assertIn('lost-worker', job.last_error)
+            self.assertIn('lost-worker', job.document.error_message)
 
-# Create your tests here.
@@ -0,0 +1,55 @@
+"""
+Обработчики загрузки файлов, вычисляющие sha256 содержимого
+по мере записи файла (без повторного чтения с диска)
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class ContentHashMixin:
+    """Вычисление sha256 загружаемого файла; результат - атрибут sha256 файла"""
+    
+    def new_file(self, *args, **kwargs):
+        self.content_hash = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+    
+    def receive_data_chunk(self, raw_data, start):
+        self.content_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+    
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.content_hash.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    """Загрузка небольших файлов в память с вычислением sha256"""
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    """Загрузка файлов во временный файл с вычислением sha256"""
+
+
+def get_content_hash(file) -> str:
+    """
+    Получить sha256 содержимого файла
+    
+    Args:
+        file: Загруженный файл (sha256 уже вычислен обработчиком загрузки) или любой File
+        
+    Returns:
+        str: sha256 в hex
+    """
+    content_hash = getattr(file, 'sha256', None)
+    if content_hash:
+        return content_hash
+    
+    # Файл получен не через обработчики загрузки (например, из корпуса на диске)
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
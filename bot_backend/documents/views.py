@@ -3,8 +3,10 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-import threading
 
 from .models import Document
 from .serializers import (
@@ -14,6 +16,8 @@ from .serializers import (
     DocumentStatusSerializer
 )
 from .services import get_document_service
+from .jobs import get_job_queue
+from .events import EventStreamRenderer, aiter_document_events, iter_document_events
 
 
 class DocumentViewSet(viewsets.ModelViewSet):
@@ -28,7 +32,7 @@ class DocumentViewSet(viewsets.ModelViewSet):
             return DocumentListSerializer
         elif self.action == 'create':
             return DocumentUploadSerializer
-        elif self.action == 'status':
+        elif self.action in ('status', 'events'):
             return DocumentStatusSerializer
         return DocumentDetailSerializer
     
@@ -40,11 +44,9 @@ class DocumentViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         document = serializer.save()
         
-        # Запуск обработки документа в фоне
-        service = get_document_service()
-        thread = threading.Thread(target=service.process_document, args=(document,))
-        thread.daemon = True
-        thread.start()
+        # Постановка в очередь обработки (если файл уже загружался и обработан,
+        # воркер индексирует документ по секциям обработанного документа)
+        get_job_queue().enqueue(document, 'process')
         
         # Возврат информации о документе
         detail_serializer = DocumentDetailSerializer(document, context={'request': request})
@@ -81,6 +83,42 @@ class DocumentViewSet(viewsets.ModelViewSet):
         serializer = DocumentStatusSerializer(document)
         return Response(serializer.data)
     
+    # JSONRenderer: клиенты с Accept: application/json получают поток, а ошибки (404) - в JSON, а не 406
+    @action(detail=True, methods=['get'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def events(self, request, pk=None):
+        """
+        Поток изменений хода обработки документа (Server-Sent Events)
+        """
+        document = self.get_object()
+        # Под ASGI синхронный генератор был бы прочитан целиком до отправки ответа
+        events = aiter_document_events if getattr(settings, 'ASYNC_VIEWS', False) else iter_document_events
+        response = StreamingHttpResponse(
+            events(document.pk),
+            content_type='text/event-stream'
+        )
+        # Поток не кэшируется и не буферизуется прокси
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """
+        Отменить обработку документа
+        """
+        document = self.get_object()
+        
+        if not get_document_service().cancel_processing(document):
+            return Response(
+                {"error": "Документ не обрабатывается и не ожидает обработки"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(
+            {"message": "Отмена обработки запрошена"},
+            status=status.HTTP_202_ACCEPTED
+        )
+    
     @action(detail=True, methods=['post'])
     def reindex(self, request, pk=None):
         """
@@ -94,13 +132,15 @@ class DocumentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Запуск переиндексации в фоне
-        service = get_document_service()
-        thread = threading.Thread(target=service.reindex_document, args=(document,))
-        thread.daemon = True
-        thread.start()
+        # Постановка переиндексации в очередь
+        job, created = get_job_queue().enqueue(document, 'reindex')
+        if not created:
+            return Response(
+                {"error": "Документ уже в очереди обработки"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response(
-            {"message": "Переиндексация запущена"},
+            {"message": "Переиндексация поставлена в очередь"},
             status=status.HTTP_200_OK
         )
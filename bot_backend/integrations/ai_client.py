@@ -3,15 +3,52 @@ AI Client для работы с Qdrant и языковой моделью.
 Инициализируется при запуске Django приложения.
 """
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, List, Dict, Iterator, Optional, Tuple
+import asyncio
+import json
 import os
+import time
+import weakref
 import dotenv
 
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, SampleQuery, Sample
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, SampleQuery, Sample,
+    Filter, FieldCondition, MatchValue, Range,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+)
 from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
+from .embedding_dispatcher import EmbeddingDispatcher
+from .query_cache import get_query_cache
+
+
+# Модель LLM (DeepSeek)
+LLM_MODEL = "deepseek-chat"
+LLM_BASE_URL = "https://api.deepseek.com/v1"
+
+# Адрес Qdrant
+QDRANT_HOST = "localhost"
+QDRANT_PORT = 6333
+
+# Первое переключение alias рабочей коллекции (после удаления обычной коллекции
+# с тем же именем): количество попыток создания alias и задержка между ними (сек)
+ALIAS_SWAP_ATTEMPTS = 5
+ALIAS_SWAP_RETRY_DELAY = 1.0
+
+# Модель эмбеддингов
+EMBEDDER_MODEL = "intfloat/multilingual-e5-large"
+
+# Поле payload, которым помечаются точки незавершенной индексации документа.
+# Такие точки не участвуют в поиске, пока документ не проиндексирован полностью.
+STAGING_PAYLOAD_KEY = "staging"
+
+# Длинная секция индексируется несколькими окнами, и поиск может вернуть
+# несколько окон одной секции: при поиске запрашивается больше точек, чем нужно секций
+SEARCH_WINDOWS_PER_SECTION = 3
 
 # Системный промпт для консультаций (НЕ ИЗМЕНЯТЬ!)
 SYSTEM_PROMPT = """
@@ -112,17 +149,18 @@ class AIClient:
         # LLM клиент
         self.llm = OpenAI(
             api_key=self.api_key,
-            base_url="https://api.deepseek.com/v1"
+            base_url=LLM_BASE_URL
         )
         
         # Embedder модель
         print("Loading embedder model...")
-        self.embedder = SentenceTransformer("intfloat/multilingual-e5-large")
+        self.embedder_model_name = EMBEDDER_MODEL
+        self.embedder = SentenceTransformer(self.embedder_model_name)
         self.vector_size = self.embedder.get_sentence_embedding_dimension()
         
         # Qdrant клиент
         print("Connecting to Qdrant...")
-        self.qdrant_client = QdrantClient("localhost", port=6333)
+        self.qdrant_client = QdrantClient(QDRANT_HOST, port=QDRANT_PORT)
         
         # Название коллекции (НЕ ИЗМЕНЯТЬ!)
         self.collection_name = "rag_collection"
@@ -130,6 +168,20 @@ class AIClient:
         # Создание коллекции если не существует
         self._ensure_collection_exists()
         
+        # Кэш эмбеддингов вопросов и результатов поиска
+        self.query_cache = get_query_cache()
+        
+        # Асинхронные клиенты LLM и Qdrant создаются для каждого event loop при первом
+        # обращении (соединения httpx привязаны к event loop, в котором открыты)
+        self._async_clients = weakref.WeakKeyDictionary()
+        # Одновременные запросы на кодирование вопросов объединяются в батчи и кодируются
+        # в потоке диспетчера (асинхронные запросы не блокируют event loop)
+        self.embedding_dispatcher = EmbeddingDispatcher(
+            lambda texts: self.embedder.encode(texts, batch_size=len(texts)).tolist(),
+            max_batch_size=getattr(settings, 'QUERY_EMBEDDING_BATCH_SIZE', 32),
+            max_wait=getattr(settings, 'QUERY_EMBEDDING_MAX_WAIT', 0.005)
+        )
+        
         # Константы для обработки документов (НЕ ИЗМЕНЯТЬ!)
         self.PAGE_SIZE = 240
         self.TITLE_INFO_SIZE = self.PAGE_SIZE * 2
@@ -140,47 +192,325 @@ class AIClient:
     
     def _ensure_collection_exists(self):
         """Создать коллекцию в Qdrant если она не существует"""
+        if self.get_alias_target(self.collection_name) is not None:
+            return
         if not self.qdrant_client.collection_exists(self.collection_name):
             print(f"Creating collection '{self.collection_name}'...")
-            self.qdrant_client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(
-                    size=self.vector_size,
-                    distance=Distance.COSINE
-                )
-            )
+            self.create_collection(self.collection_name)
             print("Collection created!")
     
-    def ask_question(self, question: str, limit: int = 15) -> ConsultationResult:
+    def create_collection(self, collection_name: str):
         """
-        Задать вопрос и получить ответ на основе документов из Qdrant
+        Создать коллекцию с параметрами векторов embedder модели
         
         Args:
-            question: Вопрос пользователя
-            limit: Количество документов для контекста
+            collection_name: Название коллекции
+        """
+        self.qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(
+                size=self.vector_size,
+                distance=Distance.COSINE
+            )
+        )
+    
+    def get_alias_target(self, alias_name: str) -> Optional[str]:
+        """
+        Получить коллекцию, на которую указывает alias
+        
+        Args:
+            alias_name: Название alias
             
         Returns:
-            ConsultationResult с ответом и источниками
+            Название коллекции или None, если alias не существует
         """
-        # Получить эмбеддинг вопроса
-        question_vector = self.embedder.encode([question]).tolist()[0]
+        for alias in self.qdrant_client.get_aliases().aliases:
+            if alias.alias_name == alias_name:
+                return alias.collection_name
+        return None
+    
+    def swap_collection(self, collection_name: str) -> Optional[str]:
+        """
+        Переключить alias рабочей коллекции на другую коллекцию.
+        Если alias уже существует, удаление и создание alias выполняются одной
+        атомарной операцией: запросы к self.collection_name сразу читают новую коллекцию.
         
-        # Поиск релевантных документов
+        Первое переключение не атомарно: рабочая коллекция - обычная коллекция,
+        и ее нужно удалить, чтобы освободить имя для alias. Между удалением и созданием
+        alias поиск и загрузка точек в self.collection_name завершаются ошибкой
+        (коллекция не найдена). Перед удалением проверяется, что новая коллекция
+        существует; создание alias повторяется ALIAS_SWAP_ATTEMPTS раз.
+        
+        Args:
+            collection_name: Коллекция, на которую переключается alias
+            
+        Returns:
+            Название коллекции, на которую alias указывал раньше (или None)
+        
+        Raises:
+            ValueError: Новая коллекция не существует (рабочая коллекция не изменена)
+            RuntimeError: Alias не создан после удаления рабочей коллекции
+                          (данные находятся в collection_name, переключение нужно повторить)
+        """
+        if not self.qdrant_client.collection_exists(collection_name):
+            raise ValueError(f"Collection '{collection_name}' does not exist")
+        
+        previous = self.get_alias_target(self.collection_name)
+        operations = []
+        if previous is not None:
+            operations.append(DeleteAliasOperation(
+                delete_alias=DeleteAlias(alias_name=self.collection_name)
+            ))
+        elif self.qdrant_client.collection_exists(self.collection_name):
+            # Первое переключение: рабочая коллекция была обычной коллекцией,
+            # ее имя освобождается для alias (данные уже скопированы в новую)
+            print(f"Replacing collection '{self.collection_name}' with alias...")
+            self.qdrant_client.delete_collection(self.collection_name)
+            self._create_alias_after_delete(collection_name)
+            self.query_cache.bump_generation()
+            print(f"Alias '{self.collection_name}' now points to '{collection_name}'")
+            return None
+        
+        # Удаление и создание alias выполняются одной атомарной операцией
+        operations.append(CreateAliasOperation(
+            create_alias=CreateAlias(
+                collection_name=collection_name,
+                alias_name=self.collection_name
+            )
+        ))
+        self.qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+        self.query_cache.bump_generation()
+        print(f"Alias '{self.collection_name}' now points to '{collection_name}'")
+        
+        return previous
+    
+    def _create_alias_after_delete(self, collection_name: str):
+        """
+        Создание alias рабочей коллекции после удаления одноименной коллекции
+        (с повторными попытками)
+        
+        Args:
+            collection_name: Коллекция, на которую указывает alias
+        
+        Raises:
+            RuntimeError: Alias не создан за ALIAS_SWAP_ATTEMPTS попыток
+        """
+        operations = [CreateAliasOperation(
+            create_alias=CreateAlias(
+                collection_name=collection_name,
+                alias_name=self.collection_name
+            )
+        )]
+        last_error = None
+        for attempt in range(ALIAS_SWAP_ATTEMPTS):
+            if attempt:
+                time.sleep(ALIAS_SWAP_RETRY_DELAY * attempt)
+            try:
+                target = self.get_alias_target(self.collection_name)
+                if target == collection_name:
+                    # Предыдущая попытка создала alias, но ответ не был получен
+                    return
+                recreated = target is None and self.qdrant_client.collection_exists(self.collection_name)
+                if recreated and self.qdrant_client.count(self.collection_name, exact=True).count:
+                    break
+                if recreated:
+                    # Пока имени не было, другой процесс создал пустую рабочую коллекцию
+                    # (AIClient._ensure_collection_exists): она удаляется
+                    self.qdrant_client.delete_collection(self.collection_name)
+                self.qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+                return
+            except Exception as e:
+                last_error = e
+                print(f"Alias creation attempt {attempt + 1}/{ALIAS_SWAP_ATTEMPTS} failed: {e}")
+        
+        # Попытки исчерпаны или в рабочую коллекцию, созданную заново, уже загружены точки
+        raise RuntimeError(
+            f"Collection '{self.collection_name}' was deleted but alias to '{collection_name}' "
+            f"was not created: {last_error or 'collection was recreated with points'}. "
+            f"Search does not use the rebuilt index until the alias is created "
+            f"(python manage.py rebuild_index --swap-to {collection_name})"
+        )
+    
+    def _visible_points_filter(self) -> Filter:
+        """Фильтр, исключающий точки незавершенной индексации документов"""
+        return Filter(must_not=[
+            FieldCondition(key=STAGING_PAYLOAD_KEY, match=MatchValue(value=True))
+        ])
+    
+    def _section_points_filter(self) -> Filter:
+        """Фильтр точек секций: первые окна секций без точек незавершенной индексации"""
+        query_filter = self._visible_points_filter()
+        query_filter.must_not.append(FieldCondition(key="window_index", range=Range(gt=0)))
+        return query_filter
+    
+    def _get_async_clients(self) -> Tuple[AsyncOpenAI, AsyncQdrantClient]:
+        """Асинхронные клиенты LLM и Qdrant текущего event loop"""
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.get(loop)
+        if clients is None:
+            clients = (
+                AsyncOpenAI(api_key=self.api_key, base_url=LLM_BASE_URL),
+                AsyncQdrantClient(QDRANT_HOST, port=QDRANT_PORT)
+            )
+            self._async_clients[loop] = clients
+        return clients
+    
+    @property
+    def async_llm(self) -> AsyncOpenAI:
+        """Асинхронный LLM клиент текущего event loop"""
+        return self._get_async_clients()[0]
+    
+    @property
+    def async_qdrant_client(self) -> AsyncQdrantClient:
+        """Асинхронный клиент Qdrant текущего event loop"""
+        return self._get_async_clients()[1]
+    
+    def embed_question(self, question: str) -> List[float]:
+        """
+        Эмбеддинг вопроса (повторные вопросы берутся из кэша)
+        
+        Args:
+            question: Вопрос пользователя
+        
+        Returns:
+            Эмбеддинг вопроса
+        """
+        question_vector = self.query_cache.get_embedding(question)
+        if question_vector is None:
+            started_at = time.perf_counter()
+            question_vector = self.embedding_dispatcher.encode(question)
+            self.query_cache.set_embedding(question, question_vector, time.perf_counter() - started_at)
+        return question_vector
+    
+    async def aembed_question(self, question: str) -> List[float]:
+        """Асинхронная версия embed_question: вопрос кодируется диспетчером без блокировки event loop"""
+        question_vector = self.query_cache.get_embedding(question)
+        if question_vector is None:
+            started_at = time.perf_counter()
+            question_vector = await asyncio.wrap_future(self.embedding_dispatcher.submit(question))
+            self.query_cache.set_embedding(question, question_vector, time.perf_counter() - started_at)
+        return question_vector
+    
+    def _group_sections(self, results: List[Any], limit: int) -> Dict[str, Dict[str, any]]:
+        """
+        Группировка найденных окон по секциям (не больше limit секций)
+        
+        Args:
+            results: Найденные точки
+            limit: Количество секций
+        
+        Returns:
+            {parent_id: {'score': оценка лучшего окна, 'payload': payload первого окна или None}}
+        """
+        # Точки, проиндексированные до разбиения секций на окна, не содержат parent_id
+        sections = {}
+        for result in sorted(results, key=lambda x: x.score, reverse=True):
+            parent_id = result.payload.get('parent_id') or str(result.id)
+            if parent_id not in sections:
+                sections[parent_id] = {'score': result.score, 'payload': None}
+            if result.payload.get('window_index', 0) == 0:
+                sections[parent_id]['payload'] = result.payload
+            if len(sections) == limit:
+                break
+        return sections
+    
+    def search_sections(self, question_vector: List[float], limit: int) -> List[Dict[str, any]]:
+        """
+        Поиск секций, релевантных вопросу.
+        Окна одной секции объединяются: секция попадает в результат один раз
+        с оценкой лучшего из найденных окон. Результаты кэшируются до изменения корпуса.
+        
+        Args:
+            question_vector: Эмбеддинг вопроса
+            limit: Количество секций
+        
+        Returns:
+            Секции (payload точки секции и score) по убыванию оценки (не изменять: список общий с кэшем)
+        """
+        query_filter = self._visible_points_filter()
+        cache_key = self.query_cache.make_results_key(question_vector, limit, query_filter)
+        cached = self.query_cache.get_results(cache_key)
+        if cached is not None:
+            return cached
+        
+        started_at = time.perf_counter()
         results = self.qdrant_client.query_points(
             collection_name=self.collection_name,
             query=question_vector,
-            limit=limit
+            query_filter=query_filter,
+            limit=limit * SEARCH_WINDOWS_PER_SECTION
         ).points
+        sections = self._group_sections(results, limit)
+        
+        # Полный текст секции хранится в точке первого окна
+        missing = [parent_id for parent_id, section in sections.items() if section['payload'] is None]
+        if missing:
+            for point in self.qdrant_client.retrieve(
+                collection_name=self.collection_name,
+                ids=missing,
+                with_payload=True
+            ):
+                sections[str(point.id)]['payload'] = point.payload
+        
+        results = [section for section in sections.values() if section['payload'] is not None]
+        self.query_cache.set_results(cache_key, results, time.perf_counter() - started_at)
+        return results
+    
+    async def asearch_sections(self, question_vector: List[float], limit: int) -> List[Dict[str, any]]:
+        """Асинхронная версия search_sections (AsyncQdrantClient)"""
+        query_filter = self._visible_points_filter()
+        # Поколение корпуса читается из БД (не чаще CORPUS_GENERATION_CHECK_INTERVAL)
+        cache_key = await sync_to_async(self.query_cache.make_results_key)(question_vector, limit, query_filter)
+        cached = self.query_cache.get_results(cache_key)
+        if cached is not None:
+            return cached
         
+        started_at = time.perf_counter()
+        response = await self.async_qdrant_client.query_points(
+            collection_name=self.collection_name,
+            query=question_vector,
+            query_filter=query_filter,
+            limit=limit * SEARCH_WINDOWS_PER_SECTION
+        )
+        sections = self._group_sections(response.points, limit)
+        
+        missing = [parent_id for parent_id, section in sections.items() if section['payload'] is None]
+        if missing:
+            for point in await self.async_qdrant_client.retrieve(
+                collection_name=self.collection_name,
+                ids=missing,
+                with_payload=True
+            ):
+                sections[str(point.id)]['payload'] = point.payload
+        
+        results = [section for section in sections.values() if section['payload'] is not None]
+        self.query_cache.set_results(cache_key, results, time.perf_counter() - started_at)
+        return results
+    
+    def _make_messages(
+        self,
+        question: str,
+        results: List[Dict[str, any]]
+    ) -> Tuple[List[Dict[str, str]], List[Dict[str, any]]]:
+        """
+        Формирование контекста для LLM из найденных секций
+        
+        Args:
+            question: Вопрос пользователя
+            results: Секции (search_sections)
+        
+        Returns:
+            (сообщения для LLM, источники)
+        """
         # Формирование контекста для LLM
         messages = [{'role': 'system', 'content': SYSTEM_PROMPT}]
         
         sources = []
-        for i, result in enumerate(sorted(results, key=lambda x: x.score, reverse=True)):
-            text = result.payload.get('text', '')
-            title = result.payload.get('title', 'Неизвестный документ')
-            year = result.payload.get('year')
-            document_id = result.payload.get('document_id')
+        for i, result in enumerate(results):
+            text = result['payload'].get('text', '')
+            title = result['payload'].get('title', 'Неизвестный документ')
+            year = result['payload'].get('year')
+            document_id = result['payload'].get('document_id')
             
             messages.append({
                 'role': 'system',
@@ -192,16 +522,99 @@ class AIClient:
                 'title': title,
                 'year': year,
                 'document_id': document_id,
-                'score': result.score,
+                'score': result['score'],
                 'text_preview': text[:200] + '...' if len(text) > 200 else text
             })
         
         # Добавление вопроса пользователя
         messages.append({'role': 'user', 'content': question})
         
+        return messages, sources
+    
+    def build_messages(
+        self,
+        question: str,
+        limit: int = 15,
+        question_vector: Optional[List[float]] = None
+    ) -> Tuple[List[Dict[str, str]], List[Dict[str, any]]]:
+        """
+        Поиск секций, релевантных вопросу, и формирование контекста для LLM
+        
+        Args:
+            question: Вопрос пользователя
+            limit: Количество документов для контекста
+            question_vector: Эмбеддинг вопроса, если уже вычислен
+            
+        Returns:
+            (сообщения для LLM, источники)
+        """
+        # Получить эмбеддинг вопроса
+        if question_vector is None:
+            question_vector = self.embed_question(question)
+        
+        # Поиск релевантных документов (каждая секция - один раз)
+        results = self.search_sections(question_vector, limit)
+        
+        return self._make_messages(question, results)
+    
+    async def abuild_messages(
+        self,
+        question: str,
+        limit: int = 15,
+        question_vector: Optional[List[float]] = None
+    ) -> Tuple[List[Dict[str, str]], List[Dict[str, any]]]:
+        """Асинхронная версия build_messages"""
+        if question_vector is None:
+            question_vector = await self.aembed_question(question)
+        
+        results = await self.asearch_sections(question_vector, limit)
+        
+        return self._make_messages(question, results)
+    
+    def ask_question(
+        self,
+        question: str,
+        limit: int = 15,
+        question_vector: Optional[List[float]] = None
+    ) -> ConsultationResult:
+        """
+        Задать вопрос и получить ответ на основе документов из Qdrant
+        
+        Args:
+            question: Вопрос пользователя
+            limit: Количество документов для контекста
+            question_vector: Эмбеддинг вопроса, если уже вычислен
+        
+        Returns:
+            ConsultationResult с ответом и источниками
+        """
+        messages, sources = self.build_messages(question, limit, question_vector)
+        
         # Получение ответа от LLM
         response = self.llm.chat.completions.create(
-            model="deepseek-chat",
+            model=LLM_MODEL,
+            messages=messages,
+            temperature=0.01
+        )
+        
+        answer = response.choices[0].message.content.strip()
+        
+        return ConsultationResult(
+            response=answer,
+            sources=sources
+        )
+    
+    async def aask_question(
+        self,
+        question: str,
+        limit: int = 15,
+        question_vector: Optional[List[float]] = None
+    ) -> ConsultationResult:
+        """Асинхронная версия ask_question (AsyncOpenAI, AsyncQdrantClient)"""
+        messages, sources = await self.abuild_messages(question, limit, question_vector)
+        
+        response = await self.async_llm.chat.completions.create(
+            model=LLM_MODEL,
             messages=messages,
             temperature=0.01
         )
@@ -213,6 +626,59 @@ class AIClient:
             sources=sources
         )
     
+    def stream_answer(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """
+        Ответ LLM по мере генерации
+        
+        Args:
+            messages: Сообщения для LLM (build_messages)
+        
+        Yields:
+            Фрагменты ответа
+        """
+        stream = self.llm.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            temperature=0.01,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Прерванный поток (клиент отключился) закрывает соединение с LLM
+            stream.close()
+    
+    async def astream_answer(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Асинхронная версия stream_answer"""
+        stream = await self.async_llm.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            temperature=0.01,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+    
+    def _points_to_dicts(self, points: List[Any]) -> List[Dict[str, any]]:
+        """Текст и метаданные точек Qdrant"""
+        result = []
+        for point in points:
+            result.append({
+                'id': point.id,
+                'text': point.payload.get('text', ''),
+                'title': point.payload.get('title', 'Неизвестный документ'),
+                'year': point.payload.get('year'),
+                'document_id': point.payload.get('document_id')
+            })
+        
+        return result
+    
     def get_random_points(self, count: int = 10) -> List[Dict[str, any]]:
         """
         Получить случайные точки из Qdrant для генерации тестов
@@ -227,32 +693,32 @@ class AIClient:
         points = self.qdrant_client.query_points(
             collection_name=self.collection_name,
             query=SampleQuery(sample=Sample.RANDOM),
+            query_filter=self._section_points_filter(),
             limit=count,
             with_payload=True
         ).points
         
-        result = []
-        for point in points:
-            result.append({
-                'id': point.id,
-                'text': point.payload.get('text', ''),
-                'title': point.payload.get('title', 'Неизвестный документ'),
-                'year': point.payload.get('year'),
-                'document_id': point.payload.get('document_id')
-            })
+        return self._points_to_dicts(points)
+    
+    async def aget_random_points(self, count: int = 10) -> List[Dict[str, any]]:
+        """Асинхронная версия get_random_points"""
+        response = await self.async_qdrant_client.query_points(
+            collection_name=self.collection_name,
+            query=SampleQuery(sample=Sample.RANDOM),
+            query_filter=self._section_points_filter(),
+            limit=count,
+            with_payload=True
+        )
         
-        return result
+        return self._points_to_dicts(response.points)
     
-    def generate_test_questions(self, points: List[Dict], count: int = 10) -> List[Dict]:
+    def _test_questions_messages(self, points: List[Dict], count: int) -> List[Dict[str, str]]:
         """
-        Генерация тестовых вопросов на основе точек из Qdrant
+        Сообщения для LLM при генерации тестовых вопросов
         
         Args:
             points: Список точек с текстом
             count: Количество вопросов для генерации
-            
-        Returns:
-            Список вопросов с вариантами ответов
         """
         # Формирование контекста из точек
         context = "\n\n---\n\n".join([
@@ -288,17 +754,22 @@ class AIClient:
 {context}
 """
         
-        # Отправка запроса к LLM
-        response = self.llm.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "Ты - эксперт по охране труда. Создаешь тестовые вопросы на основе документов. Отвечай строго в формате JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
+        return [
+            {"role": "system", "content": "Ты - эксперт по охране труда. Создаешь тестовые вопросы на основе документов. Отвечай строго в формате JSON."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _parse_test_questions(self, answer: str) -> List[Dict]:
+        """
+        Разбор ответа LLM с тестовыми вопросами
         
-        answer = response.choices[0].message.content.strip()
+        Args:
+            answer: Ответ LLM
+        
+        Returns:
+            Список вопросов с вариантами ответов
+        """
+        answer = answer.strip()
         
         # Очистка от markdown code fence если есть
         if answer.startswith("```"):
@@ -310,7 +781,6 @@ class AIClient:
             answer = "\n".join(lines).strip()
         
         # Парсинг JSON
-        import json
         try:
             questions = json.loads(answer)
             return questions
@@ -318,6 +788,36 @@ class AIClient:
             print(f"Error parsing JSON: {e}")
             print(f"Response: {answer}")
             raise Exception(f"Не удалось распарсить ответ LLM: {str(e)}")
+    
+    def generate_test_questions(self, points: List[Dict], count: int = 10) -> List[Dict]:
+        """
+        Генерация тестовых вопросов на основе точек из Qdrant
+        
+        Args:
+            points: Список точек с текстом
+            count: Количество вопросов для генерации
+            
+        Returns:
+            Список вопросов с вариантами ответов
+        """
+        # Отправка запроса к LLM
+        response = self.llm.chat.completions.create(
+            model=LLM_MODEL,
+            messages=self._test_questions_messages(points, count),
+            temperature=0.7
+        )
+        
+        return self._parse_test_questions(response.choices[0].message.content)
+    
+    async def agenerate_test_questions(self, points: List[Dict], count: int = 10) -> List[Dict]:
+        """Асинхронная версия generate_test_questions (AsyncOpenAI)"""
+        response = await self.async_llm.chat.completions.create(
+            model=LLM_MODEL,
+            messages=self._test_questions_messages(points, count),
+            temperature=0.7
+        )
+        
+        return self._parse_test_questions(response.choices[0].message.content)
 
 
 # Глобальный экземпляр клиента (будет инициализирован при запуске Django)
@@ -0,0 +1,343 @@
+"""
+Персистентные кэши AI модуля.
+Позволяют не повторять дорогие запросы к LLM и вычисление эмбеддингов
+при переиндексации документов.
+"""
+import hashlib
+import threading
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import LLMResponseCache, EmbeddingCache
+
+
+class LLMResponseCacheStore:
+    """
+    Кэш ответов LLM в БД с адресацией по содержимому.
+    Ключ - sha256 от промпта, названия модели и текста запроса.
+    """
+    
+    # Проверка лимитов выполняется раз в EVICTION_INTERVAL записей
+    EVICTION_INTERVAL = 100
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 50000,
+        max_age_days: int = 90
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        
+        # Счетчики текущего процесса
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+    
+    @staticmethod
+    def make_key(prompt: str, model_name: str, text: str) -> str:
+        """Получить ключ кэша для запроса"""
+        digest = hashlib.sha256()
+        for part in (prompt, model_name, text):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Получить ответ из кэша
+        
+        Args:
+            key: Ключ кэша
+        
+        Returns:
+            str или None: Сохраненный ответ LLM
+        """
+        if not self.enabled:
+            return None
+        
+        try:
+            response = LLMResponseCache.objects.filter(key=key).values_list('response', flat=True).first()
+            if response is not None:
+                LLMResponseCache.objects.filter(key=key).update(
+                    hits=F('hits') + 1,
+                    last_used_at=timezone.now()
+                )
+        except DatabaseError as e:
+            # Ошибка кэша не должна прерывать обработку документа
+            print(f"LLM cache read error: {e}")
+            response = None
+        
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        
+        return response
+    
+    def set(self, key: str, model_name: str, response: str):
+        """
+        Сохранить ответ в кэш
+        
+        Args:
+            key: Ключ кэша
+            model_name: Название модели LLM
+            response: Ответ LLM
+        """
+        if not self.enabled:
+            return
+        
+        # Одиночный INSERT без транзакции: ответ по одному ключу всегда одинаков
+        try:
+            LLMResponseCache.objects.bulk_create(
+                [LLMResponseCache(key=key, model_name=model_name, response=response)],
+                ignore_conflicts=True
+            )
+        except DatabaseError as e:
+            print(f"LLM cache write error: {e}")
+            return
+        
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICTION_INTERVAL == 0
+        
+        if evict:
+            try:
+                self.evict()
+            except DatabaseError as e:
+                print(f"LLM cache eviction error: {e}")
+    
+    def evict(self) -> int:
+        """
+        Удалить устаревшие записи и записи сверх лимита (по давности использования)
+        
+        Returns:
+            int: Количество удаленных записей
+        """
+        removed = 0
+        
+        if self.max_age_days:
+            border = timezone.now() - timedelta(days=self.max_age_days)
+            removed += LLMResponseCache.objects.filter(created_at__lt=border).delete()[0]
+        
+        if self.max_entries:
+            stale_keys = LLMResponseCache.objects.order_by('-last_used_at').values_list(
+                'key', flat=True
+            )[self.max_entries:]
+            stale_keys = list(stale_keys)
+            if stale_keys:
+                removed += LLMResponseCache.objects.filter(key__in=stale_keys).delete()[0]
+        
+        return removed
+    
+    def clear(self) -> int:
+        """Очистить кэш полностью"""
+        return LLMResponseCache.objects.all().delete()[0]
+    
+    def stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        aggregate = LLMResponseCache.objects.aggregate(total_hits=Sum('hits'))
+        return {
+            'entries': LLMResponseCache.objects.count(),
+            'total_hits': aggregate['total_hits'] or 0,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class EmbeddingCacheStore:
+    """
+    Кэш эмбеддингов в БД.
+    Ключ - название модели и sha256 текста, вектор хранится в float16.
+    """
+    
+    # Ограничение количества параметров в одном SQL запросе
+    QUERY_BATCH_SIZE = 500
+    # Проверка лимита выполняется раз в EVICTION_INTERVAL записанных эмбеддингов
+    EVICTION_INTERVAL = 5000
+    
+    def __init__(self, enabled: bool = True, max_entries: int = 200000):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        
+        # Счетчики текущего процесса
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Получить sha256 текста"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def get_many(self, model_name: str, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        Получить сохраненные эмбеддинги
+        
+        Args:
+            model_name: Название модели эмбеддингов
+            texts: Список текстов
+            
+        Returns:
+            dict: Индекс текста -> вектор (float32) для найденных в кэше текстов
+        """
+        if not self.enabled or not texts:
+            return {}
+        
+        hashes = [self.text_hash(text) for text in texts]
+        found = {}
+        try:
+            unique_hashes = list(set(hashes))
+            for i in range(0, len(unique_hashes), self.QUERY_BATCH_SIZE):
+                batch = unique_hashes[i:i + self.QUERY_BATCH_SIZE]
+                rows = EmbeddingCache.objects.filter(
+                    model_name=model_name,
+                    text_hash__in=batch
+                ).values_list('text_hash', 'vector')
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(bytes(vector), dtype='<f2').astype(np.float32)
+                
+                # Обновление времени использования для LRU вытеснения
+                EmbeddingCache.objects.filter(
+                    model_name=model_name,
+                    text_hash__in=[h for h in batch if h in found]
+                ).update(last_used_at=timezone.now())
+        except DatabaseError as e:
+            # Ошибка кэша не должна прерывать индексацию документа
+            print(f"Embedding cache read error: {e}")
+            found = {}
+        
+        result = {i: found[h] for i, h in enumerate(hashes) if h in found}
+        with self._lock:
+            self.hits += len(result)
+            self.misses += len(texts) - len(result)
+        
+        return result
+    
+    def set_many(self, model_name: str, texts: List[str], vectors: np.ndarray):
+        """
+        Сохранить эмбеддинги в кэш
+        
+        Args:
+            model_name: Название модели эмбеддингов
+            texts: Список текстов
+            vectors: Матрица эмбеддингов (по строке на текст)
+        """
+        if not self.enabled or not texts:
+            return
+        
+        objects = [
+            EmbeddingCache(
+                model_name=model_name,
+                text_hash=self.text_hash(text),
+                vector=np.asarray(vector, dtype='<f2').tobytes(),
+                dimension=len(vector)
+            )
+            for text, vector in zip(texts, vectors)
+        ]
+        try:
+            EmbeddingCache.objects.bulk_create(
+                objects,
+                batch_size=self.QUERY_BATCH_SIZE,
+                ignore_conflicts=True
+            )
+        except DatabaseError as e:
+            print(f"Embedding cache write error: {e}")
+            return
+        
+        with self._lock:
+            previous = self._writes
+            self._writes += len(objects)
+            evict = previous // self.EVICTION_INTERVAL != self._writes // self.EVICTION_INTERVAL
+        
+        if evict:
+            try:
+                self.evict()
+            except DatabaseError as e:
+                print(f"Embedding cache eviction error: {e}")
+    
+    def evict(self) -> int:
+        """
+        Удалить наименее востребованные записи сверх лимита (LRU)
+        
+        Returns:
+            int: Количество удаленных записей
+        """
+        if not self.max_entries:
+            return 0
+        
+        stale_ids = EmbeddingCache.objects.order_by('-last_used_at').values_list(
+            'id', flat=True
+        )[self.max_entries:]
+        stale_ids = list(stale_ids)
+        if not stale_ids:
+            return 0
+        
+        return EmbeddingCache.objects.filter(id__in=stale_ids).delete()[0]
+    
+    def clear(self) -> int:
+        """Очистить кэш полностью"""
+        return EmbeddingCache.objects.all().delete()[0]
+    
+    def stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        entries = EmbeddingCache.objects.count()
+        sample = EmbeddingCache.objects.values_list('dimension', flat=True).first()
+        return {
+            'entries': entries,
+            'size_bytes': entries * (sample or 0) * 2,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Глобальный экземпляр кэша ответов LLM
+_llm_cache_instance = None
+
+
+def get_llm_cache() -> LLMResponseCacheStore:
+    """
+    Получить глобальный экземпляр кэша ответов LLM
+    
+    Returns:
+        LLMResponseCacheStore instance
+    """
+    global _llm_cache_instance
+    if _llm_cache_instance is None:
+        _llm_cache_instance = LLMResponseCacheStore(
+            enabled=getattr(settings, 'LLM_CACHE_ENABLED', True),
+            max_entries=getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 50000),
+            max_age_days=getattr(settings, 'LLM_CACHE_MAX_AGE_DAYS', 90)
+        )
+    return _llm_cache_instance
+
+
+# Глобальный экземпляр кэша эмбеддингов
+_embedding_cache_instance = None
+
+
+def get_embedding_cache() -> EmbeddingCacheStore:
+    """
+    Получить глобальный экземпляр кэша эмбеддингов
+    
+    Returns:
+        EmbeddingCacheStore instance
+    """
+    global _embedding_cache_instance
+    if _embedding_cache_instance is None:
+        _embedding_cache_instance = EmbeddingCacheStore(
+            enabled=getattr(settings, 'EMBEDDING_CACHE_ENABLED', True),
+            max_entries=getattr(settings, 'EMBEDDING_CACHE_MAX_ENTRIES', 200000)
+        )
+    return _embedding_cache_instance
@@ -0,0 +1,345 @@
+"""
+Поиск почти совпадающих секций документов (SimHash).
+Редакции одного нормативного документа совпадают большей частью текста:
+такие секции не индексируются повторно, а сохраняются как дубликаты
+уже проиндексированной секции.
+"""
+import hashlib
+import re
+import threading
+from typing import Dict, List, Iterable, Set, Tuple
+
+import numpy as np
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Q
+
+from .models import SectionFingerprint, SectionAlias
+
+# 64-битный отпечаток делится на 4 полосы по 16 бит
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = 16
+
+# Отпечаток строится по шинглам из SHINGLE_SIZE слов
+SHINGLE_SIZE = 3
+
+_WORD_RE = re.compile(r'\w+')
+_BITS = np.arange(64, dtype=np.uint64)
+
+
+def simhash(text: str) -> int:
+    """
+    SimHash текста: 64-битный отпечаток, у близких текстов отличается в нескольких битах
+    
+    Args:
+        text: Текст
+    
+    Returns:
+        Отпечаток (беззнаковое 64-битное число)
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) >= SHINGLE_SIZE:
+        shingles = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    else:
+        shingles = words or ['']
+    
+    digests = b''.join(
+        hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest()
+        for shingle in shingles
+    )
+    hashes = np.frombuffer(digests, dtype='>u8').astype(np.uint64)
+    
+    # Для каждого бита: сколько шинглов имеют 1 против 0
+    bits = (hashes[:, None] >> _BITS) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    
+    result = 0
+    for i in np.nonzero(votes > 0)[0]:
+        result |= 1 << int(i)
+    return result
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Количество различающихся битов двух отпечатков"""
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+
+def _bands(fingerprint: int) -> List[int]:
+    """Полосы отпечатка"""
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [(fingerprint >> (i * SIMHASH_BAND_BITS)) & mask for i in range(SIMHASH_BANDS)]
+
+
+def _to_signed(fingerprint: int) -> int:
+    """Беззнаковый отпечаток -> значение для BigIntegerField"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def _to_unsigned(value: int) -> int:
+    """Значение BigIntegerField -> беззнаковый отпечаток"""
+    return value & 0xFFFFFFFFFFFFFFFF
+
+
+class SectionDeduplicator:
+    """
+    Индекс отпечатков секций в БД.
+    Кандидаты в дубликаты выбираются по совпадению хотя бы одной полосы
+    отпечатка, затем проверяется расстояние Хэмминга.
+    """
+    
+    # Ограничение количества параметров в одном SQL запросе
+    QUERY_BATCH_SIZE = 500
+    
+    def __init__(self, enabled: bool = True, max_distance: int = 3):
+        self.enabled = enabled
+        # Поиск по полосам находит все пары с расстоянием не больше 3
+        self.max_distance = min(max_distance, SIMHASH_BANDS - 1)
+        
+        # Счетчики текущего процесса
+        self._lock = threading.Lock()
+        self.duplicates = 0
+    
+    def find_duplicates(self, document_id: str, texts: List[str]) -> Dict[int, str]:
+        """
+        Найти проиндексированные секции других документов, почти совпадающие с текстами
+        
+        Args:
+            document_id: ID документа (его собственные секции не учитываются)
+            texts: Тексты секций
+        
+        Returns:
+            dict: Индекс текста -> ID точки-оригинала
+        """
+        if not self.enabled or not texts:
+            return {}
+        
+        fingerprints = [simhash(text) for text in texts]
+        condition = Q()
+        for band in range(SIMHASH_BANDS):
+            values = set(_bands(fingerprint)[band] for fingerprint in fingerprints)
+            condition |= Q(**{f'band{band}__in': values})
+        
+        try:
+            candidates = list(
+                SectionFingerprint.objects.filter(condition)
+                .exclude(document_id=document_id)
+                .values_list('point_id', 'simhash')
+            )
+        except DatabaseError as e:
+            # Ошибка индекса отпечатков не должна прерывать индексацию документа
+            print(f"Fingerprint index read error: {e}")
+            return {}
+        
+        result = {}
+        for i, fingerprint in enumerate(fingerprints):
+            best = None
+            for point_id, value in candidates:
+                distance = hamming_distance(fingerprint, _to_unsigned(value))
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, point_id)
+            if best is not None:
+                result[i] = best[1]
+        
+        with self._lock:
+            self.duplicates += len(result)
+        
+        return result
+    
+    def make_fingerprints(self, document_id: str, point_ids: List[str], texts: List[str]) -> List[SectionFingerprint]:
+        """
+        Отпечатки секций (без сохранения в БД)
+        
+        Args:
+            document_id: ID документа
+            point_ids: ID точек в Qdrant
+            texts: Тексты секций
+        """
+        objects = []
+        for point_id, text in zip(point_ids, texts):
+            fingerprint = simhash(text)
+            bands = _bands(fingerprint)
+            objects.append(SectionFingerprint(
+                point_id=point_id,
+                document_id=document_id,
+                simhash=_to_signed(fingerprint),
+                band0=bands[0],
+                band1=bands[1],
+                band2=bands[2],
+                band3=bands[3]
+            ))
+        return objects
+    
+    def save_fingerprints(self, objects: List[SectionFingerprint]):
+        """
+        Сохранить отпечатки секций, точки которых уже загружены в Qdrant
+        (отпечаток точки, которой нет в Qdrant, превратил бы почти совпадающие
+        секции других документов в дубликаты несуществующей точки)
+        """
+        if not self.enabled or not objects:
+            return
+        
+        try:
+            SectionFingerprint.objects.bulk_create(
+                objects,
+                batch_size=self.QUERY_BATCH_SIZE,
+                ignore_conflicts=True
+            )
+        except DatabaseError as e:
+            print(f"Fingerprint index write error: {e}")
+    
+    def add_fingerprints(self, document_id: str, point_ids: List[str], texts: List[str]):
+        """
+        Сохранить отпечатки проиндексированных секций
+        
+        Args:
+            document_id: ID документа
+            point_ids: ID точек в Qdrant
+            texts: Тексты секций
+        """
+        if not self.enabled or not point_ids:
+            return
+        self.save_fingerprints(self.make_fingerprints(document_id, point_ids, texts))
+    
+    def add_aliases(self, aliases: List[SectionAlias]):
+        """Сохранить дубликаты секций"""
+        SectionAlias.objects.bulk_create(
+            aliases,
+            batch_size=self.QUERY_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+    
+    def update_aliases(self, point_ids: List[str], title: str, year) -> int:
+        """
+        Записать дубликатам секций новые название и год документа
+        
+        Returns:
+            int: Количество обновленных записей
+        """
+        updated = 0
+        for i in range(0, len(point_ids), self.QUERY_BATCH_SIZE):
+            updated += SectionAlias.objects.filter(
+                point_id__in=point_ids[i:i + self.QUERY_BATCH_SIZE]
+            ).update(title=title, year=year)
+        return updated
+    
+    def get_alias_ids(self, document_id: str) -> Set[str]:
+        """ID секций документа, сохраненных как дубликаты"""
+        return set(SectionAlias.objects.filter(document_id=document_id).values_list('point_id', flat=True))
+    
+    def get_aliases(self, document_id: str) -> List[SectionAlias]:
+        """Дубликаты секций документа"""
+        return list(SectionAlias.objects.filter(document_id=document_id))
+    
+    def filter_alias_ids(self, point_ids: Iterable[str]) -> Set[str]:
+        """ID из списка, сохраненные как дубликаты"""
+        point_ids = list(point_ids)
+        result = set()
+        for i in range(0, len(point_ids), self.QUERY_BATCH_SIZE):
+            result.update(SectionAlias.objects.filter(
+                point_id__in=point_ids[i:i + self.QUERY_BATCH_SIZE]
+            ).values_list('point_id', flat=True))
+        return result
+    
+    def release_points(self, point_ids: Iterable[str]) -> List[SectionAlias]:
+        """
+        Удалить отпечатки точек, удаленных из Qdrant
+        
+        Args:
+            point_ids: ID удаленных точек
+        
+        Returns:
+            Дубликаты, ссылавшиеся на удаленные точки (их нужно проиндексировать)
+        """
+        point_ids = list(point_ids)
+        orphaned = []
+        for i in range(0, len(point_ids), self.QUERY_BATCH_SIZE):
+            batch = point_ids[i:i + self.QUERY_BATCH_SIZE]
+            SectionFingerprint.objects.filter(point_id__in=batch).delete()
+            orphaned.extend(SectionAlias.objects.filter(canonical_point_id__in=batch))
+        return orphaned
+    
+    def remove_aliases(self, point_ids: Iterable[str] = (), document_id: str = None) -> int:
+        """
+        Удалить дубликаты секций по ID или все дубликаты документа
+        
+        Returns:
+            int: Количество удаленных записей
+        """
+        removed = 0
+        if document_id is not None:
+            removed += SectionAlias.objects.filter(document_id=document_id).delete()[0]
+        point_ids = list(point_ids)
+        for i in range(0, len(point_ids), self.QUERY_BATCH_SIZE):
+            removed += SectionAlias.objects.filter(
+                point_id__in=point_ids[i:i + self.QUERY_BATCH_SIZE]
+            ).delete()[0]
+        return removed
+    
+    def remove_aliases_except(self, document_ids: Set[str]) -> int:
+        """
+        Удалить дубликаты секций документов, которых больше нет в БД
+        
+        Args:
+            document_ids: ID существующих документов
+        
+        Returns:
+            int: Количество удаленных записей
+        """
+        stale_ids = set(SectionAlias.objects.values_list('document_id', flat=True).distinct()) - document_ids
+        return sum(self.remove_aliases(document_id=document_id) for document_id in stale_ids)
+    
+    def group_aliases(self, aliases: List[SectionAlias]) -> List[Tuple[SectionAlias, List[SectionAlias]]]:
+        """
+        Разбиение дубликатов удаленной точки на группы для повторной индексации:
+        первая секция группы индексируется, остальные становятся ее дубликатами
+        
+        Args:
+            aliases: Дубликаты, оставшиеся без точки-оригинала
+        
+        Returns:
+            Список пар (новый оригинал, его дубликаты)
+        """
+        groups = []
+        remaining = [(alias, simhash(alias.text)) for alias in aliases]
+        while remaining:
+            (head, head_hash), rest = remaining[0], remaining[1:]
+            members = []
+            remaining = []
+            for alias, fingerprint in rest:
+                # Дубликаты того же документа не могут ссылаться на его секции
+                if alias.document_id != head.document_id and \
+                        hamming_distance(fingerprint, head_hash) <= self.max_distance:
+                    members.append(alias)
+                else:
+                    remaining.append((alias, fingerprint))
+            groups.append((head, members))
+        return groups
+    
+    def stats(self) -> Dict[str, int]:
+        """Статистика индекса"""
+        return {
+            'fingerprints': SectionFingerprint.objects.count(),
+            'aliases': SectionAlias.objects.count(),
+            'duplicates': self.duplicates,
+        }
+
+
+# Глобальный экземпляр индекса отпечатков
+_deduplicator_instance = None
+
+
+def get_deduplicator() -> SectionDeduplicator:
+    """
+    Получить глобальный экземпляр индекса отпечатков секций
+    
+    Returns:
+        SectionDeduplicator instance
+    """
+    global _deduplicator_instance
+    if _deduplicator_instance is None:
+        _deduplicator_instance = SectionDeduplicator(
+            enabled=getattr(settings, 'SECTION_DEDUP_ENABLED', True),
+            max_distance=getattr(settings, 'SECTION_DEDUP_MAX_DISTANCE', 3)
+        )
+    return _deduplicator_instance
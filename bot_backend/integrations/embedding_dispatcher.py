@@ -0,0 +1,132 @@
+"""
+Динамическое объединение запросов на кодирование вопросов в батчи.
+Одновременные запросы (потоки WSGI, асинхронные views) собираются в очередь;
+поток диспетчера ждет следующих запросов не дольше max_wait после первого
+или до max_batch_size запросов и кодирует их одним вызовом embedder.
+Батч эффективнее кодирования по одному тексту, а единственный поток
+кодирования не создает конкуренции за потоки torch.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+
+class EmbeddingDispatcher:
+    """Очередь запросов на кодирование текстов с объединением в батчи"""
+    
+    def __init__(
+        self,
+        encode: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005
+    ):
+        """
+        Args:
+            encode: Кодирование списка текстов (возвращает векторы в том же порядке)
+            max_batch_size: Максимальное количество текстов в батче
+            max_wait: Максимальное ожидание следующих запросов после первого (сек)
+        """
+        self.encode_batch = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        
+        # Счетчики текущего процесса
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.encode_seconds = 0.0
+    
+    def _ensure_started(self):
+        """Запустить поток диспетчера при первом запросе"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='embedding-dispatcher', daemon=True)
+                self._thread.start()
+    
+    def submit(self, text: str) -> Future:
+        """
+        Поставить текст в очередь на кодирование
+        
+        Args:
+            text: Текст
+        
+        Returns:
+            Future с вектором текста (асинхронный код ожидает его через asyncio.wrap_future)
+        """
+        future = Future()
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future
+    
+    def encode(self, text: str) -> List[float]:
+        """
+        Закодировать текст в составе батча (блокирует вызывающий поток)
+        
+        Args:
+            text: Текст
+        
+        Returns:
+            Вектор текста
+        """
+        return self.submit(text).result()
+    
+    def _collect(self, first) -> List:
+        """Батч: первый запрос и запросы, поступившие в течение max_wait"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                # Уже поставленные в очередь запросы забираются и после истечения ожидания
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+    
+    def _run(self):
+        """Цикл потока диспетчера"""
+        while True:
+            batch = self._collect(self._queue.get())
+            
+            # Запросы, отмененные до начала кодирования (клиент отключился), пропускаются
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            
+            started_at = time.perf_counter()
+            try:
+                vectors = self.encode_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started_at
+            
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+            
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.encode_seconds += elapsed
+    
+    def stats(self) -> Dict[str, Any]:
+        """Статистика диспетчера"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait': self.max_wait,
+                'batches': self.batches,
+                'items': self.items,
+                'average_batch': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'encode_seconds': round(self.encode_seconds, 3),
+            }
@@ -2,44 +2,729 @@
 Модуль для загрузки и индексации документов в Qdrant.
 Сохраняет оригинальные промпты и схему данных.
 """
+import hashlib
+import heapq
 import os
-from typing import List, Optional, Dict
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional, Dict, Tuple, Iterable, Iterator, Union, Set
 from dataclasses import dataclass
 
+import numpy as np
+from django.conf import settings
+from django.db import connections
 from openai import OpenAI
-from qdrant_client.models import PointStruct
+from qdrant_client.models import (
+    PointStruct, PointIdsList, Filter, FieldCondition, MatchValue, MatchAny, Range,
+    DeleteOperation, DeletePayload, DeletePayloadOperation, FilterSelector,
+    SetPayload, SetPayloadOperation
+)
 
-from .ai_client import get_ai_client, SECTION_ANALYSIS_PROMPT
+from .ai_client import get_ai_client, SECTION_ANALYSIS_PROMPT, LLM_MODEL, STAGING_PAYLOAD_KEY
+from .cache import get_llm_cache, get_embedding_cache
+from .dedup import get_deduplicator
+from .markers import ChunkTextIndex
+from .models import SectionAlias, SectionFingerprint
+from .query_cache import get_query_cache
 import uuid
 
+# Модуль resource недоступен в Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _get_peak_rss_mb() -> Optional[float]:
+    """Пиковый объем памяти процесса (МБ), если доступен"""
+    if not resource:
+        return None
+    # ru_maxrss в килобайтах на Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Пространство имен для детерминированных ID точек в Qdrant
+POINT_ID_NAMESPACE = uuid.UUID('6f1c9a52-3d0e-4b8f-9a57-2c4e8d1b7f30')
+
+
+def make_point_id(document_id: str, text: str) -> str:
+    """
+    ID точки в Qdrant, однозначно определяемый документом и текстом секции
+    
+    Args:
+        document_id: ID документа
+        text: Текст секции
+        
+    Returns:
+        UUID точки в строковом виде
+    """
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{document_id}:{text_hash}"))
+
+
+def make_window_id(parent_id: str, window_index: int) -> str:
+    """
+    ID точки окна секции. Первое окно хранится под ID самой секции,
+    поэтому секции из одного окна сохраняют прежние ID точек.
+    
+    Args:
+        parent_id: ID секции (make_point_id)
+        window_index: Номер окна в секции
+    
+    Returns:
+        UUID точки в строковом виде
+    """
+    if window_index == 0:
+        return parent_id
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{parent_id}:{window_index}"))
+
+
+def iter_word_chunks(pieces: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """
+    Разбиение потока фрагментов текста на chunks по chunk_size слов.
+    Результат совпадает с разбиением полного текста, склеенного через перевод строки.
+    
+    Args:
+        pieces: Фрагменты текста (страницы, абзацы, строки)
+        chunk_size: Размер chunk в словах
+        
+    Yields:
+        Слова chunk, объединенные через пробел
+    """
+    words = []
+    for piece in pieces:
+        for word in piece.split():
+            words.append(word)
+            if len(words) == chunk_size:
+                yield ' '.join(words)
+                words = []
+    
+    if words:
+        yield ' '.join(words)
+
+
+class DocumentBuffer:
+    """
+    Нормализованный текст документа: chunks, склеенные через пробел.
+    Секции ссылаются на диапазоны [start, end) буфера, текст секции собирается
+    один раз - при первом обращении (кодирование секции). Chunk освобождается,
+    когда текст всех секций, начинающихся до его конца, собран.
+    """
+    
+    def __init__(self):
+        self.chunks: List[Optional[str]] = []
+        # Начало каждого chunk в тексте документа
+        self.offsets: List[int] = []
+        self.length = 0
+        # Начала секций, текст которых еще не собран (куча с отложенным удалением)
+        self._holds: List[int] = []
+        self._released: Dict[int, int] = {}
+        self._first_chunk = 0
+    
+    def append(self, chunk: str) -> int:
+        """
+        Добавить chunk в конец документа
+        
+        Returns:
+            Начало chunk в тексте документа
+        """
+        start = self.length + 1 if self.chunks else 0
+        self.chunks.append(chunk)
+        self.offsets.append(start)
+        self.length = start + len(chunk)
+        return start
+    
+    def hold(self, start: int):
+        """Сохранять текст документа начиная с позиции start (до вызова release)"""
+        heapq.heappush(self._holds, start)
+    
+    def release(self, start: int):
+        """Текст с позиции start больше не нужен секции: освободить chunks до первой удерживаемой позиции"""
+        self._released[start] = self._released.get(start, 0) + 1
+        while self._holds and self._released.get(self._holds[0]):
+            top = heapq.heappop(self._holds)
+            self._released[top] -= 1
+            if not self._released[top]:
+                del self._released[top]
+        
+        floor = self._holds[0] if self._holds else self.length + 1
+        while self._first_chunk < len(self.chunks):
+            i = self._first_chunk
+            if self.offsets[i] + len(self.chunks[i]) >= floor:
+                break
+            self.chunks[i] = None
+            self._first_chunk += 1
+    
+    def slice(self, start: int, end: int) -> str:
+        """Текст документа в диапазоне [start, end)"""
+        i = bisect_right(self.offsets, start) - 1
+        offset = self.offsets[i]
+        chunk = self.chunks[i]
+        if chunk is None:
+            raise RuntimeError(f"Document text at {start} has been released")
+        if end <= offset + len(chunk):
+            return chunk[start - offset:end - offset]
+        
+        # Диапазон продолжается в следующих chunks
+        pieces = [chunk[start - offset:]]
+        while end > offset + len(chunk) + 1:
+            i += 1
+            offset = self.offsets[i]
+            chunk = self.chunks[i]
+            pieces.append(chunk[:end - offset])
+        return ' '.join(pieces)
+    
+    def text(self, spans: List[List[int]]) -> str:
+        """Текст секции из нескольких диапазонов (через пробел)"""
+        if len(spans) == 1:
+            return self.slice(*spans[0])
+        return ' '.join(self.slice(start, end) for start, end in spans)
+
 
-@dataclass
 class DocumentSection:
-    """Секция документа"""
-    text: str
-    title: str
-    year: Optional[int] = None
+    """
+    Секция документа.
+    Текст секции, выделенной при сегментации, хранится как диапазоны буфера
+    документа и собирается при первом обращении к text.
+    """
+    
+    __slots__ = ('title', 'year', 'buffer', 'spans', '_text')
+    
+    def __init__(
+        self,
+        text: Optional[str] = None,
+        title: str = '',
+        year: Optional[int] = None,
+        buffer: Optional[DocumentBuffer] = None,
+        spans: Optional[List[List[int]]] = None
+    ):
+        self.title = title
+        self.year = year
+        self.buffer = buffer
+        self.spans = spans
+        self._text = text
+    
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.buffer.text(self.spans)
+            self.buffer.release(self.spans[0][0])
+            self.buffer = None
+        return self._text
+    
+    def __len__(self) -> int:
+        """Длина текста секции (без сборки текста)"""
+        if self._text is not None:
+            return len(self._text)
+        return sum(end - start for start, end in self.spans) + len(self.spans) - 1
+    
+    def __repr__(self) -> str:
+        return f"DocumentSection(title={self.title!r}, year={self.year!r}, length={len(self)})"
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Диапазон текста без пробелов по краям"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _count_words(text: str, start: int, end: int) -> int:
+    """Количество слов в диапазоне текста, слова которого разделены одним пробелом"""
+    start, end = _strip_span(text, start, end)
+    return text.count(' ', start, end) + 1 if end > start else 0
+
+
+@dataclass
+class ChunkSegmentation:
+    """Результат сегментации chunk"""
+    chunk: str
+    # Диапазоны [start, end) секций, начинающихся в chunk
+    # (последняя может продолжиться в следующем chunk)
+    borders: List[Tuple[int, int]]
+    # Диапазон в начале chunk до первой границы, продолжающий предыдущую секцию
+    continuation: Optional[Tuple[int, int]] = None
+    # Метаданные документа, найденные при сегментации chunk
+    meta: Optional[Dict[str, any]] = None
+    # Доля слов chunk, разделенных на секции уверенно
+    confidence: float = 1.0
+    llm_used: bool = False
+    # Токены запроса и ответа LLM (0 - ответ из кэша)
+    llm_tokens: int = 0
+
+
+class Segmenter:
+    """
+    Интерфейс сегментатора: разделение chunk на секции и извлечение метаданных документа.
+    Метод segment вызывается из рабочих потоков одновременно для разных chunks.
+    """
+    
+    name = ''
+    
+    def __init__(self, processor: 'DocumentProcessor'):
+        self.processor = processor
+    
+    def segment(self, chunk: str, previous_word: str = '') -> ChunkSegmentation:
+        """
+        Разделение chunk на секции
+        
+        Args:
+            chunk: Текст chunk
+            previous_word: Последнее слово предыдущего chunk ('' - chunk в начале документа)
+        """
+        raise NotImplementedError
+    
+    def extract_meta(self, first: ChunkSegmentation) -> Optional[Dict[str, any]]:
+        """Метаданные документа (title, year) по результату сегментации первого chunk"""
+        return first.meta
+
+
+class LLMSegmenter(Segmenter):
+    """Сегментация с помощью LLM (SECTION_ANALYSIS_PROMPT)"""
+    
+    name = 'llm'
+    
+    def segment(self, chunk: str, previous_word: str = '') -> ChunkSegmentation:
+        content, tokens = self.processor._request_llm_for_sections(chunk)
+        return ChunkSegmentation(
+            chunk=chunk,
+            borders=self.processor._parse_section_spans(chunk, content),
+            meta=self.processor._parse_meta(content),
+            llm_used=True,
+            llm_tokens=tokens
+        )
+    
+    def extract_meta(self, first: ChunkSegmentation) -> Optional[Dict[str, any]]:
+        # Первый chunk содержит титульный лист, и LLM обычно возвращает
+        # блок META вместе с RESULT - тогда отдельный запрос не нужен
+        if first.meta is not None:
+            return first.meta
+        print('META not found in first chunk, requesting separately...')
+        return self.processor._extract_meta(' '.join(first.chunk.split()[:self.processor.TITLE_INFO_SIZE]))
+
+
+class RuleBasedSegmenter(Segmenter):
+    """
+    Сегментация по заголовкам нормативных документов без запросов к LLM:
+    "Раздел", "Глава", "Статья", "Приложение", пункты "1.", "1.2.", "1.2.3.".
+    Название и год документа определяются по титульному листу.
+    """
+    
+    name = 'rules'
+    
+    # Секция короче MIN_SECTION_WORDS слов объединяется со следующей
+    MIN_SECTION_WORDS = 40
+    # Секция длиннее MAX_SECTION_WORDS слов считается разделенной неуверенно
+    MAX_SECTION_WORDS = 1000
+    # Максимальная длина названия документа в словах
+    TITLE_MAX_WORDS = 30
+    
+    # Заголовок пункта начинается после конца предложения (слова chunk разделены одним пробелом).
+    # В начале chunk конец предложения проверяется по последнему слову предыдущего chunk (find_headings)
+    SENTENCE_END = '.:;!?)»'
+    _CLAUSE_START = r'(?:^|(?<=[.:;!?)»] ))'
+    HEADING_RE = re.compile(
+        r'(?:^|(?<= ))(?:Раздел|РАЗДЕЛ|Глава|ГЛАВА|Статья|СТАТЬЯ)\s+(?:[IVXLC]+|\d+(?:\.\d+)*)\b'
+        r'|(?:^|(?<= ))(?:Приложение|ПРИЛОЖЕНИЕ)(?:\s+(?:N|№)?\s*\d+)?(?=\s+[кК]\s)'
+        + r'|' + _CLAUSE_START + r'(?P<clause>[IVXLC]+\.\s(?=[А-ЯЁ])|\d{1,3}(?:\.\d{1,3})*\.?\s(?=[А-ЯЁ]))'
+    )
+    # Сокращения, после которых номер - ссылка, а не заголовок ("п. 5.2. Правил")
+    REFERENCE_WORDS = {
+        'п.', 'пп.', 'ст.', 'ч.', 'гл.', 'разд.', 'абз.', 'подп.', 'прил.',
+        'см.', 'т.', 'г.', 'рис.', 'табл.', 'n', '№'
+    }
+    
+    _MONTHS = r'(?:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)'
+    YEAR_PATTERNS = [
+        re.compile(r'\bот\s+\d{1,2}\s+' + _MONTHS + r'\s+((?:19|20)\d{2})', re.IGNORECASE),
+        re.compile(r'\bот\s+\d{1,2}\.\d{1,2}\.((?:19|20)\d{2})', re.IGNORECASE),
+        re.compile(r'\b(?:ГОСТ|СП|СНиП|СанПиН)\s+[\w.\s]*?\d[-–—]((?:19|20)\d{2})\b'),
+        re.compile(r'\b((?:19|20)\d{2})\s*(?:г\.|года?\b)'),
+    ]
+    TITLE_START_RE = re.compile(
+        r'\b(?:ФЕДЕРАЛЬНЫЙ ЗАКОН|Федеральный закон|ПРИКАЗ|Приказ|ПОСТАНОВЛЕНИЕ|Постановление|'
+        r'РАСПОРЯЖЕНИЕ|Распоряжение|ПРАВИЛА|Правила|ПОЛОЖЕНИЕ|Положение|ИНСТРУКЦИЯ|Инструкция|'
+        r'МЕТОДИЧЕСКИЕ РЕКОМЕНДАЦИИ|Методические рекомендации|ТРЕБОВАНИЯ|Требования|'
+        r'ГОСТ|СанПиН|СНиП|СП)\b'
+    )
+    TITLE_END_RE = re.compile(
+        r'\s(?:В соответствии|В целях|На основании|Во исполнение|ПРИКАЗЫВАЮ|[Пп]риказываю|'
+        r'ПОСТАНОВЛЯЕТ|[Пп]остановляет|Утвердить|УТВЕРЖДЕН|Принят|Зарегистрирован'
+        # На титульном листе первый пункт часто следует за названием без точки
+        r'|(?:[IVXLC]+|\d{1,3}(?:\.\d{1,3})*)\.\s(?=[А-ЯЁ]))'
+    )
+    
+    def find_headings(self, chunk: str, previous_word: str = '') -> List[int]:
+        """
+        Позиции заголовков в chunk
+        
+        Args:
+            chunk: Текст chunk
+            previous_word: Последнее слово предыдущего chunk ('' - chunk в начале документа)
+        
+        Returns:
+            Позиции начала заголовков по возрастанию
+        """
+        positions = []
+        for match in self.HEADING_RE.finditer(chunk):
+            pos = match.start()
+            if pos > 0:
+                word = chunk[chunk.rfind(' ', 0, pos - 1) + 1:pos].strip()
+            elif previous_word and match.group('clause') and previous_word[-1] not in self.SENTENCE_END:
+                # Номер в начале chunk продолжает предложение предыдущего chunk ("Глава | 2.")
+                continue
+            else:
+                word = previous_word
+            # Ссылка на пункт или статью ("п. 5.2. Правил", "(п. 5.2. Правил")
+            if word.lower().lstrip('(«"') in self.REFERENCE_WORDS:
+                continue
+            positions.append(pos)
+        return positions
+    
+    def segment(self, chunk: str, previous_word: str = '') -> ChunkSegmentation:
+        positions = self.find_headings(chunk, previous_word)
+        if not positions:
+            # Нет заголовков: chunk продолжает предыдущую секцию
+            return ChunkSegmentation(chunk=chunk, borders=[], continuation=(0, len(chunk)), confidence=0.0)
+        
+        # Короткие секции (оглавление, пункты из одной строки) объединяются со следующими
+        starts = [positions[0]]
+        for pos in positions[1:]:
+            if _count_words(chunk, starts[-1], pos) >= self.MIN_SECTION_WORDS:
+                starts.append(pos)
+        
+        continuation = _strip_span(chunk, 0, starts[0])
+        if continuation[0] == continuation[1]:
+            continuation = None
+        borders = [
+            _strip_span(chunk, start, end)
+            for start, end in zip(starts, starts[1:] + [len(chunk)])
+        ]
+        
+        total_words = _count_words(chunk, 0, len(chunk))
+        confident_words = sum(
+            words for words in (
+                _count_words(chunk, start, end)
+                for start, end in ([continuation] if continuation else []) + borders
+            )
+            if words <= self.MAX_SECTION_WORDS
+        )
+        return ChunkSegmentation(
+            chunk=chunk,
+            borders=borders,
+            continuation=continuation,
+            confidence=confident_words / total_words if total_words else 0.0
+        )
+    
+    def parse_title_page(self, chunk: str) -> Optional[Dict[str, any]]:
+        """
+        Название и год документа по титульному листу
+        
+        Args:
+            chunk: Первый chunk документа
+        
+        Returns:
+            dict с ключами title и/или year или None
+        """
+        text = ' '.join(chunk.split()[:self.processor.TITLE_INFO_SIZE])
+        meta = {}
+        
+        for pattern in self.YEAR_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                meta['year'] = int(match.group(1))
+                break
+        
+        match = self.TITLE_START_RE.search(text)
+        if match:
+            start = match.start()
+            end = len(text)
+            end_match = self.TITLE_END_RE.search(text, match.end())
+            if end_match:
+                end = end_match.start()
+            headings = [pos for pos in self.find_headings(text) if pos > match.end()]
+            if headings:
+                end = min(end, headings[0])
+            
+            words = text[start:end].split()[:self.TITLE_MAX_WORDS]
+            title = ' '.join(words).rstrip(' ,;:-–—')
+            if len(title.split()) >= 2:
+                meta['title'] = title
+        
+        return meta or None
+    
+    def extract_meta(self, first: ChunkSegmentation) -> Optional[Dict[str, any]]:
+        return self.parse_title_page(first.chunk)
+
+
+class AutoSegmenter(RuleBasedSegmenter):
+    """
+    Сегментация по заголовкам с переходом на LLM для chunks, разделенных неуверенно
+    (мало заголовков, слишком длинные секции), и для документов без распознанного названия
+    """
+    
+    name = 'auto'
+    
+    def __init__(self, processor: 'DocumentProcessor'):
+        super().__init__(processor)
+        self.llm_segmenter = LLMSegmenter(processor)
+        self.min_confidence = getattr(settings, 'SEGMENTER_MIN_CONFIDENCE', 0.6)
+    
+    def segment(self, chunk: str, previous_word: str = '') -> ChunkSegmentation:
+        result = super().segment(chunk, previous_word)
+        if result.confidence < self.min_confidence:
+            return self.llm_segmenter.segment(chunk)
+        return result
+    
+    def extract_meta(self, first: ChunkSegmentation) -> Optional[Dict[str, any]]:
+        meta = first.meta if first.llm_used else None
+        if meta is None:
+            meta = self.parse_title_page(first.chunk)
+        if meta is None or 'title' not in meta:
+            print('Title not recognized by rules, requesting LLM...')
+            llm_meta = self.llm_segmenter.extract_meta(first)
+            if llm_meta:
+                meta = {**(meta or {}), **llm_meta}
+        return meta
+
+
+# Доступные сегментаторы по названию (Document.segmenter, DOCUMENT_SEGMENTER)
+SEGMENTERS = {
+    LLMSegmenter.name: LLMSegmenter,
+    RuleBasedSegmenter.name: RuleBasedSegmenter,
+    AutoSegmenter.name: AutoSegmenter,
+}
+
+
+def assemble_sections(
+    results: Iterable[ChunkSegmentation],
+    extract_meta: Callable[[ChunkSegmentation], Optional[Dict[str, any]]],
+    buffer: Optional[DocumentBuffer] = None
+) -> Iterator[DocumentSection]:
+    """
+    Сборка секций документа из результатов сегментации chunks.
+    Секции - диапазоны буфера документа: продолжение секции в следующем chunk
+    расширяет диапазон, текст не копируется до обращения к DocumentSection.text.
+    
+    Args:
+        results: Результаты сегментации в порядке chunks
+        extract_meta: Извлечение метаданных по результату для первого chunk
+        buffer: Буфер документа (по умолчанию новый)
+    
+    Yields:
+        Секции документа
+    """
+    buffer = buffer if buffer is not None else DocumentBuffer()
+    title = 'Неизвестный документ'
+    year = None
+    current_spans = None
+    
+    for i, result in enumerate(results):
+        if i == 0:
+            # Пока извлекаются метаданные, следующие chunks уже в работе
+            meta = extract_meta(result)
+            if meta:
+                title = meta.get('title', title)
+                year = meta.get('year')
+        offset = buffer.append(result.chunk)
+        
+        if not result.borders and result.continuation is None:
+            # Chunk без границ продолжает предыдущую секцию
+            continuation = (0, len(result.chunk))
+        else:
+            # Текст до первой границы: ответ LLM его не включает, правила присоединяют к секции
+            continuation = result.continuation
+        
+        if continuation and continuation[1] > continuation[0]:
+            start, end = offset + continuation[0], offset + continuation[1]
+            if current_spans is None:
+                current_spans = [[start, end]]
+                buffer.hold(start)
+            elif start == current_spans[-1][1] + 1:
+                # Продолжение с начала chunk: диапазон растет через пробел между chunks
+                current_spans[-1][1] = end
+            else:
+                current_spans.append([start, end])
+        
+        for start, end in result.borders:
+            if result.llm_used and end - start <= 80:
+                continue
+            # Начало новой секции удерживается до выдачи предыдущей
+            buffer.hold(offset + start)
+            if current_spans is not None:
+                yield DocumentSection(title=title, year=year, buffer=buffer, spans=current_spans)
+            current_spans = [[offset + start, offset + end]]
+    
+    if current_spans is not None:
+        yield DocumentSection(title=title, year=year, buffer=buffer, spans=current_spans)
+
+
+class ProcessingCancelled(Exception):
+    """Обработка документа отменена"""
+
+
+class IndexingProgress:
+    """
+    Ход индексации документа: текущий этап, обработанные chunks,
+    время и счетчики этапов. Этапы потоковой обработки чередуются
+    (извлечение страницы, сегментация chunk, кодирование батча), поэтому время
+    этапа - суммарное время внутри него без вложенных этапов.
+    Базовый класс хранит состояние в памяти; подклассы сохраняют его в changed().
+    """
+    
+    STAGES = ['extract', 'segment', 'embed', 'upsert', 'commit']
+    
+    def __init__(self):
+        self.stage = ''
+        self.chunks_done = 0
+        self.chunks_total: Optional[int] = None
+        self.stats: Dict[str, Dict[str, any]] = {}
+        self._lock = threading.Lock()
+        # Вложенные этапы текущего потока: [этап, начало, время вложенных этапов].
+        # Этапы одного документа могут выполняться в разных потоках одновременно
+        # (кодирование и загрузка точек при загрузке корпуса)
+        self._local = threading.local()
+    
+    @property
+    def _stack(self) -> list:
+        """Вложенные этапы текущего потока"""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+    
+    def changed(self, force: bool = False):
+        """Состояние изменилось (force - сохранить без ограничения частоты)"""
+    
+    def cancelled(self) -> bool:
+        """Запрошена отмена обработки"""
+        return False
+    
+    def raise_if_cancelled(self):
+        """Прервать обработку, если запрошена отмена (проверяется между chunks и батчами)"""
+        if self.cancelled():
+            raise ProcessingCancelled("Обработка документа отменена")
+    
+    def set_stage(self, stage: str):
+        """Перейти к этапу"""
+        self.stage = stage
+        self.changed(force=True)
+    
+    def add(self, stage: str, **counters):
+        """Увеличить счетчики этапа"""
+        with self._lock:
+            stats = self.stats.setdefault(stage, {'seconds': 0.0})
+            for key, value in counters.items():
+                stats[key] = stats.get(key, 0) + value
+    
+    def chunk_done(self):
+        """Chunk сегментирован"""
+        with self._lock:
+            self.chunks_done += 1
+        self.changed()
+    
+    @contextmanager
+    def timing(self, stage: str):
+        """Учет времени этапа (без времени вложенных этапов)"""
+        parent_stage = self.stage
+        frame = [stage, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        self.stage = stage
+        self.changed()
+        try:
+            yield
+            # При ошибке остается этап, на котором она произошла
+            self.stage = parent_stage
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+            self.add(stage, seconds=elapsed - frame[2])
+    
+    def timed(self, stage: str, iterable: Iterable) -> Iterator:
+        """Поток, время получения элементов которого учитывается в этапе"""
+        iterator = iter(iterable)
+        while True:
+            with self.timing(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    
+    def summary(self) -> str:
+        """Строка со временем этапов"""
+        return ', '.join(
+            f"{stage} {self.stats[stage]['seconds']:.1f}s"
+            for stage in self.STAGES if stage in self.stats
+        )
 
 
 class DocumentProcessor:
     """Процессор для обработки и индексации документов"""
     
-    def __init__(self):
+    # Окно сортировки секций по длине (в батчах) при потоковой индексации
+    EMBEDDING_SORT_WINDOW = 8
+    
+    def __init__(self, collection_name: Optional[str] = None):
         self.ai_client = get_ai_client()
         self.llm = self.ai_client.llm
         self.embedder = self.ai_client.embedder
         self.qdrant_client = self.ai_client.qdrant_client
-        self.collection_name = self.ai_client.collection_name
+        # По умолчанию - рабочая коллекция; другая коллекция используется при полной пересборке индекса
+        self.collection_name = collection_name or self.ai_client.collection_name
+        self.embedder_model_name = self.ai_client.embedder_model_name
+        self.llm_cache = get_llm_cache()
+        self.embedding_cache = get_embedding_cache()
+        self.deduplicator = get_deduplicator()
+        self.query_cache = get_query_cache()
+        # Индекс отпечатков описывает рабочую коллекцию. При пересборке в другую
+        # коллекцию (ID точек те же) он только читается: сохраненные дубликаты не индексируются
+        self.is_live_collection = self.collection_name == self.ai_client.collection_name
         
         # Константы (НЕ ИЗМЕНЯТЬ!)
         self.PAGE_SIZE = self.ai_client.PAGE_SIZE
         self.TITLE_INFO_SIZE = self.ai_client.TITLE_INFO_SIZE
         self.CHUNK_SIZE = self.ai_client.CHUNK_SIZE
+        
+        # Максимальное количество одновременных запросов к LLM при сегментации
+        self.segmentation_workers = max(1, getattr(settings, 'LLM_SEGMENTATION_WORKERS', 4))
+        # Количество секций, которые кодируются и загружаются в Qdrant за один раз
+        self.embedding_batch_size = max(1, getattr(settings, 'EMBEDDING_BATCH_SIZE', 64))
+        # Перекрытие соседних окон длинной секции (в токенах embedder)
+        self.window_overlap = max(0, getattr(settings, 'EMBEDDING_WINDOW_OVERLAP', 64))
+        # Сегментатор документов без явно выбранного (llm, rules, auto)
+        self.default_segmenter = getattr(settings, 'DOCUMENT_SEGMENTER', 'llm')
     
     def _query_llm_for_sections(self, chunk: str) -> str:
-        """Запрос к LLM для анализа секций документа (НЕ ИЗМЕНЯТЬ!)"""
+        """
+        Запрос к LLM для анализа секций документа (НЕ ИЗМЕНЯТЬ!)
+        Ответы кэшируются по хэшу промпта, модели и текста chunk.
+        """
+        return self._request_llm_for_sections(chunk)[0]
+    
+    def _request_llm_for_sections(self, chunk: str) -> Tuple[str, int]:
+        """
+        Запрос к LLM для анализа секций документа с учетом токенов
+        
+        Returns:
+            Ответ LLM и количество токенов запроса и ответа (0 - ответ из кэша)
+        """
+        cache_key = self.llm_cache.make_key(SECTION_ANALYSIS_PROMPT, LLM_MODEL, chunk)
+        cached_content = self.llm_cache.get(cache_key)
+        if cached_content is not None:
+            print('LLM Response: <cached>')
+            return cached_content, 0
+        
         response = self.llm.chat.completions.create(
-            model="deepseek-chat",
+            model=LLM_MODEL,
             messages=[
                 {"role": "system", "content": SECTION_ANALYSIS_PROMPT},
                 {"role": "user", "content": chunk}
@@ -49,7 +734,9 @@ class DocumentProcessor:
         content = response.choices[0].message.content.strip()
         print(f'LLM Response: {content}')
         print('---')
-        return content
+        
+        self.llm_cache.set(cache_key, LLM_MODEL, content)
+        return content, response.usage.total_tokens if response.usage else 0
     
     def _strip_code_fence(self, content: str) -> str:
         """Удаление markdown code fence маркеров (НЕ ИЗМЕНЯТЬ!)"""
@@ -67,6 +754,19 @@ class DocumentProcessor:
         Разделение chunk на секции на основе анализа LLM (НЕ ИЗМЕНЯТЬ!)
         """
         content = self._query_llm_for_sections(chunk)
+        return self._parse_section_chunks(chunk, content)
+    
+    def _parse_section_chunks(self, chunk: str, content: str) -> List[str]:
+        """
+        Разбор ответа LLM и выделение секций chunk (НЕ ИЗМЕНЯТЬ!)
+        """
+        return [chunk[start:end] for start, end in self._parse_section_spans(chunk, content)]
+    
+    def _parse_section_spans(self, chunk: str, content: str) -> List[Tuple[int, int]]:
+        """
+        Разбор ответа LLM: диапазоны [start, end) секций chunk (НЕ ИЗМЕНЯТЬ!)
+        Маркеры ищутся с учетом отличий в пробелах, кавычках и обрезки цитаты (ChunkTextIndex).
+        """
         content = self._strip_code_fence(content)
         
         # Check for NO RESULT
@@ -84,6 +784,10 @@ class DocumentProcessor:
         # Parse markers and build sections (streaming, preserving order)
         sections = []
         current_section_start = None
+        # Tolerant marker search in normalized text, strictly after the previous marker:
+        # a marker that is not found after it (out of order or repeated) is dropped
+        text_index = ChunkTextIndex(chunk)
+        search_from = 0
         
         for line in content.splitlines():
             line = line.strip()
@@ -114,15 +818,17 @@ class DocumentProcessor:
                 text = text[:-1].strip()
             
             # Find position in chunk
-            pos = chunk.find(text)
+            pos = text_index.find(text, search_from)
             if pos == -1:
+                print(f'Marker not found in chunk after previous marker: {text[:80]}')
                 continue
+            search_from = pos + 1
             
             # Process marker
             if marker_type == "skipfrom":
                 # Close current section before rubbish
                 if current_section_start is not None:
-                    sections.append(chunk[current_section_start:pos])
+                    sections.append((current_section_start, pos))
                     current_section_start = None
             elif marker_type == "startfrom":
                 # Start new section
@@ -135,13 +841,17 @@ class DocumentProcessor:
         
         # Close last section if still open
         if current_section_start is not None:
-            sections.append(chunk[current_section_start:])
+            sections.append((current_section_start, len(chunk)))
         
         return sections
     
     def _extract_meta(self, chunk: str) -> Optional[Dict[str, any]]:
         """Извлечение метаданных документа (НЕ ИЗМЕНЯТЬ!)"""
         content = self._query_llm_for_sections(chunk)
+        return self._parse_meta(content)
+    
+    def _parse_meta(self, content: str) -> Optional[Dict[str, any]]:
+        """Разбор блока META из ответа LLM (НЕ ИЗМЕНЯТЬ!)"""
         content = self._strip_code_fence(content)
         
         # Extract content between <META> tags
@@ -175,89 +885,912 @@ class DocumentProcessor:
         
         return meta if meta else None
     
-    def process_document(self, text: str) -> List[DocumentSection]:
+    def get_segmenter(self, name: Optional[str] = None) -> Segmenter:
+        """
+        Получить сегментатор по названию
+        
+        Args:
+            name: llm, rules или auto (по умолчанию DOCUMENT_SEGMENTER)
+            
+        Returns:
+            Segmenter instance
+        """
+        name = name or self.default_segmenter
+        if name not in SEGMENTERS:
+            raise ValueError(f"Неизвестный сегментатор: {name}")
+        return SEGMENTERS[name](self)
+    
+    def _segment_chunks(self, chunks: Iterable[str], segmenter: Segmenter) -> Iterator[ChunkSegmentation]:
+        """
+        Сегментация потока chunks с ограниченным параллелизмом запросов к LLM.
+        Одновременно в работе находится не более 2 * segmentation_workers chunks.
+        
+        Args:
+            chunks: Поток chunks документа
+            segmenter: Сегментатор
+            
+        Yields:
+            Результаты сегментации в исходном порядке chunks
+        """
+        # Сегментация прервана (отмена обработки или ошибка)
+        stop = threading.Event()
+        
+        def segment(index: int, chunk: str, previous_word: str) -> ChunkSegmentation:
+            if stop.is_set():
+                raise ProcessingCancelled("Сегментация прервана")
+            print(f'Processing chunk {index + 1}...')
+            try:
+                return segmenter.segment(chunk, previous_word)
+            finally:
+                # Закрытие соединений с БД (кэш), открытых в рабочем потоке
+                connections.close_all()
+        
+        max_in_flight = self.segmentation_workers * 2
+        executor = ThreadPoolExecutor(
+            max_workers=self.segmentation_workers,
+            thread_name_prefix='llm-segment'
+        )
+        completed = False
+        try:
+            pending = deque()
+            # Заголовок в начале chunk проверяется по последнему слову предыдущего chunk
+            previous_word = ''
+            for index, chunk in enumerate(chunks):
+                pending.append(executor.submit(segment, index, chunk, previous_word))
+                previous_word = chunk[chunk.rfind(' ') + 1:]
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+            
+            # Результаты выдаются в порядке chunks
+            while pending:
+                yield pending.popleft().result()
+            completed = True
+        finally:
+            # При прерывании запросы к LLM, которые еще не начаты, не отправляются,
+            # а ответы уже отправленных запросов не ожидаются
+            stop.set()
+            executor.shutdown(wait=completed, cancel_futures=True)
+    
+    def iter_sections(
+        self,
+        text: Union[str, Iterable[str]],
+        segmenter: Optional[str] = None,
+        progress: Optional[IndexingProgress] = None
+    ) -> Iterator[DocumentSection]:
+        """
+        Потоковая обработка документа и разделение на секции.
+        Секция выдается, как только становится известно, что она завершена,
+        поэтому в памяти находятся только chunks в работе и текущая секция.
+        
+        Args:
+            text: Текст документа или поток его фрагментов (страниц, абзацев)
+            segmenter: Сегментатор: llm, rules или auto (по умолчанию DOCUMENT_SEGMENTER)
+            progress: Ход индексации (этапы extract и segment)
+            
+        Yields:
+            Секции документа
+        """
+        pieces = [text] if isinstance(text, str) else text
+        segmenter = self.get_segmenter(segmenter)
+        progress = progress or IndexingProgress()
+        
+        start_time = time.time()
+        cache_hits, cache_misses = self.llm_cache.hits, self.llm_cache.misses
+        counts = {'chunks': 0, 'llm_chunks': 0, 'sections': 0}
+        
+        def counted(results: Iterator[ChunkSegmentation]) -> Iterator[ChunkSegmentation]:
+            for result in results:
+                counts['chunks'] += 1
+                counts['llm_chunks'] += result.llm_used
+                progress.add('segment', chunks=1, llm_chunks=int(result.llm_used), llm_tokens=result.llm_tokens)
+                progress.chunk_done()
+                yield result
+                # Отмена проверяется между chunks
+                progress.raise_if_cancelled()
+        
+        chunks = iter_word_chunks(progress.timed('extract', pieces), self.CHUNK_SIZE)
+        segmented = self._segment_chunks(chunks, segmenter)
+        try:
+            results = counted(segmented)
+            for section in progress.timed('segment', assemble_sections(results, segmenter.extract_meta)):
+                counts['sections'] += 1
+                yield section
+        finally:
+            # Остановка запросов к LLM, если обработка прервана
+            segmented.close()
+        progress.add('segment', sections=counts['sections'])
+        
+        print(
+            f"Segmented {counts['chunks']} chunks into {counts['sections']} sections "
+            f"in {time.time() - start_time:.1f}s (segmenter: {segmenter.name}, "
+            f"LLM chunks: {counts['llm_chunks']}, workers: {self.segmentation_workers}, "
+            f"LLM cache hits: {self.llm_cache.hits - cache_hits}, "
+            f"misses: {self.llm_cache.misses - cache_misses})"
+        )
+    
+    def process_document(
+        self,
+        text: Union[str, Iterable[str]],
+        segmenter: Optional[str] = None
+    ) -> List[DocumentSection]:
         """
         Обработка текста документа и разделение на секции
         
         Args:
-            text: Текст документа
+            text: Текст документа или поток его фрагментов
+            segmenter: Сегментатор: llm, rules или auto
             
         Returns:
             Список секций документа
         """
-        document_words = text.replace('\n', ' ').split()
+        return list(self.iter_sections(text, segmenter))
+    
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Получение эмбеддингов текстов с использованием кэша.
+        Через embedder проходят только тексты, которых нет в кэше.
         
-        # Извлечение метаданных из начала документа
-        meta = self._extract_meta(' '.join(document_words[:self.TITLE_INFO_SIZE]))
-        title = meta.get('title', 'Неизвестный документ') if meta else 'Неизвестный документ'
-        year = meta.get('year') if meta else None
+        Args:
+            texts: Список текстов
+            
+        Returns:
+            Матрица эмбеддингов (по строке на текст)
+        """
+        cached = self.embedding_cache.get_many(self.embedder_model_name, texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
         
-        # Разделение на chunks
-        chunks = []
-        for i in range(0, len(document_words), self.CHUNK_SIZE):
-            chunk = document_words[i:i + self.CHUNK_SIZE]
-            chunks.append(' '.join(chunk))
+        vectors = np.empty((len(texts), self.ai_client.vector_size), dtype=np.float32)
+        for i, vector in cached.items():
+            vectors[i] = vector
         
-        # Обработка chunks и получение секций
-        sections = []
-        for chunk in chunks:
-            print('Processing chunk...')
-            borders = self._get_section_chunks(chunk)
-            if borders:
-                sections.extend([b for b in borders if len(b) > 80])
-            elif sections:
-                sections[-1] += ' ' + chunk
-            else:
-                sections.append(chunk)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = self.embedder.encode(missing_texts, batch_size=self.embedding_batch_size)
+            vectors[missing] = encoded
+            self.embedding_cache.set_many(self.embedder_model_name, missing_texts, encoded)
         
-        # Создание объектов DocumentSection
-        result = []
-        for section_text in sections:
-            result.append(DocumentSection(
-                text=section_text,
-                title=title,
-                year=year
-            ))
+        return vectors
+    
+    def split_windows(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Разбиение текста секции на перекрывающиеся окна по токенам embedder.
+        Модель читает не больше max_seq_length токенов: без разбиения
+        длинная секция кодируется только по началу.
         
-        return result
+        Args:
+            text: Текст секции
+        
+        Returns:
+            Диапазоны окон в тексте секции (одно окно, если секция помещается в модель)
+        """
+        tokenizer = getattr(self.embedder, 'tokenizer', None)
+        max_seq_length = getattr(self.embedder, 'max_seq_length', None)
+        # Смещения токенов в тексте есть только у быстрых токенизаторов
+        if not max_seq_length or not getattr(tokenizer, 'is_fast', False):
+            return [(0, len(text))]
+        
+        window_tokens = max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+        offsets = tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            verbose=False
+        )['offset_mapping']
+        if len(offsets) <= window_tokens:
+            return [(0, len(text))]
+        
+        step = max(1, window_tokens - self.window_overlap)
+        windows = []
+        for start in range(0, len(offsets), step):
+            end = min(start + window_tokens, len(offsets))
+            windows.append((offsets[start][0] if start else 0, offsets[end - 1][1]))
+            if end == len(offsets):
+                break
+        return windows
     
-    def index_document(self, sections: List[DocumentSection], document_id: str):
+    def _make_points(
+        self,
+        sections: List,
+        point_ids: List[str],
+        document_ids: List[str],
+        staged: bool = False
+    ) -> List[PointStruct]:
         """
-        Индексация секций документа в Qdrant (НЕ ИЗМЕНЯТЬ СХЕМУ!)
+        Кодирование секций в точки Qdrant: по точке на окно секции.
+        Первое окно хранит полный текст секции, остальные - текст окна;
+        все окна ссылаются на секцию полем parent_id.
+        
+        Args:
+            sections: Секции (объекты с полями text, title, year)
+            point_ids: ID секций
+            document_ids: ID документов секций
+            staged: Пометить точки скрытыми от поиска
+        
+        Returns:
+            Точки всех окон секций
+        """
+        windows = [self.split_windows(section.text) for section in sections]
+        vectors = iter(self._encode_texts([
+            section.text[start:end]
+            for section, spans in zip(sections, windows)
+            for start, end in spans
+        ]))
+        
+        points = []
+        for section, point_id, document_id, spans in zip(sections, point_ids, document_ids, windows):
+            for window_index, (start, end) in enumerate(spans):
+                payload = {
+                    "text": section.text if window_index == 0 else section.text[start:end],
+                    "title": section.title,
+                    "year": section.year,
+                    "document_id": document_id,
+                    "parent_id": point_id,
+                    "window_index": window_index
+                }
+                if staged:
+                    payload[STAGING_PAYLOAD_KEY] = True
+                
+                points.append(PointStruct(
+                    id=make_window_id(point_id, window_index),
+                    vector=next(vectors).tolist(),
+                    payload=payload
+                ))
+        return points
+    
+    def _iter_section_batches(self, sections: Iterable[DocumentSection]) -> Iterator[List[DocumentSection]]:
+        """
+        Группировка потока секций в батчи для кодирования.
+        Секции накапливаются окном из EMBEDDING_SORT_WINDOW батчей и внутри окна
+        упорядочиваются по длине текста: в батче оказываются тексты близкой длины,
+        и embedder тратит меньше вычислений на padding.
+        
+        Args:
+            sections: Поток секций документа
+            
+        Yields:
+            Батчи секций
+        """
+        window_size = self.embedding_batch_size * self.EMBEDDING_SORT_WINDOW
+        window = []
+        
+        def split(window):
+            window.sort(key=len)
+            for i in range(0, len(window), self.embedding_batch_size):
+                yield window[i:i + self.embedding_batch_size]
+        
+        for section in sections:
+            window.append(section)
+            if len(window) >= window_size:
+                yield from split(window)
+                window = []
+        
+        if window:
+            yield from split(window)
+    
+    def embed_sections(
+        self,
+        sections: Iterable[DocumentSection],
+        document_id: str,
+        point_ids: Set[str],
+        existing_ids: Optional[Set[str]] = None,
+        staged: bool = False,
+        alias_ids: Optional[Set[str]] = None
+    ) -> Iterator[List[PointStruct]]:
+        """
+        Кодирование секций документа в точки Qdrant (НЕ ИЗМЕНЯТЬ СХЕМУ!)
+        Секции могут поступать потоком и кодируются батчами.
         
         Args:
-            sections: Список секций документа
+            sections: Список или поток секций документа
             document_id: ID документа для формирования уникальных ID точек
+            point_ids: Множество, в которое добавляются ID точек всех секций документа
+            existing_ids: ID точек документа, уже находящихся в Qdrant
+                          (такие секции не кодируются повторно)
+            staged: Пометить точки скрытыми от поиска (до вызова commit_document)
+            alias_ids: Множество, в которое добавляются ID секций, сохраненных
+                       как дубликаты секций других документов (не кодируются)
+            
+        Yields:
+            Батчи точек новых секций
         """
-        texts = [section.text for section in sections]
+        existing_ids = existing_ids or set()
+        alias_ids = alias_ids if alias_ids is not None else set()
         
-        # Генерация эмбеддингов
-        vectors = self.embedder.encode(texts).tolist()
+        def new_sections():
+            for section in sections:
+                point_id = make_point_id(document_id, section.text)
+                if point_id in point_ids:
+                    # Повтор секции внутри документа
+                    continue
+                point_ids.add(point_id)
+                if point_id not in existing_ids:
+                    yield section
         
-        # Создание точек для Qdrant
-        points = []
-        for i, section in enumerate(sections):
+        for batch in self._iter_section_batches(new_sections()):
+            # Почти совпадающие секции других документов не кодируются повторно
+            batch = self._skip_duplicates(batch, document_id, alias_ids)
+            if not batch:
+                continue
             
-            payload = {
-                "text": section.text,
-                "title": section.title,
-                "year": section.year,
-                "document_id": document_id
-            }
+            # Генерация эмбеддингов и точек Qdrant для окон секций батча.
+            # Отпечатки секций сохраняются только после загрузки точек в Qdrant
+            # (add_point_fingerprints или commit_document для скрытых точек)
+            batch_ids = [make_point_id(document_id, section.text) for section in batch]
+            yield self._make_points(batch, batch_ids, [document_id] * len(batch), staged)
+    
+    def _skip_duplicates(
+        self,
+        batch: List[DocumentSection],
+        document_id: str,
+        alias_ids: Set[str]
+    ) -> List[DocumentSection]:
+        """
+        Сохранение почти совпадающих секций как дубликатов
+        
+        Args:
+            batch: Батч секций документа
+            document_id: ID документа
+            alias_ids: Множество, в которое добавляются ID дубликатов
             
-            points.append(PointStruct(
-                id=uuid.uuid4().hex,
-                vector=vectors[i],
-                payload=payload
+        Returns:
+            Секции батча, которые нужно проиндексировать
+        """
+        if not self.deduplicator.enabled:
+            return batch
+        
+        point_ids = [make_point_id(document_id, section.text) for section in batch]
+        
+        if not self.is_live_collection:
+            # Пересборка индекса: дубликаты, сохраненные ранее, остаются дубликатами
+            known = self.deduplicator.filter_alias_ids(point_ids)
+            alias_ids.update(known)
+            return [section for section, point_id in zip(batch, point_ids) if point_id not in known]
+        
+        duplicates = self.deduplicator.find_duplicates(document_id, [section.text for section in batch])
+        if not duplicates:
+            return batch
+        
+        self.deduplicator.add_aliases([
+            SectionAlias(
+                point_id=point_ids[i],
+                document_id=document_id,
+                canonical_point_id=canonical_point_id,
+                text=batch[i].text,
+                title=batch[i].title,
+                year=batch[i].year
+            )
+            for i, canonical_point_id in duplicates.items()
+        ])
+        alias_ids.update(point_ids[i] for i in duplicates)
+        return [section for i, section in enumerate(batch) if i not in duplicates]
+    
+    def add_point_fingerprints(self, document_id: str, points: List[PointStruct]):
+        """
+        Сохранить отпечатки секций батча, загруженного в Qdrant без пометки staging
+        
+        Args:
+            document_id: ID документа
+            points: Загруженные точки (отпечатки строятся по первым окнам секций)
+        """
+        if not self.is_live_collection:
+            return
+        sections = [point for point in points if point.payload["window_index"] == 0]
+        self.deduplicator.add_fingerprints(
+            document_id,
+            [str(point.id) for point in sections],
+            [point.payload["text"] for point in sections]
+        )
+    
+    def _staged_fingerprints(self, document_id: str, removed_ids: List[str]) -> List[SectionFingerprint]:
+        """
+        Отпечатки скрытых секций документа, которые commit_document делает видимыми
+        
+        Args:
+            document_id: ID документа
+            removed_ids: ID секций, удаляемых при переключении
+        """
+        if not self.is_live_collection or not self.deduplicator.enabled:
+            return []
+        
+        sections_filter = self._document_filter(document_id)
+        sections_filter.must.append(FieldCondition(key=STAGING_PAYLOAD_KEY, match=MatchValue(value=True)))
+        sections_filter.must_not = [FieldCondition(key="window_index", range=Range(gt=0))]
+        removed_ids = set(removed_ids)
+        
+        fingerprints = []
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=sections_filter,
+                limit=256,
+                offset=offset,
+                with_payload=["text"],
+                with_vectors=False
+            )
+            points = [point for point in points if str(point.id) not in removed_ids]
+            fingerprints.extend(self.deduplicator.make_fingerprints(
+                document_id,
+                [str(point.id) for point in points],
+                [point.payload.get("text", "") for point in points]
             ))
+            if offset is None:
+                return fingerprints
+    
+    def _corpus_changed(self):
+        """Изменились точки, видимые поиску: кэшированные результаты поиска устаревают"""
+        # Точки другой коллекции (пересборка индекса) становятся видимы при переключении alias
+        if self.is_live_collection:
+            self.query_cache.bump_generation()
+    
+    def upsert_points(self, points: List[PointStruct]):
+        """
+        Загрузка батча точек в Qdrant
         
-        # Загрузка в Qdrant
+        Args:
+            points: Точки Qdrant
+        """
         self.qdrant_client.upsert(
             collection_name=self.collection_name,
             points=points
         )
+    
+    def delete_points(self, point_ids: List[str]):
+        """
+        Удаление точек из Qdrant по ID
+        
+        Args:
+            point_ids: ID точек
+        """
+        self.qdrant_client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=point_ids)
+        )
+        self._release_points(point_ids)
+    
+    def _release_points(self, point_ids: Iterable[str]):
+        """
+        Обновление индекса отпечатков после удаления точек из Qdrant.
+        Дубликаты, ссылавшиеся на удаленные точки, индексируются:
+        первая секция группы почти совпадающих дубликатов становится
+        новой точкой-оригиналом, остальные ссылаются на нее.
+        
+        Args:
+            point_ids: ID удаленных точек
+        """
+        if not self.is_live_collection:
+            return
+        
+        orphaned = self.deduplicator.release_points(point_ids)
+        if not orphaned:
+            return
+        
+        groups = self.deduplicator.group_aliases(orphaned)
+        heads = [head for head, _ in groups]
+        self.upsert_points(self._make_points(
+            heads,
+            [head.point_id for head in heads],
+            [head.document_id for head in heads]
+        ))
+        for head in heads:
+            self.deduplicator.add_fingerprints(head.document_id, [head.point_id], [head.text])
+        
+        self.deduplicator.remove_aliases(point_ids=[head.point_id for head in heads])
+        for head, members in groups:
+            SectionAlias.objects.filter(
+                point_id__in=[member.point_id for member in members]
+            ).update(canonical_point_id=head.point_id)
+        
+        print(f"Promoted {len(heads)} duplicate sections after removal of their originals")
+    
+    def index_document(
+        self,
+        sections: Iterable[DocumentSection],
+        document_id: str,
+        existing_ids: Optional[Set[str]] = None,
+        staged: bool = False,
+        progress: Optional[IndexingProgress] = None
+    ) -> Set[str]:
+        """
+        Индексация секций документа в Qdrant (НЕ ИЗМЕНЯТЬ СХЕМУ!)
+        Секции могут поступать потоком: каждый батч кодируется и сразу
+        загружается в Qdrant. При ошибке загруженные точки удаляются.
+        
+        Args:
+            sections: Список или поток секций документа
+            document_id: ID документа для формирования уникальных ID точек
+            existing_ids: ID точек документа, уже находящихся в Qdrant
+                          (такие секции не кодируются и не загружаются повторно)
+            staged: Загрузить точки скрытыми от поиска (до вызова commit_document)
+            progress: Ход индексации (этапы embed и upsert)
+            
+        Returns:
+            ID точек всех секций документа
+        """
+        progress = progress or IndexingProgress()
+        start_time = time.time()
+        cache_hits = self.embedding_cache.hits
+        point_ids = set()
+        alias_ids = set()
+        added_ids = []
+        added_sections = 0
+        
+        batches = self.embed_sections(sections, document_id, point_ids, existing_ids, staged, alias_ids)
+        try:
+            for points in progress.timed('embed', batches):
+                batch_sections = sum(1 for point in points if point.payload["window_index"] == 0)
+                progress.add('embed', sections=batch_sections, windows=len(points))
+                # Загрузка батча в Qdrant сразу после кодирования
+                with progress.timing('upsert'):
+                    # Отмена проверяется перед загрузкой каждого батча
+                    progress.raise_if_cancelled()
+                    self.upsert_points(points)
+                added_ids.extend(point.id for point in points)
+                if not staged:
+                    self.add_point_fingerprints(document_id, points)
+                progress.add('upsert', points=len(points))
+                added_sections += batch_sections
+        except Exception:
+            # Остановка сегментации потока секций (запросы к LLM)
+            batches.close()
+            if hasattr(sections, 'close'):
+                sections.close()
+            # Откат точек, их отпечатков и дубликатов, сохраненных в рамках этого вызова
+            # (отпечатки незагруженных батчей не сохранялись)
+            if added_ids:
+                print(f"Rolling back {len(added_ids)} points for document {document_id}...")
+                self.delete_points(added_ids)
+            if alias_ids and self.is_live_collection:
+                self.deduplicator.remove_aliases(point_ids=alias_ids)
+            raise
+        finally:
+            # Точки без пометки staging видны поиску сразу после загрузки
+            if added_ids and not staged:
+                self._corpus_changed()
+        
+        elapsed = time.time() - start_time
+        peak_rss = _get_peak_rss_mb()
+        new_count = added_sections + len(alias_ids)
+        print(
+            f"Indexed {added_sections} new sections ({len(added_ids)} windows) for document {document_id} "
+            f"({len(point_ids) - new_count} unchanged, {len(alias_ids)} near-duplicates "
+            f"of other documents: {len(alias_ids) / new_count if new_count else 0:.0%}) in {elapsed:.1f}s "
+            f"({added_sections / elapsed if elapsed else 0:.1f} sections/s, "
+            f"{self.embedding_cache.hits - cache_hits} embeddings from cache, "
+            f"peak RSS: {f'{peak_rss:.0f} MB' if peak_rss else 'n/a'})"
+        )
+        
+        return point_ids
+    
+    def get_document_point_ids(self, document_id: str) -> Set[str]:
+        """
+        Получить ID всех секций документа, проиндексированных в Qdrant
+        (окна секции учитываются по ID секции)
+        
+        Args:
+            document_id: ID документа
+            
+        Returns:
+            Множество ID точек секций
+        """
+        point_ids = set()
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._document_filter(document_id),
+                limit=1000,
+                offset=offset,
+                with_payload=["parent_id"],
+                with_vectors=False
+            )
+            # Точки, проиндексированные до разбиения секций на окна, не содержат parent_id
+            point_ids.update(point.payload.get("parent_id") or str(point.id) for point in points)
+            if offset is None:
+                return point_ids
+    
+    def get_document_section_ids(self, document_id: str) -> Set[str]:
+        """
+        Получить ID всех секций документа: точек в Qdrant и дубликатов
+        
+        Args:
+            document_id: ID документа
+            
+        Returns:
+            Множество ID секций
+        """
+        return self.get_document_point_ids(document_id) | self.deduplicator.get_alias_ids(document_id)
+    
+    def _document_filter(self, document_id: str) -> Filter:
+        """Фильтр точек документа"""
+        return Filter(must=[
+            FieldCondition(key="document_id", match=MatchValue(value=document_id))
+        ])
+    
+    def _windows_filter(self, parent_ids: List[str]) -> Filter:
+        """Фильтр окон секций, кроме первого (первое окно хранится под ID секции)"""
+        return Filter(must=[
+            FieldCondition(key="parent_id", match=MatchAny(any=parent_ids)),
+            FieldCondition(key="window_index", range=Range(gt=0))
+        ])
+    
+    def commit_document(
+        self,
+        document_id: str,
+        removed_ids: List[str],
+        meta_updates: Optional[Dict[Tuple[str, Any], List[str]]] = None
+    ):
+        """
+        Переключение поиска на новую версию документа: точки исчезнувших
+        секций удаляются, а с новых точек снимается пометка staging.
+        Операции отправляются в Qdrant одним пакетом, после чего
+        сохраняются отпечатки новых секций.
+        
+        Args:
+            document_id: ID документа
+            removed_ids: ID секций (точек и дубликатов) предыдущей версии, которых нет в новой
+            meta_updates: Новые (название, год) -> ID неизмененных секций с прежними
+                          названием или годом (см. _changed_section_meta)
+        """
+        fingerprints = self._staged_fingerprints(document_id, removed_ids)
+        meta_updates = meta_updates or {}
+        alias_ids = self.deduplicator.filter_alias_ids(
+            point_id for point_ids in meta_updates.values() for point_id in point_ids
+        )
         
-        print(f"Indexed {len(points)} sections for document {document_id}")
+        operations = []
+        for (title, year), point_ids in meta_updates.items():
+            point_ids = [point_id for point_id in point_ids if point_id not in alias_ids]
+            if point_ids:
+                # Payload всех окон секций
+                operations.append(SetPayloadOperation(set_payload=SetPayload(
+                    payload={"title": title, "year": year},
+                    filter=Filter(must=[FieldCondition(key="parent_id", match=MatchAny(any=point_ids))])
+                )))
+        if removed_ids:
+            operations.append(DeleteOperation(
+                delete=PointIdsList(points=removed_ids)
+            ))
+            operations.append(DeleteOperation(
+                delete=FilterSelector(filter=self._windows_filter(removed_ids))
+            ))
+        operations.append(DeletePayloadOperation(
+            delete_payload=DeletePayload(
+                keys=[STAGING_PAYLOAD_KEY],
+                filter=self._document_filter(document_id)
+            )
+        ))
+        self.qdrant_client.batch_update_points(
+            collection_name=self.collection_name,
+            update_operations=operations
+        )
+        
+        self.deduplicator.save_fingerprints(fingerprints)
+        for (title, year), point_ids in meta_updates.items():
+            self.deduplicator.update_aliases(
+                [point_id for point_id in point_ids if point_id in alias_ids],
+                title=title,
+                year=year
+            )
+        if removed_ids and self.is_live_collection:
+            self.deduplicator.remove_aliases(point_ids=removed_ids)
+            self._release_points(removed_ids)
+        self._corpus_changed()
+    
+    def sync_document(
+        self,
+        sections: Iterable[DocumentSection],
+        document_id: str,
+        progress: Optional[IndexingProgress] = None
+    ):
+        """
+        Инкрементальная индексация документа без простоя поиска.
+        Добавленные секции загружаются скрытыми от поиска, пока предыдущая
+        версия документа продолжает отвечать на запросы. После загрузки всех
+        секций поиск переключается на новую версию, а точки исчезнувших
+        секций удаляются. Неизмененные секции не кодируются и не загружаются повторно.
+        
+        Args:
+            sections: Список или поток секций документа
+            document_id: ID документа
+            progress: Ход индексации
+        """
+        progress = progress or IndexingProgress()
+        existing_ids = self.get_document_section_ids(document_id)
+        # Название и год неизмененных секций: ID секции зависит только от текста,
+        # а метаданные документа могли измениться
+        kept_meta = {}
+        
+        def track_kept(sections: Iterable[DocumentSection]) -> Iterator[DocumentSection]:
+            try:
+                for section in sections:
+                    point_id = make_point_id(document_id, section.text)
+                    if point_id in existing_ids:
+                        kept_meta[point_id] = (section.title, section.year)
+                    yield section
+            finally:
+                # Остановка сегментации, если индексация прервана
+                if hasattr(sections, 'close'):
+                    sections.close()
+        
+        point_ids = self.index_document(
+            track_kept(sections),
+            document_id,
+            existing_ids=existing_ids,
+            staged=True,
+            progress=progress
+        )
+        
+        # Точки секций, которых больше нет в документе (в том числе скрытые точки
+        # прерванной ранее индексации) удаляются при переключении
+        removed_ids = list(existing_ids - point_ids)
+        with progress.timing('commit'):
+            meta_updates = self._changed_section_meta(document_id, kept_meta)
+            self.commit_document(document_id, removed_ids, meta_updates)
+        
+        print(
+            f"Synced document {document_id}: {len(point_ids - existing_ids)} added, "
+            f"{len(point_ids & existing_ids)} kept ({sum(map(len, meta_updates.values()))} with new title or year), "
+            f"{len(removed_ids)} removed"
+        )
+    
+    def _changed_section_meta(
+        self,
+        document_id: str,
+        kept_meta: Dict[str, Tuple[str, Any]]
+    ) -> Dict[Tuple[str, Any], List[str]]:
+        """
+        Неизмененные секции документа, название или год которых в индексе отличаются от новых
+        
+        Args:
+            document_id: ID документа
+            kept_meta: ID неизмененной секции -> (название, год) в новой версии документа
+        
+        Returns:
+            (название, год) -> ID секций, которым нужно записать эти название и год
+        """
+        current = {
+            alias.point_id: (alias.title, alias.year)
+            for alias in self.deduplicator.get_aliases(document_id)
+            if alias.point_id in kept_meta
+        }
+        point_ids = [point_id for point_id in kept_meta if point_id not in current]
+        for i in range(0, len(point_ids), 256):
+            # Первое окно секции хранится под ID секции
+            for point in self.qdrant_client.retrieve(
+                collection_name=self.collection_name,
+                ids=point_ids[i:i + 256],
+                with_payload=["title", "year"],
+                with_vectors=False
+            ):
+                current[str(point.id)] = (point.payload.get("title", ""), point.payload.get("year"))
+        
+        updates = {}
+        for point_id, meta in kept_meta.items():
+            if point_id in current and current[point_id] != meta:
+                updates.setdefault(meta, []).append(point_id)
+        return updates
+    
+    def clone_document(self, source_id: str, target_id: str) -> int:
+        """
+        Индексация документа, идентичного уже проиндексированному, без LLM и embedder:
+        секции документа-источника становятся дубликатами его точек
+        (или копируются с векторами, если поиск дубликатов отключен)
+        
+        Args:
+            source_id: ID проиндексированного документа с тем же содержимым
+            target_id: ID нового документа
+            
+        Returns:
+            Количество секций документа
+        """
+        link = self.deduplicator.enabled and self.is_live_collection
+        existing_ids = self.get_document_section_ids(target_id)
+        point_ids = set()
+        aliases = []
+        
+        # Точки секций (первые окна): остальные окна копируются вместе с секцией
+        sections_filter = self._document_filter(source_id)
+        sections_filter.must_not = [FieldCondition(key="window_index", range=Range(gt=0))]
+        
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=sections_filter,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=not link
+            )
+            
+            new_points = []
+            # ID секции документа-источника -> ID секции нового документа
+            parents = {}
+            for point in points:
+                text = point.payload.get("text", "")
+                point_id = make_point_id(target_id, text)
+                point_ids.add(point_id)
+                if point_id in existing_ids:
+                    continue
+                
+                if link:
+                    aliases.append(SectionAlias(
+                        point_id=point_id,
+                        document_id=target_id,
+                        canonical_point_id=str(point.id),
+                        text=text,
+                        title=point.payload.get("title", ""),
+                        year=point.payload.get("year")
+                    ))
+                else:
+                    parents[str(point.id)] = point_id
+                    payload = dict(point.payload, document_id=target_id, parent_id=point_id)
+                    payload[STAGING_PAYLOAD_KEY] = True
+                    new_points.append(PointStruct(id=point_id, vector=point.vector, payload=payload))
+            
+            if parents:
+                new_points.extend(self._copy_windows(parents, target_id))
+            if new_points:
+                self.upsert_points(new_points)
+            if offset is None:
+                break
+        
+        # Дубликаты документа-источника ссылаются на те же оригиналы
+        for alias in self.deduplicator.get_aliases(source_id):
+            point_id = make_point_id(target_id, alias.text)
+            point_ids.add(point_id)
+            if point_id not in existing_ids:
+                aliases.append(SectionAlias(
+                    point_id=point_id,
+                    document_id=target_id,
+                    canonical_point_id=alias.canonical_point_id,
+                    text=alias.text,
+                    title=alias.title,
+                    year=alias.year
+                ))
+        
+        if aliases:
+            self.deduplicator.add_aliases(aliases)
+        self.commit_document(target_id, list(existing_ids - point_ids))
+        
+        print(f"Cloned document {source_id} to {target_id}: {len(point_ids)} sections")
+        return len(point_ids)
+    
+    def _copy_windows(self, parents: Dict[str, str], target_id: str) -> List[PointStruct]:
+        """
+        Копии окон секций (кроме первого) для другого документа
+        
+        Args:
+            parents: ID секции-источника -> ID секции нового документа
+            target_id: ID нового документа
+        
+        Returns:
+            Точки окон нового документа (скрытые от поиска)
+        """
+        result = []
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._windows_filter(list(parents)),
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            for point in points:
+                parent_id = parents[point.payload["parent_id"]]
+                payload = dict(point.payload, document_id=target_id, parent_id=parent_id)
+                payload[STAGING_PAYLOAD_KEY] = True
+                result.append(PointStruct(
+                    id=make_window_id(parent_id, point.payload["window_index"]),
+                    vector=point.vector,
+                    payload=payload
+                ))
+            if offset is None:
+                return result
     
     def remove_document(self, document_id: str):
         """
@@ -266,24 +1799,73 @@ class DocumentProcessor:
         Args:
             document_id: ID документа
         """
+        point_ids = self.get_document_point_ids(document_id)
+        
         # Удаление всех точек с данным document_id
         self.qdrant_client.delete(
             collection_name=self.collection_name,
-            points_selector={
-                "filter": {
-                    "must": [
-                        {
-                            "key": "document_id",
-                            "match": {"value": document_id}
-                        }
-                    ]
-                }
-            }
+            points_selector=FilterSelector(filter=self._document_filter(document_id))
         )
         
+        if self.is_live_collection:
+            self.deduplicator.remove_aliases(document_id=document_id)
+            self._release_points(point_ids)
+        self._corpus_changed()
+        
         print(f"Removed document {document_id} from Qdrant")
+    
+    def remove_orphaned_points(self, document_ids: Set[str]) -> int:
+        """
+        Удаление точек документов, которых больше нет в БД
+        
+        Args:
+            document_ids: ID существующих документов
+            
+        Returns:
+            Количество документов, точки которых были удалены
+        """
+        orphaned = set()
+        orphaned_point_ids = []
+        offset = None
+        while True:
+            points, offset = self.qdrant_client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=["document_id"],
+                with_vectors=False
+            )
+            for point in points:
+                document_id = point.payload.get("document_id")
+                if document_id is not None and document_id not in document_ids:
+                    orphaned.add(document_id)
+                    orphaned_point_ids.append(str(point.id))
+            if offset is None:
+                break
+        
+        if orphaned:
+            self.qdrant_client.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(filter=Filter(must=[
+                    FieldCondition(key="document_id", match=MatchAny(any=list(orphaned)))
+                ]))
+            )
+            print(f"Removed points of {len(orphaned)} deleted documents from Qdrant")
+        
+        if self.is_live_collection:
+            self.deduplicator.remove_aliases_except(document_ids)
+            self._release_points(orphaned_point_ids)
+        if orphaned:
+            self._corpus_changed()
+        
+        return len(orphaned)
 
 
-def get_document_processor() -> DocumentProcessor:
-    """Получить экземпляр процессора документов"""
-    return DocumentProcessor()
+def get_document_processor(collection_name: Optional[str] = None) -> DocumentProcessor:
+    """
+    Получить экземпляр процессора документов
+    
+    Args:
+        collection_name: Коллекция Qdrant (по умолчанию - рабочая коллекция)
+    """
+    return DocumentProcessor(collection_name)
@@ -0,0 +1,135 @@
+"""
+Management команда для замера кодирования одновременных вопросов: по одному против батчей диспетчера
+Использование: python manage.py benchmark_embeddings [--requests 512] [--concurrency 32] [--batch-size 32] [--max-wait-ms 5]
+"""
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from sentence_transformers import SentenceTransformer
+
+from integrations.ai_client import EMBEDDER_MODEL
+from integrations.embedding_dispatcher import EmbeddingDispatcher
+
+WORDS = [
+    'работодатель', 'обязан', 'обеспечить', 'безопасность', 'работников', 'при', 'выполнении',
+    'работ', 'на', 'высоте', 'требования', 'охраны', 'труда', 'средства', 'индивидуальной',
+    'защиты', 'инструктаж', 'проводится', 'перед', 'началом', 'в', 'соответствии', 'с',
+    'как', 'часто', 'кто', 'какие', 'когда', 'нужно', 'ли', 'допуск', 'наряд', 'обучение',
+]
+
+
+def make_questions(rng: random.Random, count: int):
+    """Вопросы по 6-16 слов (как вопросы консультаций)"""
+    return [
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 16))).capitalize() + '?'
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Замер пропускной способности кодирования одновременных вопросов (по одному и батчами диспетчера)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=512,
+            help='Количество вопросов (по умолчанию 512)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Количество одновременных запросов (по умолчанию 32)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=32,
+            help='Максимальный размер батча диспетчера (по умолчанию 32)'
+        )
+        parser.add_argument(
+            '--max-wait-ms',
+            type=float,
+            default=5.0,
+            help='Максимальное ожидание батча диспетчером, мс (по умолчанию 5)'
+        )
+        parser.add_argument(
+            '--model',
+            type=str,
+            default=EMBEDDER_MODEL,
+            help=f'Модель эмбеддингов (по умолчанию {EMBEDDER_MODEL})'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Начальное значение генератора случайных чисел'
+        )
+    
+    def run(self, encode, questions, concurrency):
+        """
+        Кодирование вопросов из concurrency потоков
+        
+        Returns:
+            (общее время, задержки запросов)
+        """
+        def timed(question):
+            started_at = time.perf_counter()
+            encode(question)
+            return time.perf_counter() - started_at
+        
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, questions))
+        return time.perf_counter() - started_at, latencies
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        questions = make_questions(rng, options['requests'])
+        concurrency = options['concurrency']
+        
+        self.stdout.write(f"Loading embedder model {options['model']}...")
+        embedder = SentenceTransformer(options['model'])
+        # Прогрев: первые вызовы модели выполняются дольше
+        embedder.encode(questions[:8])
+        
+        dispatcher = EmbeddingDispatcher(
+            lambda texts: embedder.encode(texts, batch_size=len(texts)).tolist(),
+            max_batch_size=options['batch_size'],
+            max_wait=options['max_wait_ms'] / 1000
+        )
+        modes = {
+            'single': lambda question: embedder.encode([question]).tolist()[0],
+            'batched': dispatcher.encode,
+        }
+        
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS(
+            f"КОДИРОВАНИЕ ВОПРОСОВ: {len(questions)} запросов, {concurrency} одновременно, "
+            f"батч до {options['batch_size']}, ожидание до {options['max_wait_ms']:g} мс"
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        
+        throughput = {}
+        for name, encode in modes.items():
+            elapsed, latencies = self.run(encode, questions, concurrency)
+            latencies.sort()
+            throughput[name] = len(questions) / elapsed
+            self.stdout.write(
+                f"{name:<8} {elapsed:7.2f}s, {throughput[name]:7.1f} вопросов/с, "
+                f"задержка p50 {statistics.median(latencies) * 1000:7.1f} мс, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} мс"
+            )
+        
+        stats = dispatcher.stats()
+        self.stdout.write(
+            f"Диспетчер: {stats['batches']} батчей, средний размер {stats['average_batch']}, "
+            f"наибольший {stats['largest_batch']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Ускорение: x{throughput['batched'] / throughput['single']:.2f}"
+        ))
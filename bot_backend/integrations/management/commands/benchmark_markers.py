@@ -0,0 +1,167 @@
+"""
+Management команда для замера поиска маркеров секций в chunk
+Использование: python manage.py benchmark_markers [--chunks 20] [--markers 30]
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from integrations.markers import ChunkTextIndex
+
+WORDS = [
+    'работодатель', 'обязан', 'обеспечить', 'безопасность', 'работников', 'при', 'выполнении',
+    'работ', 'на', 'высоте', 'требования', 'охраны', 'труда', 'средства', 'индивидуальной',
+    'защиты', 'инструктаж', 'проводится', 'перед', 'началом', 'в', 'соответствии', 'с',
+    'правилами', 'допуск', 'к', 'работе', 'оформляется', 'нарядом', 'ответственный',
+    'руководитель', 'производитель', 'ограждение', 'места', 'производства', 'лестницы',
+    'подмости', 'леса', 'страховочная', 'система', 'анкерное', 'устройство', 'ёмкость',
+]
+
+
+def make_chunk(rng: random.Random, words_count: int) -> str:
+    """Текст chunk: слова, знаки препинания, кавычки и тире"""
+    words = []
+    for i in range(words_count):
+        word = rng.choice(WORDS)
+        roll = rng.random()
+        if roll < 0.03:
+            word = f'«{word.capitalize()}»'
+        elif roll < 0.05:
+            word = '—'
+        elif roll < 0.12:
+            word += rng.choice(['.', ',', ';', ':'])
+        words.append(word)
+    return ' '.join(words)
+
+
+def distort(rng: random.Random, marker: str, kind: str) -> str:
+    """Искажение маркера, типичное для ответов LLM"""
+    if kind == 'spaces':
+        return marker.replace(' ', rng.choice(['  ', '\n', ' \t']), 2).replace(' ,', ',')
+    if kind == 'quotes':
+        return marker.replace('«', '"').replace('»', '"').replace('—', '-').replace('ё', 'е')
+    if kind == 'ellipsis':
+        return marker[:max(10, len(marker) * 2 // 3)] + rng.choice(['...', '…'])
+    if kind == 'tail':
+        return marker[:-3] + 'xyz'
+    if kind == 'case':
+        return marker.upper()
+    return marker
+
+
+class Command(BaseCommand):
+    help = 'Замер точности и скорости поиска маркеров секций в chunks'
+    
+    KINDS = ['exact', 'spaces', 'quotes', 'ellipsis', 'tail', 'case']
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunks',
+            type=int,
+            default=20,
+            help='Количество chunks (по умолчанию 20)'
+        )
+        parser.add_argument(
+            '--words',
+            type=int,
+            default=4800,
+            help='Размер chunk в словах (по умолчанию 4800, как CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--markers',
+            type=int,
+            default=30,
+            help='Маркеров на chunk (по умолчанию 30)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Начальное значение генератора случайных чисел'
+        )
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        stats = {
+            method: {kind: [0, 0] for kind in self.KINDS}
+            for method in ('find', 'index')
+        }
+        times = {'find': 0.0, 'build': 0.0, 'index': 0.0}
+        total = 0
+        
+        for _ in range(options['chunks']):
+            chunk = make_chunk(rng, options['words'])
+            starts = sorted(rng.sample(range(len(chunk) - 200), options['markers']))
+            # Маркер - начало секции с начала слова, 6-10 слов
+            cases = []
+            for start in starts:
+                start = chunk.rfind(' ', 0, start) + 1
+                marker = ' '.join(chunk[start:].split()[:rng.randint(6, 10)])
+                kind = rng.choice(self.KINDS)
+                cases.append((start, kind, distort(rng, marker, kind)))
+            total += len(cases)
+            
+            # Прежний способ: точный поиск подстроки от начала chunk
+            started_at = time.perf_counter()
+            results = []
+            for _, _, marker in cases:
+                if marker.endswith('...'):
+                    marker = marker[:-3].strip()
+                elif marker.endswith('…'):
+                    marker = marker[:-1].strip()
+                results.append(chunk.find(marker))
+            times['find'] += time.perf_counter() - started_at
+            self._count(stats['find'], cases, results)
+            
+            started_at = time.perf_counter()
+            text_index = ChunkTextIndex(chunk)
+            times['build'] += time.perf_counter() - started_at
+            
+            started_at = time.perf_counter()
+            results = []
+            last_pos = 0
+            for _, _, marker in cases:
+                pos = text_index.find(marker, last_pos)
+                if pos != -1:
+                    last_pos = pos + 1
+                results.append(pos)
+            times['index'] += time.perf_counter() - started_at
+            self._count(stats['index'], cases, results)
+        
+        chunks = options['chunks']
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS(
+            f"ПОИСК МАРКЕРОВ: {chunks} chunks по {options['words']} слов, {total} маркеров"
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(f"{'искажение':<12}{'find: верно/найдено':>24}{'index: верно/найдено':>24}")
+        for kind in self.KINDS:
+            line = f"{kind:<12}"
+            for method in ('find', 'index'):
+                correct, found = stats[method][kind]
+                line += f"{f'{correct}/{found}':>24}"
+            self.stdout.write(line)
+        
+        for method in ('find', 'index'):
+            correct = sum(value[0] for value in stats[method].values())
+            self.stdout.write(f"{method}: найдено верно {correct}/{total} ({correct / total:.0%})")
+        
+        self.stdout.write(
+            f"Время на chunk: find {times['find'] / chunks * 1000:.2f} ms, "
+            f"index {times['index'] / chunks * 1000:.2f} ms "
+            f"(+ построение {times['build'] / chunks * 1000:.2f} ms)"
+        )
+        self.stdout.write(
+            f"Время на маркер: find {times['find'] / total * 1e6:.1f} us, "
+            f"index {times['index'] / total * 1e6:.1f} us"
+        )
+    
+    def _count(self, stats, cases, results):
+        """Учет найденных маркеров и маркеров, найденных в верной позиции"""
+        for (start, kind, _), pos in zip(cases, results):
+            if pos != -1:
+                stats[kind][1] += 1
+            # Позиция может указывать на открывающую кавычку или символ после нее
+            if pos != -1 and abs(pos - start) <= 1:
+                stats[kind][0] += 1
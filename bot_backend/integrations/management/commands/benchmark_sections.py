@@ -0,0 +1,185 @@
+"""
+Management команда для замера сборки секций документа: строки против диапазонов буфера
+Использование: python manage.py benchmark_sections [--chars 5000000] [--unstructured 0.3]
+"""
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from integrations.load_documents import (
+    DocumentBuffer, DocumentSection, RuleBasedSegmenter, assemble_sections, iter_word_chunks
+)
+
+WORDS = [
+    'работодатель', 'обязан', 'обеспечить', 'безопасность', 'работников', 'при', 'выполнении',
+    'работ', 'на', 'высоте', 'требования', 'охраны', 'труда', 'средства', 'индивидуальной',
+    'защиты', 'инструктаж', 'проводится', 'перед', 'началом', 'в', 'соответствии', 'с',
+]
+
+
+def make_pages(rng: random.Random, chars: int, section_words: int, unstructured: float, page_words: int = 240):
+    """
+    Страницы документа: пункты по section_words слов, в середине - участок без заголовков
+    (доля unstructured текста), который сегментатор не разделяет
+    """
+    words = []
+    length = 0
+    clause = 0
+    clause_words = section_words
+    run_start = chars * (1 - unstructured) / 2
+    run_end = run_start + chars * unstructured
+    while length < chars:
+        if not run_start <= length < run_end and clause_words >= section_words:
+            clause += 1
+            clause_words = 0
+            # Заголовок пункта распознается после конца предложения
+            if words and not words[-1].endswith('.'):
+                words[-1] += '.'
+            number = f'{clause // 100 + 1}.{clause % 100 + 1}.'
+            words.extend([number, 'Работодатель'])
+            length += len(number) + 14
+        clause_words += 1
+        word = rng.choice(WORDS)
+        words.append(word + '.' if rng.random() < 0.1 else word)
+        length += len(word) + 1
+    return [' '.join(words[i:i + page_words]) for i in range(0, len(words), page_words)]
+
+
+class CountingBuffer(DocumentBuffer):
+    """Буфер документа с подсчетом собранных строк"""
+    
+    def __init__(self, stats):
+        super().__init__()
+        self.stats = stats
+    
+    def slice(self, start, end):
+        text = super().slice(start, end)
+        self.stats['strings'] += 1
+        self.stats['chars'] += len(text)
+        return text
+    
+    def text(self, spans):
+        text = super().text(spans)
+        if len(spans) > 1:
+            self.stats['strings'] += 1
+            self.stats['chars'] += len(text)
+        return text
+
+
+def legacy_sections(results, stats):
+    """Прежняя сборка секций: срезы строк и наращивание секции конкатенацией"""
+    current_section = None
+    for result in results:
+        chunk = result.chunk
+        borders = [chunk[start:end] for start, end in result.borders]
+        if result.continuation is not None:
+            continuation = chunk[result.continuation[0]:result.continuation[1]]
+        else:
+            continuation = '' if borders else chunk
+        stats['strings'] += len(borders) + 1
+        stats['chars'] += sum(len(border) for border in borders) + len(continuation)
+        
+        if continuation:
+            if current_section is not None:
+                current_section += ' ' + continuation
+                stats['strings'] += 2
+                stats['chars'] += len(current_section) + len(continuation) + 1
+            else:
+                current_section = continuation
+        for border in borders:
+            if current_section is not None:
+                yield DocumentSection(text=current_section, title='')
+            current_section = border
+    if current_section is not None:
+        yield DocumentSection(text=current_section, title='')
+
+
+class Command(BaseCommand):
+    help = 'Замер времени и памяти сборки секций документа (строки против диапазонов буфера)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chars',
+            type=int,
+            default=5_000_000,
+            help='Размер документа в символах (по умолчанию 5 000 000)'
+        )
+        parser.add_argument(
+            '--section-words',
+            type=int,
+            default=150,
+            help='Слов в пункте структурированной части (по умолчанию 150)'
+        )
+        parser.add_argument(
+            '--unstructured',
+            type=float,
+            default=0.3,
+            help='Доля документа без заголовков (по умолчанию 0.3)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=4800,
+            help='Размер chunk в словах (по умолчанию 4800, как CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Начальное значение генератора случайных чисел'
+        )
+    
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        pages = make_pages(rng, options['chars'], options['section_words'], options['unstructured'])
+        
+        # Сегментация общая для обоих способов и в замер не входит
+        started_at = time.perf_counter()
+        segmenter = RuleBasedSegmenter(None)
+        results = []
+        previous_word = ''
+        for chunk in iter_word_chunks(pages, options['chunk_size']):
+            results.append(segmenter.segment(chunk, previous_word))
+            previous_word = chunk[chunk.rfind(' ') + 1:]
+        segment_time = time.perf_counter() - started_at
+        pages = None
+        
+        modes = {
+            'strings': lambda stats: legacy_sections(results, stats),
+            'spans': lambda stats: assemble_sections(
+                results, lambda result: None, buffer=CountingBuffer(stats)
+            ),
+        }
+        
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS(
+            f"СБОРКА СЕКЦИЙ: {options['chars']:,} символов, {len(results)} chunks, "
+            f"без заголовков {options['unstructured']:.0%}"
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(f"Сегментация по заголовкам: {segment_time:.2f}s (не входит в замер)")
+        
+        for name, run in modes.items():
+            # Секции потребляются потоком, как при кодировании: текст секции сразу освобождается
+            stats = {'strings': 0, 'chars': 0}
+            started_at = time.perf_counter()
+            sections = 0
+            longest = 0
+            for section in run(stats):
+                sections += 1
+                longest = max(longest, len(section.text))
+            elapsed = time.perf_counter() - started_at
+            
+            tracemalloc.start()
+            for section in run({'strings': 0, 'chars': 0}):
+                section.text
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            
+            self.stdout.write(
+                f"{name:<8} {elapsed * 1000:8.1f} ms, секций {sections}, самая длинная {longest:,} симв., "
+                f"создано строк {stats['strings']:,} ({stats['chars'] / 1e6:.1f} M симв.), "
+                f"пик памяти {peak / (1024 * 1024):.1f} МБ"
+            )
@@ -0,0 +1,57 @@
+"""
+Management команда для просмотра и обслуживания кэшей AI модуля
+Использование: python manage.py cache_stats [--evict] [--clear]
+"""
+from django.core.management.base import BaseCommand
+from integrations.cache import get_llm_cache, get_embedding_cache
+from integrations.query_cache import get_query_cache
+
+
+class Command(BaseCommand):
+    help = 'Статистика и обслуживание кэшей AI модуля'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Удалить устаревшие записи и записи сверх лимита'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Полностью очистить кэши'
+        )
+    
+    def handle(self, *args, **options):
+        llm_cache = get_llm_cache()
+        embedding_cache = get_embedding_cache()
+        
+        for name, cache in (('ответов LLM', llm_cache), ('эмбеддингов', embedding_cache)):
+            if options['clear']:
+                removed = cache.clear()
+                self.stdout.write(self.style.WARNING(f'Кэш {name} очищен: удалено {removed} записей'))
+            elif options['evict']:
+                removed = cache.evict()
+                self.stdout.write(self.style.SUCCESS(f'Кэш {name}: удалено {removed} записей'))
+        
+        stats = llm_cache.stats()
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS('КЭШ ОТВЕТОВ LLM:'))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(f"Записей: {stats['entries']} (лимит: {llm_cache.max_entries})")
+        self.stdout.write(f"Срок хранения: {llm_cache.max_age_days} дн.")
+        self.stdout.write(f"Попаданий за все время: {stats['total_hits']}")
+        
+        stats = embedding_cache.stats()
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS('КЭШ ЭМБЕДДИНГОВ:'))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(f"Записей: {stats['entries']} (лимит: {embedding_cache.max_entries})")
+        self.stdout.write(f"Объем векторов: {stats['size_bytes'] / (1024 * 1024):.1f} МБ (float16)")
+        
+        # Кэши запросов находятся в памяти веб-процесса: их статистика - /api/consultation/cache/stats/
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(self.style.SUCCESS('КЭШ ЗАПРОСОВ КОНСУЛЬТАЦИЙ:'))
+        self.stdout.write(self.style.SUCCESS('=' * 80))
+        self.stdout.write(f"Поколение корпуса: {get_query_cache().get_generation()}")
+        self.stdout.write("Попадания и сэкономленное время: GET /api/consultation/cache/stats/")
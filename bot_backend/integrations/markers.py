@@ -0,0 +1,158 @@
+"""
+Поиск маркеров секций из ответа LLM в тексте chunk.
+LLM цитирует начало секции неточно: другие пробелы, кавычки и тире,
+обрезка многоточием, ошибка в конце цитаты. Маркер ищется в нормализованном
+тексте chunk, найденная позиция переводится в исходный текст по карте смещений.
+"""
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+# Символы, которые при сравнении приводятся к одному виду
+# (str.replace быстрее str.translate со словарем на длинных строках)
+_REPLACEMENTS = [
+    ('ё', 'е'),
+    ('‐', '-'), ('‑', '-'), ('‒', '-'), ('–', '-'), ('—', '-'), ('―', '-'), ('−', '-'),
+    ('«', '"'), ('»', '"'), ('“', '"'), ('”', '"'), ('„', '"'), ('‟', '"'),
+    ('‘', "'"), ('’', "'"), ('‚', "'"), ('`', "'"),
+]
+
+# При сравнении не учитываются пробелы, кавычки и мягкие переносы
+_KEPT_RE = re.compile(r'[^\s"\'\u00ad]+')
+
+# Многоточие: цитата обрезана, сравнивается только текст до него
+_ELLIPSIS_RE = re.compile(r'\.\.\.|…')
+
+
+def _lower(text: str) -> str:
+    """Нижний регистр без изменения длины строки (позиции символов сохраняются)"""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = ''.join(char.lower()[:1] for char in text)
+    for old, new in _REPLACEMENTS:
+        if old in lowered:
+            lowered = lowered.replace(old, new)
+    return lowered
+
+
+def normalize_marker(marker: str) -> str:
+    """
+    Нормализованный текст маркера
+    
+    Args:
+        marker: Цитата из ответа LLM
+    
+    Returns:
+        Текст до многоточия в нижнем регистре без пробелов и кавычек
+    """
+    marker = _ELLIPSIS_RE.split(marker, 1)[0]
+    return ''.join(_KEPT_RE.findall(_lower(marker)))
+
+
+class ChunkTextIndex:
+    """
+    Нормализованный текст chunk с картой смещений в исходный текст и индексом q-грамм.
+    Индекс строится один раз на chunk: для каждой подстроки длины GRAM_SIZE
+    нормализованного текста хранятся ее позиции по возрастанию. Маркер ищется
+    среди позиций его первой q-граммы не раньше предыдущего маркера (двоичный поиск),
+    совпадение проверяется сравнением с текстом в этой позиции - текст целиком не просматривается.
+    Карта смещений хранит начало каждого непрерывного фрагмента (слова),
+    позиция переводится двоичным поиском.
+    """
+    
+    # Длина q-граммы индекса (в нормализованных символах)
+    GRAM_SIZE = 8
+    # Минимальная длина совпавшего начала маркера (в нормализованных символах),
+    # если маркер целиком не найден
+    MIN_PREFIX_MATCH = 20
+    
+    def __init__(self, chunk: str):
+        matches = list(_KEPT_RE.finditer(_lower(chunk)))
+        parts = [match.group() for match in matches]
+        
+        self.chunk = chunk
+        self.text = ''.join(parts)
+        # Начала фрагментов в нормализованном и исходном тексте
+        self.text_starts = array('i', accumulate((len(part) for part in parts), initial=0))
+        self.text_starts.pop()
+        self.chunk_starts = array('i', [match.start() for match in matches])
+        
+        # Позиции q-грамм нормализованного текста (по возрастанию)
+        self.grams = {}
+        text, size = self.text, self.GRAM_SIZE
+        for pos in range(len(text) - size + 1):
+            positions = self.grams.get(text[pos:pos + size])
+            if positions is None:
+                self.grams[text[pos:pos + size]] = [pos]
+            else:
+                positions.append(pos)
+    
+    def to_chunk_pos(self, pos: int) -> int:
+        """Позиция в нормализованном тексте -> позиция в исходном тексте"""
+        i = bisect_right(self.text_starts, pos) - 1
+        return self.chunk_starts[i] + pos - self.text_starts[i]
+    
+    def to_text_pos(self, pos: int) -> int:
+        """Позиция в исходном тексте -> позиция в нормализованном тексте"""
+        i = bisect_right(self.chunk_starts, pos) - 1
+        if i < 0:
+            return 0
+        end = self.text_starts[i + 1] if i + 1 < len(self.text_starts) else len(self.text)
+        return min(self.text_starts[i] + pos - self.chunk_starts[i], end)
+    
+    def _common_prefix(self, needle: str, pos: int) -> int:
+        """Длина общего начала needle и нормализованного текста с позиции pos"""
+        low, high = 0, min(len(needle), len(self.text) - pos)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.text.startswith(needle[:middle], pos):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+    
+    def _search(self, needle: str, start: int) -> int:
+        """
+        Поиск в нормализованном тексте не раньше start
+        
+        Returns:
+            Позиция маркера целиком или самого длинного его начала
+            (не короче MIN_PREFIX_MATCH символов), -1 - не найден
+        """
+        if len(needle) < self.GRAM_SIZE:
+            # Маркер короче q-граммы (обычно заголовок из одного слова)
+            return self.text.find(needle, start)
+        
+        positions = self.grams.get(needle[:self.GRAM_SIZE], ())
+        best_pos, best_length = -1, self.MIN_PREFIX_MATCH - 1
+        for i in range(bisect_left(positions, start), len(positions)):
+            pos = positions[i]
+            if self.text.startswith(needle, pos):
+                return pos
+            length = self._common_prefix(needle, pos)
+            if length > best_length:
+                best_pos, best_length = pos, length
+        return best_pos
+    
+    def find(self, marker: str, start: int = 0) -> int:
+        """
+        Позиция маркера в исходном тексте chunk.
+        Маркеры следуют в порядке текста, поэтому совпадение ищется только начиная
+        с позиции start: маркер, которого нет после предыдущего, не найден (позиции
+        найденных маркеров не убывают). Если маркер целиком не найден, используется
+        самое длинное найденное начало маркера (не короче MIN_PREFIX_MATCH символов).
+        
+        Args:
+            marker: Цитата из ответа LLM
+            start: Позиция в исходном тексте, с которой ищется маркер
+        
+        Returns:
+            Позиция в исходном тексте или -1
+        """
+        needle = normalize_marker(marker)
+        if not needle:
+            return -1
+        
+        pos = self._search(needle, self.to_text_pos(start))
+        return self.to_chunk_pos(pos) if pos != -1 else -1
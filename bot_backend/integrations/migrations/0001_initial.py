@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponseCache',
+            fields=[
+                ('key', models.CharField(help_text='sha256 от промпта, модели и текста запроса', max_length=64, primary_key=True, serialize=False, verbose_name='Ключ')),
+                ('model_name', models.CharField(max_length=100, verbose_name='Модель')),
+                ('response', models.TextField(verbose_name='Ответ LLM')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Последнее использование')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Количество попаданий')),
+            ],
+            options={
+                'verbose_name': 'Кэш ответа LLM',
+                'verbose_name_plural': 'Кэш ответов LLM',
+            },
+        ),
+    ]
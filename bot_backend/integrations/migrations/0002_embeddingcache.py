@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=100, verbose_name='Модель эмбеддингов')),
+                ('text_hash', models.CharField(max_length=64, verbose_name='Хэш текста (sha256)')),
+                ('vector', models.BinaryField(help_text='float16, little-endian', verbose_name='Вектор')),
+                ('dimension', models.PositiveIntegerField(verbose_name='Размерность')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Последнее использование')),
+            ],
+            options={
+                'verbose_name': 'Кэш эмбеддинга',
+                'verbose_name_plural': 'Кэш эмбеддингов',
+                'unique_together': {('model_name', 'text_hash')},
+            },
+        ),
+    ]
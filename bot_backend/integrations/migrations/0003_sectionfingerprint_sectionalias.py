@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0002_embeddingcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionAlias',
+            fields=[
+                ('point_id', models.CharField(help_text='ID, который получила бы точка секции в Qdrant', max_length=36, primary_key=True, serialize=False, verbose_name='ID секции')),
+                ('document_id', models.CharField(db_index=True, max_length=36, verbose_name='ID документа')),
+                ('canonical_point_id', models.CharField(db_index=True, max_length=36, verbose_name='ID точки-оригинала в Qdrant')),
+                ('text', models.TextField(verbose_name='Текст секции')),
+                ('title', models.TextField(verbose_name='Название документа')),
+                ('year', models.JSONField(blank=True, null=True, verbose_name='Год')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Дубликат секции',
+                'verbose_name_plural': 'Дубликаты секций',
+            },
+        ),
+        migrations.CreateModel(
+            name='SectionFingerprint',
+            fields=[
+                ('point_id', models.CharField(max_length=36, primary_key=True, serialize=False, verbose_name='ID точки в Qdrant')),
+                ('document_id', models.CharField(db_index=True, max_length=36, verbose_name='ID документа')),
+                ('simhash', models.BigIntegerField(verbose_name='SimHash (64 бита)')),
+                ('band0', models.IntegerField(db_index=True)),
+                ('band1', models.IntegerField(db_index=True)),
+                ('band2', models.IntegerField(db_index=True)),
+                ('band3', models.IntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Отпечаток секции',
+                'verbose_name_plural': 'Отпечатки секций',
+            },
+        ),
+    ]
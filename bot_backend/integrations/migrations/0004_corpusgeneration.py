@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0003_sectionfingerprint_sectionalias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorpusGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField(default=0, verbose_name='Поколение')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Поколение корпуса',
+                'verbose_name_plural': 'Поколение корпуса',
+            },
+        ),
+    ]
@@ -0,0 +1,161 @@
+from django.db import models
+
+
+class LLMResponseCache(models.Model):
+    """Кэш ответов LLM при анализе секций документов"""
+    
+    key = models.CharField(
+        max_length=64,
+        primary_key=True,
+        verbose_name="Ключ",
+        help_text="sha256 от промпта, модели и текста запроса"
+    )
+    model_name = models.CharField(
+        max_length=100,
+        verbose_name="Модель"
+    )
+    response = models.TextField(verbose_name="Ответ LLM")
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Дата создания"
+    )
+    last_used_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Последнее использование"
+    )
+    hits = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество попаданий"
+    )
+    
+    class Meta:
+        verbose_name = "Кэш ответа LLM"
+        verbose_name_plural = "Кэш ответов LLM"
+    
+    def __str__(self):
+        return f"{self.model_name}: {self.key[:12]}"
+
+
+class EmbeddingCache(models.Model):
+    """Кэш эмбеддингов секций документов"""
+    
+    model_name = models.CharField(
+        max_length=100,
+        verbose_name="Модель эмбеддингов"
+    )
+    text_hash = models.CharField(
+        max_length=64,
+        verbose_name="Хэш текста (sha256)"
+    )
+    vector = models.BinaryField(
+        verbose_name="Вектор",
+        help_text="float16, little-endian"
+    )
+    dimension = models.PositiveIntegerField(verbose_name="Размерность")
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания"
+    )
+    last_used_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name="Последнее использование"
+    )
+    
+    class Meta:
+        verbose_name = "Кэш эмбеддинга"
+        verbose_name_plural = "Кэш эмбеддингов"
+        unique_together = [['model_name', 'text_hash']]
+    
+    def __str__(self):
+        return f"{self.model_name}: {self.text_hash[:12]}"
+
+
+class SectionFingerprint(models.Model):
+    """SimHash отпечаток секции, проиндексированной в Qdrant"""
+    
+    point_id = models.CharField(
+        max_length=36,
+        primary_key=True,
+        verbose_name="ID точки в Qdrant"
+    )
+    document_id = models.CharField(
+        max_length=36,
+        db_index=True,
+        verbose_name="ID документа"
+    )
+    simhash = models.BigIntegerField(verbose_name="SimHash (64 бита)")
+    # Полосы по 16 бит для поиска кандидатов: при расстоянии Хэмминга
+    # не больше 3 хотя бы одна из 4 полос совпадает
+    band0 = models.IntegerField(db_index=True)
+    band1 = models.IntegerField(db_index=True)
+    band2 = models.IntegerField(db_index=True)
+    band3 = models.IntegerField(db_index=True)
+    
+    class Meta:
+        verbose_name = "Отпечаток секции"
+        verbose_name_plural = "Отпечатки секций"
+    
+    def __str__(self):
+        return f"{self.document_id}: {self.point_id}"
+
+
+class SectionAlias(models.Model):
+    """Секция документа, почти совпадающая с уже проиндексированной секцией другого документа"""
+    
+    point_id = models.CharField(
+        max_length=36,
+        primary_key=True,
+        verbose_name="ID секции",
+        help_text="ID, который получила бы точка секции в Qdrant"
+    )
+    document_id = models.CharField(
+        max_length=36,
+        db_index=True,
+        verbose_name="ID документа"
+    )
+    canonical_point_id = models.CharField(
+        max_length=36,
+        db_index=True,
+        verbose_name="ID точки-оригинала в Qdrant"
+    )
+    text = models.TextField(verbose_name="Текст секции")
+    title = models.TextField(verbose_name="Название документа")
+    # Год из блока META может быть не числом - хранится как в payload
+    year = models.JSONField(null=True, blank=True, verbose_name="Год")
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата создания"
+    )
+    
+    class Meta:
+        verbose_name = "Дубликат секции"
+        verbose_name_plural = "Дубликаты секций"
+    
+    def __str__(self):
+        return f"{self.point_id} -> {self.canonical_point_id}"
+
+
+class CorpusGeneration(models.Model):
+    """
+    Поколение корпуса: счетчик изменений видимых для поиска точек Qdrant.
+    Кэш результатов поиска сравнивает поколение записи с текущим.
+    """
+    
+    generation = models.BigIntegerField(
+        default=0,
+        verbose_name="Поколение"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
+    
+    class Meta:
+        verbose_name = "Поколение корпуса"
+        verbose_name_plural = "Поколение корпуса"
+    
+    def __str__(self):
+        return f"Поколение {self.generation}"
@@ -0,0 +1,273 @@
+"""
+Кэши запросов консультаций в памяти процесса.
+Эмбеддинги вопросов кэшируются по нормализованному тексту вопроса,
+результаты поиска в Qdrant - по эмбеддингу, количеству секций и фильтру.
+Результаты поиска действительны, пока не изменилось поколение корпуса
+(CorpusGeneration): индексация и удаление документов увеличивают его.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+
+from .models import CorpusGeneration
+
+# Пробельные символы вопроса при нормализации сворачиваются в один пробел
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_question(question: str) -> str:
+    """Нормализованный текст вопроса: нижний регистр, ё -> е, без лишних пробелов"""
+    return _SPACES_RE.sub(' ', question.lower().replace('ё', 'е')).strip()
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU кэш со сроком жизни записей.
+    Для каждой записи хранится время ее вычисления: при попадании оно
+    учитывается как сэкономленное.
+    """
+    
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Счетчики текущего процесса
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+    
+    def get(self, key: Any) -> Optional[Any]:
+        """
+        Получить значение из кэша
+        
+        Args:
+            key: Ключ кэша
+        
+        Returns:
+            Сохраненное значение или None (нет записи или срок жизни истек)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return entry[0]
+    
+    def set(self, key: Any, value: Any, cost: float = 0.0):
+        """
+        Сохранить значение в кэш
+        
+        Args:
+            key: Ключ кэша
+            value: Значение
+            cost: Время вычисления значения (сек)
+        """
+        if not self.max_entries:
+            return
+        
+        with self._lock:
+            self._entries[key] = (value, time.monotonic(), cost)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> int:
+        """Очистить кэш полностью"""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэша"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 4) if requests else 0.0,
+                'saved_seconds': round(self.saved_seconds, 3),
+            }
+
+
+class QueryCache:
+    """
+    Двухуровневый кэш запросов консультаций:
+    эмбеддинги вопросов и результаты поиска секций в Qdrant.
+    """
+    
+    def __init__(
+        self,
+        enabled: bool = True,
+        embeddings_max_entries: int = 2000,
+        embeddings_ttl: float = 86400,
+        results_max_entries: int = 2000,
+        results_ttl: float = 3600,
+        generation_check_interval: float = 1.0
+    ):
+        self.enabled = enabled
+        self.embeddings = LRUCache(embeddings_max_entries, embeddings_ttl)
+        self.results = LRUCache(results_max_entries, results_ttl)
+        # Поколение корпуса читается из БД не чаще интервала: изменения,
+        # сделанные другими процессами (воркер обработки), видны с этой задержкой
+        self.generation_check_interval = generation_check_interval
+        self._generation = None
+        self._generation_checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    def get_generation(self) -> Optional[int]:
+        """
+        Текущее поколение корпуса
+        
+        Returns:
+            int или None, если поколение не удалось прочитать
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._generation is not None and now - self._generation_checked_at < self.generation_check_interval:
+                return self._generation
+        
+        try:
+            generation = CorpusGeneration.objects.filter(pk=1).values_list('generation', flat=True).first()
+        except DatabaseError as e:
+            # Без поколения результаты поиска не кэшируются
+            print(f"Corpus generation read error: {e}")
+            return None
+        
+        with self._lock:
+            self._generation = generation or 0
+            self._generation_checked_at = now
+            return self._generation
+    
+    def bump_generation(self):
+        """Увеличить поколение корпуса: сохраненные результаты поиска становятся недействительными"""
+        try:
+            CorpusGeneration.objects.bulk_create([CorpusGeneration(pk=1)], ignore_conflicts=True)
+            CorpusGeneration.objects.filter(pk=1).update(generation=F('generation') + 1)
+        except DatabaseError as e:
+            print(f"Corpus generation update error: {e}")
+        
+        # Следующее чтение в этом процессе обращается к БД
+        with self._lock:
+            self._generation = None
+    
+    def get_embedding(self, question: str) -> Optional[List[float]]:
+        """Эмбеддинг вопроса из кэша"""
+        if not self.enabled:
+            return None
+        return self.embeddings.get(normalize_question(question))
+    
+    def set_embedding(self, question: str, vector: List[float], cost: float):
+        """
+        Сохранить эмбеддинг вопроса
+        
+        Args:
+            question: Текст вопроса
+            vector: Эмбеддинг вопроса
+            cost: Время кодирования (сек)
+        """
+        if self.enabled:
+            self.embeddings.set(normalize_question(question), vector, cost)
+    
+    def make_results_key(self, vector: List[float], limit: int, query_filter: Any = None) -> Optional[Tuple]:
+        """
+        Ключ результатов поиска: поколение корпуса, sha256 эмбеддинга, количество секций и фильтр.
+        Поколение читается до поиска, поэтому результаты, найденные во время
+        изменения корпуса, сохраняются под прежним поколением.
+        
+        Args:
+            vector: Эмбеддинг вопроса
+            limit: Количество секций
+            query_filter: Фильтр Qdrant
+        
+        Returns:
+            Ключ или None (кэш отключен или поколение не удалось прочитать)
+        """
+        if not self.enabled:
+            return None
+        
+        generation = self.get_generation()
+        if generation is None:
+            return None
+        
+        digest = hashlib.sha256(np.asarray(vector, dtype='<f4').tobytes()).hexdigest()
+        filter_key = query_filter.model_dump_json() if query_filter is not None else ''
+        return generation, digest, limit, filter_key
+    
+    def get_results(self, key: Optional[Tuple]) -> Optional[List[Dict[str, Any]]]:
+        """Результаты поиска из кэша (ключ - make_results_key)"""
+        if key is None:
+            return None
+        return self.results.get(key)
+    
+    def set_results(self, key: Optional[Tuple], results: List[Dict[str, Any]], cost: float):
+        """
+        Сохранить результаты поиска
+        
+        Args:
+            key: Ключ (make_results_key)
+            results: Результаты поиска
+            cost: Время поиска (сек)
+        """
+        if key is not None:
+            self.results.set(key, results, cost)
+    
+    def clear(self) -> int:
+        """Очистить оба уровня кэша"""
+        return self.embeddings.clear() + self.results.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Статистика кэша (счетчики текущего процесса)"""
+        return {
+            'enabled': self.enabled,
+            'generation': self.get_generation(),
+            'embeddings': self.embeddings.stats(),
+            'results': self.results.stats(),
+        }
+
+
+# Глобальный экземпляр кэша запросов
+_query_cache_instance = None
+
+
+def get_query_cache() -> QueryCache:
+    """
+    Получить глобальный экземпляр кэша запросов консультаций
+    
+    Returns:
+        QueryCache instance
+    """
+    global _query_cache_instance
+    if _query_cache_instance is None:
+        _query_cache_instance = QueryCache(
+            enabled=getattr(settings, 'QUERY_CACHE_ENABLED', True),
+            embeddings_max_entries=getattr(settings, 'QUERY_EMBEDDING_CACHE_MAX_ENTRIES', 2000),
+            embeddings_ttl=getattr(settings, 'QUERY_EMBEDDING_CACHE_TTL', 86400),
+            results_max_entries=getattr(settings, 'QUERY_RESULTS_CACHE_MAX_ENTRIES', 2000),
+            results_ttl=getattr(settings, 'QUERY_RESULTS_CACHE_TTL', 3600),
+            generation_check_interval=getattr(settings, 'CORPUS_GENERATION_CHECK_INTERVAL', 1.0)
+        )
+    return _query_cache_instance
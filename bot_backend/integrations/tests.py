@@ -0,0 +1,497 @@
+import random
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, FieldCondition, Filter, MatchValue, VectorParams
+
+from .cache import EmbeddingCacheStore, get_llm_cache
+from .dedup import SectionDeduplicator, _bands, _to_signed, _to_unsigned, hamming_distance, simhash
+from .embedding_dispatcher import EmbeddingDispatcher
+from .load_documents import (
+    ChunkSegmentation, DocumentBuffer, DocumentProcessor, DocumentSection, RuleBasedSegmenter,
+    assemble_sections, make_point_id
+)
+from .management.commands.benchmark_markers import distort, make_chunk
+from .management.commands.benchmark_sections import legacy_sections
+from .markers import ChunkTextIndex, normalize_marker
+from .models import SectionAlias, SectionFingerprint
+from . import query_cache
+from .query_cache import LRUCache, QueryCache
+
+
+class _LengthEmbedder:
+    """Векторы по длине текста вместо модели: одинаковые тексты - одинаковые векторы"""
+    
+    def encode(self, texts, batch_size=32):
+        return np.array([[len(text) % 7 + 1, len(text.split()) % 5 + 1, 2.0, 3.5] for text in texts], dtype=np.float32)
+
+
+def make_processor() -> DocumentProcessor:
+    """DocumentProcessor рабочей коллекции в Qdrant в памяти процесса"""
+    client = QdrantClient(':memory:')
+    client.create_collection('test_collection', vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    
+    processor = object.__new__(DocumentProcessor)
+    processor.ai_client = SimpleNamespace(vector_size=4, collection_name='test_collection')
+    processor.embedder = _LengthEmbedder()
+    processor.qdrant_client = client
+    processor.collection_name = 'test_collection'
+    processor.embedder_model_name = 'test'
+    processor.llm_cache = get_llm_cache()
+    processor.embedding_cache = EmbeddingCacheStore(enabled=False)
+    processor.deduplicator = SectionDeduplicator()
+    processor.query_cache = QueryCache(enabled=False)
+    processor.is_live_collection = True
+    processor.embedding_batch_size = 2
+    processor.segmentation_workers = 2
+    processor.window_overlap = 0
+    return processor
+
+
+class ChunkTextIndexTests(SimpleTestCase):
+    """Поиск маркеров секций в тексте chunk"""
+    
+    CHUNK = (
+        '1. Общие положения. Работодатель обязан обеспечить безопасность работников '
+        'при выполнении работ на высоте. 2. Требования к «средствам защиты» — '
+        'страховочная система проверяется перед началом работ. 3. Работодатель обязан '
+        'обеспечить безопасность работников при выполнении работ в ёмкостях.'
+    )
+    
+    def test_normalize_marker(self):
+        self.assertEqual(normalize_marker('«Средства»  защиты — ёмкость...'), 'средствазащиты-емкость')
+    
+    def test_find_distorted_marker(self):
+        index = ChunkTextIndex(self.CHUNK)
+        pos = index.find('2. ТРЕБОВАНИЯ к "средствам  защиты" - страховочная')
+        self.assertEqual(pos, self.CHUNK.index('2. Требования'))
+        # Ошибка в конце цитаты: используется самое длинное совпавшее начало
+        pos = index.find('страховочная система проверяется перед началом работы xyz')
+        self.assertEqual(pos, self.CHUNK.index('страховочная'))
+    
+    def test_out_of_order_marker_not_found(self):
+        index = ChunkTextIndex(self.CHUNK)
+        second = index.find('2. Требования к средствам защиты')
+        self.assertEqual(index.find('1. Общие положения. Работодатель', second + 1), -1)
+    
+    def test_duplicate_marker(self):
+        index = ChunkTextIndex(self.CHUNK)
+        marker = 'Работодатель обязан обеспечить безопасность работников при выполнении работ'
+        first = index.find(marker)
+        second = index.find(marker, first + 1)
+        self.assertEqual(first, self.CHUNK.index('Работодатель'))
+        self.assertEqual(second, self.CHUNK.index('Работодатель', first + 1))
+        # Третьего вхождения нет
+        self.assertEqual(index.find(marker, second + 1), -1)
+    
+    def test_section_spans_are_monotonic(self):
+        processor = object.__new__(DocumentProcessor)
+        content = '\n'.join([
+            '<RESULT>',
+            'section startfrom 2. Требования к средствам защиты',
+            # Маркер раньше предыдущего и повтор маркера не найдены после предыдущего маркера
+            'section startfrom 1. Общие положения',
+            'rubbish skipfrom 2. Требования к средствам защиты',
+            'rubbish skipfrom страховочная система проверяется',
+            'section startfrom 3. Работодатель обязан...',
+            '</RESULT>',
+        ])
+        spans = processor._parse_section_spans(self.CHUNK, content)
+        self.assertEqual(spans, [
+            (self.CHUNK.index('2. Требования'), self.CHUNK.index('страховочная')),
+            (self.CHUNK.index('3. Работодатель'), len(self.CHUNK)),
+        ])
+    
+    def test_found_ratio(self):
+        """Искаженные маркеры на chunks по 4800 слов находятся в правильных позициях (benchmark_markers)"""
+        rng = random.Random(42)
+        found = total = 0
+        for _ in range(3):
+            chunk = make_chunk(rng, 4800)
+            index = ChunkTextIndex(chunk)
+            # Начала секций - начала разных слов
+            starts = sorted({chunk.rfind(' ', 0, start) + 1 for start in rng.sample(range(len(chunk) - 200), 30)})
+            search_from = 0
+            for start in starts:
+                marker = ' '.join(chunk[start:].split()[:rng.randint(6, 10)])
+                kind = rng.choice(['exact', 'spaces', 'quotes', 'ellipsis', 'tail', 'case'])
+                pos = index.find(distort(rng, marker, kind), search_from)
+                total += 1
+                # Позиция может указывать на открывающую кавычку или символ после нее
+                if pos != -1 and abs(pos - start) <= 1:
+                    found += 1
+                if pos != -1:
+                    search_from = pos + 1
+        self.assertGreaterEqual(found / total, 0.98)
+
+
+class SyncDocumentTests(TestCase):
+    """Инкрементальная индексация документа"""
+    
+    TEXTS = [
+        'Работодатель обязан обеспечить безопасность работников при выполнении работ на высоте.',
+        'Страховочная система проверяется перед началом работ.',
+        'Работы в ограниченных пространствах выполняются по наряду-допуску.',
+    ]
+    
+    def setUp(self):
+        self.processor = make_processor()
+    
+    def sections(self, title: str, year, texts=None):
+        return iter([DocumentSection(text=text, title=title, year=year) for text in texts or self.TEXTS])
+    
+    def payloads(self, document_id: str):
+        points, _ = self.processor.qdrant_client.scroll(
+            collection_name='test_collection',
+            scroll_filter=Filter(must=[FieldCondition(key='document_id', match=MatchValue(value=document_id))]),
+            limit=100
+        )
+        return sorted((point.payload['title'], point.payload['year']) for point in points)
+    
+    def test_kept_sections_get_new_title_and_year(self):
+        self.processor.sync_document(self.sections('Правила', 2020), 'doc')
+        self.processor.sync_document(self.sections('Правила по охране труда', 2021), 'doc')
+        self.assertEqual(self.payloads('doc'), [('Правила по охране труда', 2021)] * 3)
+    
+    def test_kept_alias_gets_new_title_and_year(self):
+        self.processor.sync_document(self.sections('Источник', 2019, self.TEXTS[:1]), 'source')
+        self.processor.sync_document(self.sections('Правила', 2020), 'doc')
+        alias = SectionAlias.objects.get(document_id='doc')
+        self.assertEqual((alias.title, alias.year), ('Правила', 2020))
+        
+        self.processor.sync_document(self.sections('Правила по охране труда', 2021), 'doc')
+        alias.refresh_from_db()
+        self.assertEqual((alias.title, alias.year), ('Правила по охране труда', 2021))
+        self.assertEqual(self.payloads('doc'), [('Правила по охране труда', 2021)] * 2)
+        # Точка документа-источника не меняется
+        self.assertEqual(self.payloads('source'), [('Источник', 2019)])
+
+
+class RuleBasedSegmenterTests(SimpleTestCase):
+    """Заголовки нормативных документов"""
+    
+    def setUp(self):
+        self.segmenter = RuleBasedSegmenter(None)
+    
+    def test_headings_inside_chunk(self):
+        chunk = 'работ на высоте. 3. Работодатель обязан. Глава 2. Общие положения'
+        self.assertEqual(self.segmenter.find_headings(chunk), [chunk.index('3.'), chunk.index('Глава')])
+    
+    def test_references_are_not_headings(self):
+        for chunk in (
+            'выполняются согласно п. 5.2. Правил по охране труда',
+            'выполняются (п. 5.2. Правил по охране труда)',
+            'требования. См. Приложение N 2 к Правилам',
+        ):
+            self.assertEqual(self.segmenter.find_headings(chunk), [], chunk)
+    
+    def test_chunk_start(self):
+        chunk = '2. Общие положения применяются ко всем работам'
+        # Начало документа и начало предложения
+        self.assertEqual(self.segmenter.find_headings(chunk), [0])
+        self.assertEqual(self.segmenter.find_headings(chunk, 'высоте.'), [0])
+        # Заголовок или ссылка, разделенные границей chunk
+        self.assertEqual(self.segmenter.find_headings(chunk, 'Глава'), [])
+        self.assertEqual(self.segmenter.find_headings('5.2. Правил по охране труда', 'п.'), [])
+        self.assertEqual(self.segmenter.find_headings('Глава 3. Требования', 'работ.'), [0])
+    
+    def test_chunk_boundary_in_document(self):
+        processor = make_processor()
+        body = ' '.join(['слово'] * 50)
+        chunks = [
+            f'1. Общие положения {body} в соответствии с п.',
+            f'5.2. Правил по охране труда {body} Глава',
+            f'2. Требования {body} работ.',
+            f'3. Работодатель обязан {body}',
+        ]
+        results = list(processor._segment_chunks(iter(chunks), self.segmenter))
+        self.assertEqual([len(result.borders) for result in results], [1, 0, 0, 1])
+
+
+class SimHashTests(SimpleTestCase):
+    """Отпечатки секций"""
+    
+    TEXT = 'Работодатель обязан обеспечить безопасность работников при выполнении работ на высоте и в ограниченных пространствах.'
+    
+    def test_near_texts_have_close_fingerprints(self):
+        fingerprint = simhash(self.TEXT)
+        self.assertEqual(simhash(self.TEXT.upper()), fingerprint)
+        self.assertLess(hamming_distance(simhash(self.TEXT + ' Дополнительно.'), fingerprint), 16)
+        self.assertGreater(hamming_distance(simhash('Страховочная система проверяется перед началом работ.'), fingerprint), 3)
+    
+    def test_bands_and_signed_storage(self):
+        fingerprint = 0xFEDC_BA98_7654_3210
+        self.assertEqual(_bands(fingerprint), [0x3210, 0x7654, 0xBA98, 0xFEDC])
+        self.assertLess(_to_signed(fingerprint), 0)
+        self.assertEqual(_to_unsigned(_to_signed(fingerprint)), fingerprint)
+
+
+class SectionDeduplicatorTests(TestCase):
+    """Поиск дубликатов по полосам отпечатка"""
+    
+    TEXT = SimHashTests.TEXT
+    
+    def setUp(self):
+        self.deduplicator = SectionDeduplicator()
+        self.fingerprint = simhash(self.TEXT)
+    
+    def add(self, point_id: str, document_id: str, fingerprint: int):
+        bands = _bands(fingerprint)
+        SectionFingerprint.objects.create(
+            point_id=point_id,
+            document_id=document_id,
+            simhash=_to_signed(fingerprint),
+            band0=bands[0],
+            band1=bands[1],
+            band2=bands[2],
+            band3=bands[3]
+        )
+    
+    def test_finds_nearest_candidate(self):
+        # 3 бита в одной полосе: совпадают остальные три полосы
+        self.add('near', 'source', self.fingerprint ^ 0b111)
+        self.add('nearest', 'source', self.fingerprint ^ 0b1)
+        self.assertEqual(self.deduplicator.find_duplicates('doc', [self.TEXT]), {0: 'nearest'})
+        self.assertEqual(self.deduplicator.duplicates, 1)
+    
+    def test_distant_candidates_are_skipped(self):
+        # Совпадают полосы, но расстояние 4
+        self.add('same_bands', 'source', self.fingerprint ^ 0b1111)
+        # Расстояние 4, по одному биту в каждой полосе: нет общей полосы
+        self.add('other_bands', 'source', self.fingerprint ^ 0x0001_0001_0001_0001)
+        self.assertEqual(self.deduplicator.find_duplicates('doc', [self.TEXT]), {})
+    
+    def test_own_sections_are_not_duplicates(self):
+        self.deduplicator.add_fingerprints('doc', ['own'], [self.TEXT])
+        self.assertEqual(self.deduplicator.find_duplicates('doc', [self.TEXT]), {})
+        self.assertEqual(self.deduplicator.find_duplicates('other', [self.TEXT]), {0: 'own'})
+    
+    def test_group_aliases(self):
+        aliases = [
+            SectionAlias(point_id='a1', document_id='a', canonical_point_id='x', text=self.TEXT),
+            SectionAlias(point_id='a2', document_id='a', canonical_point_id='x', text=self.TEXT),
+            SectionAlias(point_id='b1', document_id='b', canonical_point_id='x', text=self.TEXT),
+        ]
+        groups = self.deduplicator.group_aliases(aliases)
+        # Дубликат того же документа становится отдельным оригиналом
+        self.assertEqual(
+            [(head.point_id, [member.point_id for member in members]) for head, members in groups],
+            [('a1', ['b1']), ('a2', [])]
+        )
+
+
+class AliasPromotionTests(TestCase):
+    """Индексация дубликатов после удаления точки-оригинала"""
+    
+    TEXT = SyncDocumentTests.TEXTS[0]
+    
+    def setUp(self):
+        self.processor = make_processor()
+    
+    def index(self, document_id: str, title: str):
+        self.processor.sync_document(iter([DocumentSection(text=self.TEXT, title=title, year=2020)]), document_id)
+    
+    def point_ids(self):
+        points, _ = self.processor.qdrant_client.scroll(collection_name='test_collection', limit=100)
+        return {point.id: point.payload for point in points}
+    
+    def test_aliases_are_promoted(self):
+        self.index('source', 'Источник')
+        self.index('a', 'Документ A')
+        self.index('b', 'Документ B')
+        source_id = make_point_id('source', self.TEXT)
+        self.assertEqual(set(self.point_ids()), {source_id})
+        self.assertEqual(SectionAlias.objects.filter(canonical_point_id=source_id).count(), 2)
+        
+        self.processor.remove_document('source')
+        
+        points = self.point_ids()
+        self.assertEqual(len(points), 1)
+        head_id, payload = next(iter(points.items()))
+        alias = SectionAlias.objects.get()
+        # Оставшийся дубликат ссылается на точку другого документа с ее названием
+        self.assertEqual(alias.canonical_point_id, head_id)
+        self.assertNotEqual(alias.document_id, payload['document_id'])
+        self.assertEqual(payload['title'], {'a': 'Документ A', 'b': 'Документ B'}[payload['document_id']])
+        self.assertEqual(head_id, make_point_id(payload['document_id'], self.TEXT))
+        self.assertEqual(list(SectionFingerprint.objects.values_list('point_id', flat=True)), [head_id])
+        
+        # Удаление нового оригинала индексирует последний дубликат
+        self.processor.remove_document(payload['document_id'])
+        self.assertEqual(set(self.point_ids()), {alias.point_id})
+        self.assertFalse(SectionAlias.objects.exists())
+
+
+class DocumentBufferTests(SimpleTestCase):
+    """Текст документа, на который ссылаются секции"""
+    
+    def setUp(self):
+        self.buffer = DocumentBuffer()
+        for chunk in ('первый chunk', 'второй chunk', 'третий chunk'):
+            self.buffer.append(chunk)
+    
+    def test_slice_across_chunks(self):
+        self.assertEqual(self.buffer.offsets, [0, 13, 26])
+        self.assertEqual(self.buffer.slice(7, 19), 'chunk второй')
+        self.assertEqual(self.buffer.text([[0, 6], [26, 32]]), 'первый третий')
+    
+    def test_release(self):
+        self.buffer.hold(7)
+        self.buffer.hold(30)
+        # Освобождение более поздней позиции не освобождает chunks до удерживаемой
+        self.buffer.release(30)
+        self.assertEqual(self.buffer.chunks, ['первый chunk', 'второй chunk', 'третий chunk'])
+        
+        self.buffer.hold(30)
+        self.buffer.release(7)
+        self.assertEqual(self.buffer.chunks, [None, None, 'третий chunk'])
+        with self.assertRaises(RuntimeError):
+            self.buffer.slice(13, 20)
+        self.assertEqual(self.buffer.slice(30, 38), 'ий chunk')
+        
+        self.buffer.release(30)
+        self.assertEqual(self.buffer.chunks, [None, None, None])
+
+
+class AssembleSectionsTests(SimpleTestCase):
+    """Сборка секций из диапазонов буфера"""
+    
+    WORDS = ['работодатель', 'обязан', 'обеспечить', 'безопасность', 'при', 'работ', 'на', 'высоте']
+    
+    def random_result(self, rng: random.Random) -> ChunkSegmentation:
+        """Результат сегментации chunk со случайными границами секций по началам слов"""
+        chunk = ' '.join(rng.choice(self.WORDS) for _ in range(rng.randint(1, 40)))
+        word_starts = [0] + [i + 1 for i, char in enumerate(chunk) if char == ' ']
+        starts = sorted(rng.sample(word_starts, rng.randint(0, min(4, len(word_starts)))))
+        ends = starts[1:] + [len(chunk)]
+        # Граница может заканчиваться раньше следующей (текст между ними не входит в секции)
+        borders = [(start, rng.choice([end, max(start + 1, end - 1)])) for start, end in zip(starts, ends)]
+        
+        continuation = None
+        kind = rng.choice(['default', 'prefix', 'empty'])
+        if kind == 'prefix':
+            continuation = (0, starts[0] if starts else len(chunk))
+        elif kind == 'empty' and starts:
+            continuation = (0, 0)
+        return ChunkSegmentation(chunk=chunk, borders=borders, continuation=continuation)
+    
+    def test_matches_string_concatenation(self):
+        rng = random.Random(17)
+        for _ in range(300):
+            results = [self.random_result(rng) for _ in range(rng.randint(1, 8))]
+            expected = [section.text for section in legacy_sections(results, {'strings': 0, 'chars': 0})]
+            
+            buffer = DocumentBuffer()
+            sections = []
+            released = []
+            for section in assemble_sections(results, lambda result: None, buffer=buffer):
+                sections.append(section)
+                section.text
+                released.append([chunk is None for chunk in buffer.chunks])
+            
+            self.assertEqual([section.text for section in sections], expected)
+            # После сборки текста секции освобождены chunks, закончившиеся до начала следующей
+            for flags, next_section in zip(released, sections[1:]):
+                next_start = next_section.spans[0][0]
+                for i, is_released in enumerate(flags):
+                    if buffer.offsets[i] + len(results[i].chunk) < next_start:
+                        self.assertTrue(is_released)
+            self.assertEqual(buffer.chunks, [None] * len(results))
+    
+    def test_meta_and_lengths(self):
+        results = [
+            ChunkSegmentation(chunk='Правила по охране труда 1. Общие', borders=[(24, 32)], continuation=(0, 23)),
+            ChunkSegmentation(chunk='положения 2. Требования', borders=[(10, 23)], continuation=(0, 9)),
+        ]
+        sections = list(assemble_sections(results, lambda result: {'title': 'Правила', 'year': 2021}))
+        self.assertEqual([(section.title, section.year) for section in sections], [('Правила', 2021)] * 3)
+        self.assertEqual([len(section) for section in sections], [23, 18, 13])
+        self.assertEqual([section.text for section in sections], [
+            'Правила по охране труда', '1. Общие положения', '2. Требования'
+        ])
+
+
+class EmbeddingDispatcherTests(SimpleTestCase):
+    """Объединение запросов на кодирование вопросов в батчи"""
+    
+    def setUp(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+    
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        self.started.set()
+        # Первый батч кодируется, пока не поставлены следующие запросы
+        self.gate.wait(5)
+        return [[float(len(text))] for text in texts]
+    
+    def test_batching_and_cancellation(self):
+        dispatcher = EmbeddingDispatcher(self.encode, max_batch_size=4, max_wait=0.05)
+        first = dispatcher.submit('a')
+        self.assertTrue(self.started.wait(5))
+        
+        futures = {text: dispatcher.submit(text) for text in ['bb', 'ccc', 'dddd', 'eeeee', 'ffffff']}
+        # Клиент отключился до начала кодирования
+        self.assertTrue(futures['ccc'].cancel())
+        self.gate.set()
+        
+        self.assertEqual(first.result(5), [1.0])
+        self.assertEqual(futures['eeeee'].result(5), [5.0])
+        self.assertEqual(futures['ffffff'].result(5), [6.0])
+        self.assertTrue(futures['ccc'].cancelled())
+        self.assertEqual(self.calls, [['a'], ['bb', 'dddd', 'eeeee'], ['ffffff']])
+        
+        stats = dispatcher.stats()
+        self.assertEqual((stats['batches'], stats['items'], stats['largest_batch']), (3, 5, 3))
+    
+    def test_error_is_set_for_whole_batch(self):
+        def encode(texts):
+            raise ValueError('model error')
+        
+        dispatcher = EmbeddingDispatcher(encode, max_wait=0.05)
+        with self.assertRaises(ValueError):
+            dispatcher.encode('a')
+        # Поток диспетчера продолжает работу после ошибки
+        with self.assertRaises(ValueError):
+            dispatcher.submit('b').result(5)
+
+
+class LRUCacheTests(SimpleTestCase):
+    """LRU кэш со сроком жизни записей"""
+    
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(query_cache, 'time', SimpleNamespace(monotonic=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_ttl(self):
+        cache = LRUCache(max_entries=10, ttl=60)
+        cache.set('key', 'value', cost=1.5)
+        self.now += 60
+        self.assertEqual(cache.get('key'), 'value')
+        # Попадание не продлевает срок жизни записи
+        self.now += 0.5
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual((cache.hits, cache.misses, cache.saved_seconds), (1, 1, 1.5))
+    
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+    
+    def test_disabled(self):
+        cache = LRUCache(max_entries=0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
@@ -47,6 +47,39 @@ class TestGeneratorService:
         except Exception as e:
             raise Exception(f"Ошибка при генерации теста: {str(e)}")
     
+    async def agenerate_test(self, questions_count: int = 10) -> Dict:
+        """
+        Асинхронная версия generate_test (AsyncQdrantClient, AsyncOpenAI)
+        
+        Args:
+            questions_count: Количество вопросов (по умолчанию 10)
+        
+        Returns:
+            dict: Сгенерированный тест с вопросами
+        """
+        try:
+            points = await self.ai_client.aget_random_points(count=questions_count)
+            
+            if not points:
+                raise Exception("Не удалось получить данные из Qdrant. Возможно, база данных пуста.")
+            
+            questions = await self.ai_client.agenerate_test_questions(points, count=questions_count)
+            
+            test = await GeneratedTest.objects.acreate(
+                questions_count=len(questions),
+                questions=questions
+            )
+            
+            return {
+                "id": str(test.id),
+                "questions_count": test.questions_count,
+                "questions": test.questions,
+                "created_at": test.created_at
+            }
+        
+        except Exception as e:
+            raise Exception(f"Ошибка при генерации теста: {str(e)}")
+    
     def get_test(self, test_id: str) -> GeneratedTest:
         """
         Получить тест по ID
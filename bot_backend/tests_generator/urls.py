@@ -1,6 +1,8 @@
 """URL маршруты для модуля генерации тестов"""
+from django.conf import settings
 from django.urls import path
 from .views import (
+    AsyncGenerateTestView,
     GenerateTestView,
     TestDetailView,
     TestHistoryView
@@ -8,8 +10,11 @@ from .views import (
 
 app_name = 'tests_generator'
 
+# Под ASGI тесты генерируются асинхронным view (AsyncOpenAI, AsyncQdrantClient)
+GenerateView = AsyncGenerateTestView if getattr(settings, 'ASYNC_VIEWS', False) else GenerateTestView
+
 urlpatterns = [
-    path('generate/', GenerateTestView.as_view(), name='generate'),
+    path('generate/', GenerateView.as_view(), name='generate'),
     path('history/', TestHistoryView.as_view(), name='history'),
     path('<uuid:test_id>/', TestDetailView.as_view(), name='detail'),
 ]
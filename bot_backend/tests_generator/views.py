@@ -2,8 +2,11 @@
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
 from django.shortcuts import get_object_or_404
 
+from api.async_views import AsyncAPIView
+
 from .models import GeneratedTest
 from .serializers import (
     TestGenerateRequestSerializer,
@@ -45,6 +48,30 @@ class GenerateTestView(APIView):
             )
 
 
+class AsyncGenerateTestView(AsyncAPIView):
+    """Асинхронный API endpoint для генерации теста (ASGI)"""
+    
+    async def post(self, request):
+        """
+        Сгенерировать новый тест (как GenerateTestView)
+        """
+        try:
+            serializer = TestGenerateRequestSerializer(data=self.parse_data(request))
+        except ParseError as e:
+            return self.parse_error_response(e)
+        if not serializer.is_valid():
+            return self.json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        
+        questions_count = serializer.validated_data.get('questions_count', 10)
+        
+        service = get_test_generator_service()
+        try:
+            result = await service.agenerate_test(questions_count)
+            return self.json_response(result, status.HTTP_201_CREATED)
+        except Exception as e:
+            return self.json_response({"error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class TestDetailView(APIView):
     """API endpoint для получения теста"""
     